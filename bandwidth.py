@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+
+import heapq
+import itertools
+import logging
+import threading
+from collections import OrderedDict
+from time import monotonic
+
+logger = logging.getLogger("Bandwidth")
+
+
+class TokenBucket:
+    "`rate` bytes/s con ráfagas de hasta `burst` bytes; admite deuda (tokens < 0)"
+
+    def __init__(self, rate, burst, now=None):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = monotonic() if now is None else now
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def take(self, size, minimum, now, debt=True):
+        """Devuelve (bytes concedidos, segundos de espera).
+
+        Con `debt` concede al menos `minimum` aunque no haya tokens y la
+        espera es lo que tarda en saldarse la deuda; sin ella, no concede
+        nada hasta tener `minimum` (o `size` si es menor) y la espera es lo
+        que falta para poder conceder `size`."""
+        self.refill(now)
+        available = int(self.tokens)
+        if debt:
+            granted = min(size, max(available, minimum, 0))
+            self.tokens -= granted
+            return granted, max(0.0, -self.tokens / self.rate)
+
+        granted = min(size, available) if available >= min(size, minimum) else 0
+        self.tokens -= granted
+        return granted, max(0.0, (size - self.tokens) / self.rate)
+
+    def give_back(self, size):
+        self.tokens = min(self.burst, self.tokens + size)
+
+
+class RenderShare:
+    "Bucket y contadores de un render; throttled_secs es tiempo de reloj"
+
+    def __init__(self, render, bucket, now):
+        self.render = render
+        self.bucket = bucket
+        self.first_seen = now
+        self.last_seen = now
+        self.served = 0
+        self.requests = 0
+        self.throttled = 0
+        self.throttled_secs = 0.0
+        self.throttled_since = None
+
+    def throttle(self, throttled, now):
+        if throttled:
+            self.throttled += 1
+            if self.throttled_since is None:
+                self.throttled_since = now
+        elif self.throttled_since is not None:
+            self.throttled_secs += now - self.throttled_since
+            self.throttled_since = None
+
+    def throttled_time(self, now):
+        if self.throttled_since is None:
+            return self.throttled_secs
+        return self.throttled_secs + now - self.throttled_since
+
+
+class BandwidthShaper:
+    """Reparto del ancho de banda de audio entre renders con token buckets.
+
+    Cada render tiene su bucket. Su tasa es la menor entre el reparto justo
+    (`total_rate` entre los renders que han pedido audio en los últimos
+    `ACTIVE_SECS`) y el tope por stream: `stream_rate` fijo o, si es 0, el
+    bitrate de la pista por `bitrate_factor`. Sin límites (todo a 0) no
+    limita nada. Un render que pide más que su parte no recibe un error
+    sino menos bytes (lectura corta) y una pista de cuánto esperar.
+    """
+
+    ACTIVE_SECS = 1.0
+    BURST_SECS = 2.0
+    MIN_CHUNK = 1024
+    FORGET_SECS = 600
+
+    def __init__(self, total_rate=0, stream_rate=0, bitrate_factor=0.0,
+                 burst_secs=BURST_SECS, min_chunk=MIN_CHUNK):
+        self.total_rate = total_rate
+        self.stream_rate = stream_rate
+        self.bitrate_factor = bitrate_factor
+        self.burst_secs = burst_secs
+        self.min_chunk = min_chunk
+        self.lock = threading.Lock()
+        # media_render_id -> RenderShare, los dos en orden de last_seen: los
+        # inactivos y los olvidados se quitan por el principio
+        self.renders = OrderedDict()
+        self.active = OrderedDict()  # los de los últimos ACTIVE_SECS
+
+    @classmethod
+    def from_properties(cls, properties, component):
+        """Lee <Componente>.Shaping.TotalRate y .StreamRate (bytes/s),
+        .BitrateFactor, .BurstSecs y .MinChunk"""
+        prefix = f'{component}.Shaping'
+        return cls(
+            total_rate=properties.getPropertyAsInt(f'{prefix}.TotalRate'),
+            stream_rate=properties.getPropertyAsInt(f'{prefix}.StreamRate'),
+            bitrate_factor=float(
+                properties.getPropertyWithDefault(f'{prefix}.BitrateFactor', '0')),
+            burst_secs=float(properties.getPropertyWithDefault(
+                f'{prefix}.BurstSecs', str(cls.BURST_SECS))),
+            # Al menos 1: en get_audio_chunk un chunk vacío es el fin de pista
+            min_chunk=max(1, properties.getPropertyAsIntWithDefault(
+                f'{prefix}.MinChunk', cls.MIN_CHUNK)))
+
+    @property
+    def enabled(self):
+        return self.total_rate > 0 or self.stream_rate > 0 or self.bitrate_factor > 0
+
+    def stream_cap(self, bitrate_kbps):
+        if self.stream_rate > 0:
+            return self.stream_rate
+        if self.bitrate_factor > 0 and bitrate_kbps:
+            return int(bitrate_kbps * 1000 / 8 * self.bitrate_factor)
+        return 0
+
+    def expire(self, now):
+        "Con el cerrojo tomado; O(1) amortizado por llamada"
+        while self.active and \
+                now - next(iter(self.active.values())).last_seen >= self.ACTIVE_SECS:
+            self.active.popitem(last=False)
+        while self.renders and \
+                now - next(iter(self.renders.values())).last_seen > self.FORGET_SECS:
+            self.renders.popitem(last=False)
+
+    def rate_for(self, share, bitrate_kbps, now):
+        self.expire(now)
+        rates = []
+        if cap := self.stream_cap(bitrate_kbps):
+            rates.append(cap)
+        if self.total_rate > 0:
+            active = len(self.active) + (share.render not in self.active)
+            rates.append(self.total_rate / active)
+        return min(rates, default=0)
+
+    def take(self, render, size, bitrate_kbps=None, debt=True, now=None):
+        """Reserva hasta `size` bytes para `render`; devuelve (concedidos,
+        segundos de espera). Con `debt`, para quien no entiende de esperas,
+        se conceden al menos min_chunk bytes y la espera es cuánto retener
+        la respuesta; sin ella, 0 bytes hasta que haya min_chunk y la espera
+        es cuándo volver a pedir."""
+        now = monotonic() if now is None else now
+        with self.lock:
+            if (share := self.renders.get(render)) is None:
+                share = self.renders[render] = RenderShare(render, None, now)
+            share.requests += 1
+            share.last_seen = now
+            for shares in (self.renders, self.active):
+                shares[render] = share
+                shares.move_to_end(render)
+
+            if (rate := self.rate_for(share, bitrate_kbps, now)) <= 0:
+                share.throttle(False, now)
+                return size, 0.0
+
+            if share.bucket is None:
+                share.bucket = TokenBucket(rate, rate * self.burst_secs, now)
+            share.bucket.rate = rate
+            share.bucket.burst = rate * self.burst_secs
+            granted, wait = share.bucket.take(size, self.min_chunk, now, debt)
+            throttled = granted < size or (debt and wait > 0)
+            share.throttle(throttled, now)
+            return granted, wait if throttled else 0.0
+
+    def served(self, render, reserved, size):
+        "Anota los bytes enviados y devuelve al bucket los reservados que no"
+        with self.lock:
+            if (share := self.renders.get(render)) is None:
+                return
+            share.served += size
+            if share.bucket is not None and reserved > size:
+                share.bucket.give_back(reserved - size)
+
+    def stats(self, now=None):
+        now = monotonic() if now is None else now
+        with self.lock:
+            self.expire(now)
+            stats = {
+                'total_rate': self.total_rate,
+                'stream_rate': self.stream_rate,
+                'bitrate_factor': self.bitrate_factor,
+                'renders': len(self.renders),
+                'active_renders': len(self.active),
+            }
+            for render, share in self.renders.items():
+                elapsed = max(share.last_seen - share.first_seen, 1e-3)
+                stats.update({
+                    f'{render}.served_bytes': share.served,
+                    f'{render}.rate_bytes_per_sec': share.served / elapsed,
+                    f'{render}.requests': share.requests,
+                    f'{render}.throttled': share.throttled,
+                    f'{render}.throttled_secs': share.throttled_time(now),
+                })
+            return stats
+
+
+class ReplyTimer(threading.Thread):
+    "Ejecuta callbacks tras un retardo; un solo hilo para todas las respuestas retenidas"
+
+    def __init__(self):
+        super().__init__(daemon=True, name='ReplyTimer')
+        self.cond = threading.Condition()
+        self.queue = []  # (instante, desempate, callback)
+        self.sequence = itertools.count()
+        self.closed = False
+
+    def call_later(self, delay, callback):
+        with self.cond:
+            heapq.heappush(
+                self.queue, (monotonic() + delay, next(self.sequence), callback))
+            self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.closed and \
+                        (not self.queue or self.queue[0][0] > monotonic()):
+                    self.cond.wait(self.queue[0][0] - monotonic() if self.queue else None)
+                if self.closed:
+                    return
+                _, _, callback = heapq.heappop(self.queue)
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Delayed reply failed: {e}")
+
+    def stop(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+"""
+Despacho del MediaServer, threads frente a asyncio (MediaServer.Mode):
+peticiones/s, latencia p50/p99 y hilos del servidor con N peticiones
+get_audio_chunk_at en vuelo a la vez. Los clientes van en otro proceso y
+mantienen la concurrencia con invocaciones asíncronas. --read-delay
+simula un disco lento retrasando cada lectura del mmap.
+
+    ./bench/bench_dispatch.py --in-flight 8 64 256 --seconds 5 --read-delay 0.005
+"""
+
+import argparse
+import multiprocessing
+import sys
+import threading
+from pathlib import Path
+from statistics import quantiles
+from time import monotonic, sleep
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+import Ice  # noqa: E402
+
+import media_server  # noqa: E402
+from media_server import Spotifice, StreamedFile  # noqa: E402
+
+PORT = 10040
+TRACKS = ('1s.mp3', '2s.mp3', '4s.mp3')
+STREAMS = 16
+
+
+def client(in_flight, seconds, chunk_size):
+    "Mantiene `in_flight` peticiones pendientes; devuelve las latencias en s"
+    init_data = Ice.InitializationData()
+    init_data.properties = Ice.createProperties()
+    init_data.properties.setProperty('Ice.MessageSizeMax', '0')
+    latencies = []
+    lock = threading.Lock()
+    finished = threading.Event()
+    pending = [in_flight]
+
+    with Ice.initialize(init_data) as ic:
+        server = Spotifice.MediaServerPrx.uncheckedCast(
+            ic.stringToProxy(f'mediaServer1:tcp -h 127.0.0.1 -p {PORT}'))
+        renders = [Ice.Identity(name=f'bench-render-{n}') for n in range(STREAMS)]
+        sizes = []
+        for n, render_id in enumerate(renders):
+            server.open_stream(TRACKS[n % len(TRACKS)], render_id)
+            sizes.append(len(server.get_audio_chunk_at(render_id, 0, 1 << 24)))
+        deadline = monotonic() + seconds
+
+        def request(slot, offset):
+            stream = slot % STREAMS
+            started = monotonic()
+            future = server.get_audio_chunk_atAsync(
+                renders[stream], offset % sizes[stream], chunk_size)
+            future.add_done_callback(
+                lambda future: done(future, slot, offset + chunk_size, started))
+
+        def done(future, slot, offset, started):
+            future.result()
+            now = monotonic()
+            with lock:
+                latencies.append(now - started)
+                if now >= deadline:
+                    pending[0] -= 1
+                    if pending[0] == 0:
+                        finished.set()
+                    return
+            request(slot, offset)
+
+        for slot in range(in_flight):
+            request(slot, slot * chunk_size)
+        finished.wait()
+
+        for render_id in renders:
+            server.close_stream(render_id)
+    return latencies
+
+
+def run(mode, in_flight, seconds, chunk_size):
+    init_data = Ice.InitializationData()
+    init_data.properties = Ice.createProperties()
+    for key, value in {
+            'MediaServerAdapter.Endpoints': f'tcp -h 127.0.0.1 -p {PORT}',
+            'MediaServer.Content': str(ROOT / 'test' / 'media'),
+            'MediaServer.Playlists': str(ROOT / 'playlists'),
+            'MediaServer.Mode': mode}.items():
+        init_data.properties.setProperty(key, value)
+
+    ic = Ice.initialize(init_data)
+    server = threading.Thread(target=media_server.main, args=(ic,))
+    server.start()
+    threads = 0
+    try:
+        proxy = ic.stringToProxy(f'mediaServer1:tcp -h 127.0.0.1 -p {PORT}')
+        while True:
+            try:
+                proxy.ice_ping()
+                break
+            except Ice.ConnectionRefusedException:
+                sleep(0.05)
+
+        with multiprocessing.get_context('spawn').Pool(1) as pool:
+            result = pool.apply_async(client, (in_flight, seconds, chunk_size))
+            sleep(seconds / 2)
+            threads = threading.active_count()
+            latencies = result.get()
+    finally:
+        ic.shutdown()
+        server.join()
+        ic.destroy()
+
+    p50, *_, p99 = quantiles(latencies, n=100)
+    return len(latencies) / seconds, p50 * 1e3, p99 * 1e3, threads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--modes', nargs='+', default=['threads', 'asyncio'],
+                        choices=sorted(media_server.SERVANT_MODES))
+    parser.add_argument('--in-flight', type=int, nargs='+', default=[8, 64, 256])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--chunk', type=int, default=4096)
+    parser.add_argument('--read-delay', type=float, default=0,
+                        help="seconds added to every mmap read (slow disk)")
+    args = parser.parse_args()
+
+    if args.read_delay > 0:
+        read_at = StreamedFile.read_at
+
+        def slow_read_at(self, offset, size):
+            sleep(args.read_delay)
+            return read_at(self, offset, size)
+        StreamedFile.read_at = slow_read_at
+
+    print(f"{'mode':<8} {'in-flight':>9} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'threads':>7}")
+    for in_flight in args.in_flight:
+        for mode in args.modes:
+            rate, p50, p99, threads = run(mode, in_flight, args.seconds, args.chunk)
+            print(f"{mode:<8} {in_flight:>9} {rate:>9.0f} {p50:>8.2f} {p99:>8.2f} "
+                  f"{threads:>7}")
+
+
+if __name__ == '__main__':
+    main()
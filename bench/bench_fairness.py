@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+"""
+Reparto del ancho de banda del MediaServer entre renders: un render
+"glotón" pide chunks grandes en bucle con get_audio_chunk_at mientras N
+renders normales leen con get_audio_chunk_paced respetando la espera que
+indica el servidor. Compara MB/s por render sin límite y con
+MediaServer.Shaping.TotalRate (reparto justo). Cada render en su proceso.
+
+    ./bench/bench_fairness.py --renders 3 --seconds 5 --total-rate 2000000
+"""
+
+import argparse
+import multiprocessing
+import sys
+import threading
+from pathlib import Path
+from time import monotonic, sleep
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+import Ice  # noqa: E402
+
+import media_server  # noqa: E402
+from media_server import Spotifice  # noqa: E402
+
+PORT = 10050
+TRACK = '4s.mp3'
+GREEDY_CHUNK = 64 * 1024
+CHUNK = 4096
+
+
+def render(name, greedy, seconds):
+    "Devuelve (bytes recibidos, esperas pedidas por el servidor)"
+    size = waits = 0
+    with Ice.initialize() as ic:
+        server = Spotifice.MediaServerPrx.uncheckedCast(
+            ic.stringToProxy(f'mediaServer1:tcp -h 127.0.0.1 -p {PORT}'))
+        render_id = Ice.Identity(name=name)
+        server.open_stream(TRACK, render_id)
+        track_size = server.get_track_info(TRACK).size
+        offset = 0
+        deadline = monotonic() + seconds
+        while monotonic() < deadline:
+            if greedy:
+                data = server.get_audio_chunk_at(render_id, offset, GREEDY_CHUNK)
+            else:
+                chunk = server.get_audio_chunk_paced(render_id, offset, CHUNK)
+                data = chunk.data
+                if chunk.retry_after_ms:
+                    waits += 1
+                    sleep(chunk.retry_after_ms / 1000)
+            size += len(data)
+            offset = (offset + len(data)) % track_size
+        server.close_stream(render_id)
+    return size, waits
+
+
+def run(renders, seconds, total_rate):
+    init_data = Ice.InitializationData()
+    init_data.properties = Ice.createProperties()
+    for key, value in {
+            'MediaServerAdapter.Endpoints': f'tcp -h 127.0.0.1 -p {PORT}',
+            'MediaServer.Content': str(ROOT / 'test' / 'media'),
+            'MediaServer.Playlists': str(ROOT / 'playlists'),
+            'MediaServer.Shaping.TotalRate': str(total_rate)}.items():
+        init_data.properties.setProperty(key, value)
+
+    ic = Ice.initialize(init_data)
+    server = threading.Thread(target=media_server.main, args=(ic,))
+    server.start()
+    try:
+        proxy = ic.stringToProxy(f'mediaServer1:tcp -h 127.0.0.1 -p {PORT}')
+        while True:
+            try:
+                proxy.ice_ping()
+                break
+            except Ice.ConnectionRefusedException:
+                sleep(0.05)
+
+        names = ['greedy'] + [f'render-{n}' for n in range(renders)]
+        with multiprocessing.get_context('spawn').Pool(len(names)) as pool:
+            results = pool.starmap(
+                render, [(name, name == 'greedy', seconds) for name in names])
+    finally:
+        ic.shutdown()
+        server.join()
+        ic.destroy()
+    return zip(names, results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--renders', type=int, default=3)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--total-rate', type=int, default=2_000_000,
+                        help="bytes/s shared among active renders")
+    args = parser.parse_args()
+
+    print(f"{'total rate':>10} {'render':<10} {'MB/s':>7} {'waits':>7}")
+    for total_rate in (0, args.total_rate):
+        for name, (size, waits) in run(args.renders, args.seconds, total_rate):
+            print(f"{total_rate or '-':>10} {name:<10} "
+                  f"{size / args.seconds / 1e6:>7.2f} {waits:>7}")
+
+
+if __name__ == '__main__':
+    main()
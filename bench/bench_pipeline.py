@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+"""
+Time-to-first-audio de GstPlayer: pipeline persistente (reuse_pipeline)
+frente a reconstruirlo con parse_launch en cada pista.
+
+    ./bench/bench_pipeline.py --runs 20 --sink 'fakesink sync=true'
+"""
+
+import argparse
+import statistics
+import sys
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from gst_player import GstPlayer  # noqa: E402
+
+
+def time_to_first_audio(reuse, track, runs, sink):
+    player = GstPlayer(reuse_pipeline=reuse, audio_sink=sink, daemon=True)
+    player.start()
+    samples = []
+    try:
+        for _ in range(runs):
+            with open(track, 'rb') as f:
+                start = perf_counter()
+                player.configure(f.read)
+                if not player.first_audio_e.wait(GstPlayer.TIMEOUT_SECS):
+                    raise RuntimeError("No audio reached the sink")
+                samples.append(perf_counter() - start)
+                player.stop()
+    finally:
+        player.shutdown()
+    return samples
+
+
+def report(name, samples):
+    ms = sorted(s * 1000 for s in samples)
+    p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+    print(f"{name:<10} first={ms[0]:7.1f}  median={statistics.median(ms):7.1f}"
+          f"  mean={statistics.mean(ms):7.1f}  p95={p95:7.1f}  (ms, n={len(ms)})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--track', default='test/media/4s.mp3')
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--sink', default=GstPlayer.AUDIO_SINK)
+    args = parser.parse_args()
+
+    for name, reuse in (('rebuild', False), ('reuse', True)):
+        report(name, time_to_first_audio(reuse, args.track, args.runs, args.sink))
+
+
+if __name__ == '__main__':
+    main()
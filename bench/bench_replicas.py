@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+"""
+Throughput agregado de streaming con el grupo de réplicas de MediaServer:
+arranca registry y nodos con scripts/start-all.sh, lanza N clientes que
+leen audio como el render (proxy fijado a la conexión de su réplica,
+reanudación con offset en otra si cae) y muestra el reparto por réplica.
+Con --kill se detiene una réplica a mitad de prueba para medir el failover.
+
+Requiere IceGrid instalado y la aplicación config/application.xml con
+MediaServer.Content apuntando a un directorio con pistas.
+
+    ./bench/bench_replicas.py --clients 12 --seconds 20 [--kill MediaServer-1]
+"""
+
+import argparse
+import subprocess
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+from time import monotonic, sleep
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+import Ice  # noqa: E402
+
+from media_server import Spotifice  # noqa: E402
+
+LOCATOR = 'SpotificeGrid/Locator:tcp -h localhost -p 4061'
+CHUNK_SIZE = 64 * 1024
+
+
+def ice_initialize():
+    init_data = Ice.InitializationData()
+    init_data.properties = Ice.createProperties()
+    init_data.properties.setProperty('Ice.Default.Locator', LOCATOR)
+    return Ice.initialize(init_data)
+
+
+def icegridadmin(command):
+    subprocess.run(
+        ['icegridadmin', f'--Ice.Default.Locator={LOCATOR}', '-u', 'bench', '-p', 'bench',
+         '-e', command], check=False, capture_output=True)
+
+
+class StreamingClient(threading.Thread):
+    "Lee pistas completas en bucle por la réplica que le asigna el localizador"
+
+    def __init__(self, number, deadline):
+        super().__init__(daemon=True)
+        self.number = number
+        self.deadline = deadline
+        self.ic = ice_initialize()
+        self.server = Spotifice.MediaServerPrx.uncheckedCast(
+            self.ic.stringToProxy('mediaServer'))
+        self.render_id = Ice.Identity(name=f'bench-render-{number}')
+        self.bytes_by_replica = Counter()
+        self.failovers = 0
+        self.connection = None
+        self.pinned = None
+
+    def pin(self):
+        proxy = self.server.ice_connectionId(f'stream-{self.failovers}')
+        self.connection = proxy.ice_getConnection()
+        self.pinned = proxy.ice_fixed(self.connection)
+        return str(self.connection.getEndpoint())
+
+    def run(self):
+        try:
+            tracks = [track.id for track in self.server.get_all_tracks()]
+            replica = self.pin()
+            position = self.number
+            while monotonic() < self.deadline:
+                track_id = tracks[position % len(tracks)]
+                position += 1
+                replica = self.stream_track(track_id, replica)
+        finally:
+            self.ic.destroy()
+
+    def stream_track(self, track_id, replica):
+        offset = 0
+        self.pinned.open_stream(track_id, self.render_id)
+        while monotonic() < self.deadline:
+            try:
+                data = self.pinned.get_audio_chunk_at(self.render_id, offset, CHUNK_SIZE)
+            except Ice.LocalException:
+                # Misma reanudación que el render: otra conexión y el offset recibido
+                self.failovers += 1
+                replica = self.pin()
+                self.pinned.open_stream_with(
+                    track_id, self.render_id, Spotifice.StreamOptions(offset=offset))
+                continue
+            if not data:
+                break
+            offset += len(data)
+            self.bytes_by_replica[replica] += len(data)
+
+        self.pinned.close_stream(self.render_id)
+        return replica
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=12)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--kill', metavar='SERVER',
+                        help="stop this replica halfway through (e.g. MediaServer-1)")
+    parser.add_argument('--no-start', action='store_true',
+                        help="use an already running grid")
+    args = parser.parse_args()
+
+    if not args.no_start:
+        subprocess.run([ROOT / 'scripts' / 'start-all.sh'], cwd=ROOT, check=True)
+    try:
+        deadline = monotonic() + args.seconds
+        clients = [StreamingClient(i, deadline) for i in range(args.clients)]
+        for client in clients:
+            client.start()
+            sleep(0.2)  # deja que el registry actualice la carga de los nodos
+
+        if args.kill:
+            sleep(args.seconds / 2)
+            icegridadmin(f'server stop {args.kill}')
+        for client in clients:
+            client.join()
+    finally:
+        if not args.no_start:
+            subprocess.run([ROOT / 'scripts' / 'stop-all.sh'], cwd=ROOT, check=False)
+
+    per_replica = Counter()
+    for client in clients:
+        per_replica.update(client.bytes_by_replica)
+    total = sum(per_replica.values())
+
+    print(f"{'replica':<40} {'MB':>9} {'share':>6}")
+    for replica, size in per_replica.most_common():
+        print(f"{replica:<40} {size / 1e6:>9.1f} {size / max(total, 1):>6.0%}")
+    print(f"\n{args.clients} clients, {total / 1e6 / args.seconds:.1f} MB/s aggregate, "
+          f"{sum(client.failovers for client in clients)} failovers")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+"""
+Latencia de SearchIndex.search con catálogos sintéticos de 10k, 100k y 1M
+pistas: palabras completas, prefijos (type-ahead) y consultas con acentos.
+
+    ./bench/bench_search.py --sizes 10000 100000 1000000 --queries 200
+"""
+
+import argparse
+import random
+import statistics
+import sys
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from search_index import SearchIndex  # noqa: E402
+
+WORDS = (
+    'amor corazón canción noche día luna sol mar cielo fuego vida sueño tiempo '
+    'camino ciudad río montaña invierno verano lágrimas alegría guitarra baile '
+    'fiesta recuerdo esperanza silencio viento lluvia estrella ojos boca beso '
+    'libertad soledad destino madrugada tormenta primavera otoño jardín'
+).split()
+ARTISTS = [f'Artista {i}' for i in range(2000)]
+
+
+def synthetic_tracks(count, rng):
+    for i in range(count):
+        title = ' '.join(rng.choices(WORDS, k=rng.randint(2, 5)))
+        yield f'track-{i:07d}.mp3', {
+            'title': f'{title} {i}',
+            'artist': rng.choice(ARTISTS),
+            'album': ' '.join(rng.choices(WORDS, k=2)),
+            'filename': f'track-{i:07d}',
+            'playlists': rng.choice(('Favoritas', 'Verano', '', '')),
+        }
+
+
+def queries(count, rng):
+    retval = []
+    for _ in range(count):
+        word = rng.choice(WORDS)
+        retval.append(rng.choice((
+            word,                                       # palabra completa
+            word[:rng.randint(1, 3)],                   # type-ahead
+            f'{word} {rng.choice(WORDS)[:3]}',          # dos términos
+            f'{rng.choice(ARTISTS)}',                   # artista
+        )))
+    return retval
+
+
+def report(size, build_secs, samples):
+    ms = sorted(s * 1000 for s in samples)
+    p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+    print(f"{size:>9} tracks  build={build_secs:6.1f}s"
+          f"  median={statistics.median(ms):7.2f}  p95={p95:7.2f}  max={ms[-1]:7.2f}"
+          f"  (ms, n={len(ms)})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    workload = queries(args.queries, rng)
+    for size in args.sizes:
+        index = SearchIndex()
+        start = perf_counter()
+        index.update_many(synthetic_tracks(size, rng))
+        build_secs = perf_counter() - start
+
+        samples = []
+        for query in workload:
+            start = perf_counter()
+            index.search(query, args.limit)
+            samples.append(perf_counter() - start)
+        report(size, build_secs, samples)
+
+
+if __name__ == '__main__':
+    main()
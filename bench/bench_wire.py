@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+"""
+Bytes en el cable y tiempo por llamada de get_all_tracks (clases TrackInfo)
+frente a get_all_track_records (structs) y get_track_batch (columnas), con
+una biblioteca sintética servida por MediaServerI a través de un relay TCP
+que cuenta los bytes de cada respuesta. Con --compress se repite cada
+operación por un proxy ice_compress(True) y se añade un chunk de audio, que
+la política de compresión deja sin comprimir.
+
+    ./bench/bench_wire.py --tracks 1000 10000 50000 --calls 20 [--compress]
+"""
+
+import argparse
+import socket
+import statistics
+import sys
+import threading
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import Ice  # noqa: E402
+
+from media_server import MediaServerI, Spotifice  # noqa: E402
+
+OPERATIONS = ('get_all_tracks', 'get_all_track_records', 'get_track_batch')
+PROPS = {'Ice.MessageSizeMax': '0', 'Ice.Warn.Connections': '0'}
+
+
+class ByteCountingRelay(threading.Thread):
+    "Reenvía una conexión TCP al servidor contando los bytes de cada sentido"
+
+    def __init__(self, target_port):
+        super().__init__(daemon=True)
+        self.target_port = target_port
+        self.listener = socket.create_server(('127.0.0.1', 0))
+        self.port = self.listener.getsockname()[1]
+        self.to_server = 0
+        self.to_client = 0
+
+    def run(self):
+        while True:
+            client, _ = self.listener.accept()
+            server = socket.create_connection(('127.0.0.1', self.target_port))
+            for src, dst, counter in ((client, server, 'to_server'),
+                                      (server, client, 'to_client')):
+                threading.Thread(
+                    target=self.pipe, args=(src, dst, counter), daemon=True).start()
+
+    def pipe(self, src, dst, counter):
+        while data := src.recv(1 << 16):
+            setattr(self, counter, getattr(self, counter) + len(data))
+            dst.sendall(data)
+
+    def reset(self):
+        self.to_server = self.to_client = 0
+
+
+def synthetic_tracks(count):
+    return {
+        f'track-{i:06d}.mp3': Spotifice.TrackInfo(
+            id=f'track-{i:06d}.mp3', title=f'Canción número {i}',
+            filename=f'track-{i:06d}.mp3', artist=f'Artista {i % 500}',
+            album=f'Álbum {i % 2000}', duration_ms=180_000 + i % 60_000,
+            bitrate=128 + i % 3 * 64, size=3_000_000 + i)
+        for i in range(count)
+    }
+
+
+def ice_initialize():
+    init_data = Ice.InitializationData()
+    init_data.properties = Ice.createProperties()
+    for key, value in PROPS.items():
+        init_data.properties.setProperty(key, value)
+    return Ice.initialize(init_data)
+
+
+def measure(proxy, relay, operation, calls, *args):
+    getattr(proxy, operation)(*args)  # calentamiento (y caché de vistas del servidor)
+    relay.reset()
+    samples = []
+    for _ in range(calls):
+        start = perf_counter()
+        getattr(proxy, operation)(*args)
+        samples.append(perf_counter() - start)
+    return relay.to_client // calls, statistics.median(samples)
+
+
+def compare_compression(servant, proxy, relay, args):
+    compressed = proxy.ice_compress(True)
+    print(f"{'tracks':>7}  {'operation':<22} {'bytes':>11} {'compressed':>11}"
+          f" {'saved':>6} {'ms':>8} {'ms (z)':>8}")
+
+    def report(count, operation, *call_args):
+        size, elapsed = measure(proxy, relay, operation, args.calls, *call_args)
+        size_z, elapsed_z = measure(compressed, relay, operation, args.calls, *call_args)
+        print(f"{count:>7}  {operation:<22} {size:>11} {size_z:>11}"
+              f" {1 - size_z / size:>6.0%} {elapsed * 1000:>8.2f}"
+              f" {elapsed_z * 1000:>8.2f}")
+
+    for count in args.tracks:
+        servant.tracks = synthetic_tracks(count)
+        for operation in OPERATIONS:
+            report(count, operation)
+
+    # Audio real: el MP3 apenas se reduce y bzip2 sólo añade latencia
+    servant.load_media()
+    render_id = Ice.Identity(name='bench-render')
+    proxy.open_stream('4s.mp3', render_id)
+    report('-', 'get_audio_chunk_at', render_id, 0, 32768)
+    proxy.close_stream(render_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tracks', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--calls', type=int, default=20)
+    parser.add_argument('--compress', action='store_true',
+                        help="compare with compressed invocations")
+    args = parser.parse_args()
+
+    server_ic = ice_initialize()
+    client_ic = ice_initialize()
+    try:
+        adapter = server_ic.createObjectAdapterWithEndpoints(
+            'BenchAdapter', 'tcp -h 127.0.0.1')
+        servant = MediaServerI('test/media', 'playlists')
+        adapter.add(servant, Ice.stringToIdentity('mediaServer1'))
+        adapter.activate()
+
+        server_port = adapter.getEndpoints()[0].getInfo().port
+        relay = ByteCountingRelay(server_port)
+        relay.start()
+        proxy = Spotifice.MediaServerPrx.uncheckedCast(client_ic.stringToProxy(
+            f'mediaServer1:tcp -h 127.0.0.1 -p {relay.port}'))
+
+        if args.compress:
+            compare_compression(servant, proxy, relay, args)
+            return
+
+        print(f"{'tracks':>7}  {'operation':<22} {'bytes':>11} {'B/track':>8}"
+              f" {'median ms':>10}")
+        for count in args.tracks:
+            servant.tracks = synthetic_tracks(count)
+            for operation in OPERATIONS:
+                size, elapsed = measure(proxy, relay, operation, args.calls)
+                print(f"{count:>7}  {operation:<22} {size:>11} {size / count:>8.1f}"
+                      f" {elapsed * 1000:>10.2f}")
+    finally:
+        client_ic.destroy()
+        server_ic.destroy()
+
+
+if __name__ == '__main__':
+    main()
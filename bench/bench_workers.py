@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+"""
+Throughput del MediaServer en modo supervisor (media_workers) según el
+número de procesos worker: chunks/s y MB/s que sirven a N clientes, cada
+uno en su propio proceso, leyendo en bucle las pistas de test/media con
+get_audio_chunk_at.
+
+    ./bench/bench_workers.py --workers 1 2 4 --clients 8 --seconds 10 --chunk 4096
+"""
+
+import argparse
+import multiprocessing
+import sys
+import threading
+from pathlib import Path
+from time import monotonic
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+import Ice  # noqa: E402
+
+import media_workers  # noqa: E402
+from media_server import Spotifice  # noqa: E402
+
+PORT = 10030
+TRACKS = ('1s.mp3', '2s.mp3', '4s.mp3')
+
+
+def client(number, seconds, chunk_size):
+    "Un render simulado: devuelve (chunks, bytes) leídos"
+    init_data = Ice.InitializationData()
+    init_data.properties = Ice.createProperties()
+    init_data.properties.setProperty(
+        'Ice.Default.Locator', f'MediaServer/Locator:tcp -h 127.0.0.1 -p {PORT}')
+    chunks = size = 0
+    with Ice.initialize(init_data) as ic:
+        server = Spotifice.MediaServerPrx.uncheckedCast(ic.stringToProxy('mediaServer1'))
+        render_id = Ice.Identity(name=f'bench-render-{number}')
+        deadline = monotonic() + seconds
+        track = number
+        while monotonic() < deadline:
+            server.open_stream(TRACKS[track % len(TRACKS)], render_id)
+            track += 1
+            offset = 0
+            while data := server.get_audio_chunk_at(render_id, offset, chunk_size):
+                chunks += 1
+                size += len(data)
+                offset += len(data)
+                if monotonic() >= deadline:
+                    break
+            server.close_stream(render_id)
+    return chunks, size
+
+
+def run(workers, clients, seconds, chunk_size):
+    init_data = Ice.InitializationData()
+    init_data.properties = Ice.createProperties()
+    for key, value in {
+            'MediaServerAdapter.Endpoints': f'tcp -h 127.0.0.1 -p {PORT}',
+            'MediaServer.Content': str(ROOT / 'test' / 'media'),
+            'MediaServer.Playlists': str(ROOT / 'playlists'),
+            'MediaServer.Workers': str(workers),
+            'MediaServer.Workers.Endpoints': 'tcp -h 127.0.0.1'}.items():
+        init_data.properties.setProperty(key, value)
+
+    ic = Ice.initialize(init_data)
+    # Supervisor aun con un solo worker: mismo camino para todas las medidas
+    server = threading.Thread(target=media_workers.main, args=(ic,))
+    server.start()
+    try:
+        locator = ic.stringToProxy(f'MediaServer/Locator:tcp -h 127.0.0.1 -p {PORT}')
+        while True:
+            try:
+                locator.ice_ping()
+                break
+            except Ice.ConnectionRefusedException:
+                pass
+
+        with multiprocessing.get_context('spawn').Pool(clients) as pool:
+            results = pool.starmap(
+                client, [(number, seconds, chunk_size) for number in range(clients)])
+    finally:
+        ic.shutdown()
+        server.join()
+        ic.destroy()
+
+    chunks = sum(chunks for chunks, _ in results)
+    size = sum(size for _, size in results)
+    return chunks / seconds, size / seconds / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--chunk', type=int, default=4096)
+    args = parser.parse_args()
+
+    print(f"{'workers':>7} {'chunks/s':>10} {'MB/s':>8}")
+    for workers in args.workers:
+        chunks_rate, mb_rate = run(workers, args.clients, args.seconds, args.chunk)
+        print(f"{workers:>7} {chunks_rate:>10.0f} {mb_rate:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+import logging
+import threading
+from collections import OrderedDict
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("ChunkCache")
+
+
+class ChunkCache:
+    """Caché LRU de bloques de audio con presupuesto de memoria en bytes.
+
+    Las claves son (track_id, offset alineado a `block_size`). Una lectura que
+    cae dentro de un único bloque se devuelve como vista, sin copia.
+    """
+
+    BLOCK_SIZE = 64 * 1024
+
+    def __init__(self, max_bytes, block_size=BLOCK_SIZE):
+        self.max_bytes = max_bytes
+        self.block_size = block_size
+        self.lock = threading.Lock()
+        self.blocks = OrderedDict()  # (track_id, block_offset) -> bytes
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __contains__(self, key):
+        return key in self.blocks
+
+    def block(self, track_id, block_offset, loader):
+        key = (track_id, block_offset)
+        with self.lock:
+            if (data := self.blocks.get(key)) is not None:
+                self.blocks.move_to_end(key)
+                self.hits += 1
+                return data
+            self.misses += 1
+
+        data = bytes(loader(block_offset, self.block_size))
+        self.store(key, data)
+        return data
+
+    def store(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+
+        with self.lock:
+            if key in self.blocks:
+                return
+            self.blocks[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self.blocks.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def read(self, track_id, offset, size, loader):
+        """Devuelve `size` bytes desde `offset`, cargando con
+        `loader(offset, size)` los bloques que falten."""
+        first = offset - offset % self.block_size
+        parts = []
+        for block_offset in range(first, offset + size, self.block_size):
+            data = self.block(track_id, block_offset, loader)
+            start = max(offset - block_offset, 0)
+            end = min(offset + size - block_offset, len(data))
+            if start >= end:
+                break
+            parts.append(memoryview(data)[start:end])
+            if len(data) < self.block_size:
+                break  # fin de fichero
+
+        if len(parts) == 1:
+            return parts[0]
+        return b''.join(parts)
+
+    def covers(self, track_id, offset, size):
+        "True si read() no necesitaría cargar nada (no toca el disco)"
+        first = offset - offset % self.block_size
+        with self.lock:
+            for block_offset in range(first, offset + size, self.block_size):
+                if (data := self.blocks.get((track_id, block_offset))) is None:
+                    return False
+                if len(data) < self.block_size:
+                    break  # fin de fichero
+        return True
+
+    def warm_up(self, track_id, size, loader):
+        for block_offset in range(0, size, self.block_size):
+            if self.size + self.block_size > self.max_bytes:
+                return
+            data = self.block(track_id, block_offset, loader)
+            if len(data) < self.block_size:
+                return
+
+    def invalidate(self, track_id):
+        with self.lock:
+            for key in [key for key in self.blocks if key[0] == track_id]:
+                self.size -= len(self.blocks.pop(key))
+
+    def clear(self):
+        with self.lock:
+            self.blocks.clear()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = max(self.hits + self.misses, 1)
+            return {
+                'max_bytes': self.max_bytes,
+                'size_bytes': self.size,
+                'blocks': len(self.blocks),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups,
+                'evictions': self.evictions,
+            }
+
+    def __repr__(self):
+        return f"<ChunkCache {self.size}/{self.max_bytes} bytes>"
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+import threading
+from collections import Counter
+
+import Ice
+import IceMX
+
+# Respuestas de texto (títulos, rutas, ids) que bzip2 reduce ~10 veces
+METADATA_OPERATIONS = frozenset({
+    'get_all_tracks', 'get_track_info', 'get_tracks', 'search', 'get_tracks_info',
+    'get_all_track_records', 'get_track_batch', 'get_all_playlists', 'get_playlist',
+    'get_playlist_expanded', 'get_playlists',
+})
+
+# Operaciones paginadas: posición del argumento que fija cuántos elementos
+# vuelven (un límite o una secuencia de ids)
+ITEM_ARGS = {'get_tracks': 1, 'get_playlists': 1, 'search': 1, 'get_tracks_info': 0}
+
+# Elementos que devuelve el servidor con un límite <= 0 (MediaServerI.PAGE_LIMIT
+# y SEARCH_LIMIT)
+DEFAULT_ITEMS = {'get_tracks': 1000, 'get_playlists': 1000, 'search': 20}
+
+
+# Vista IceMX con los bytes de todas las conexiones (IceMX.Metrics.Wire.*)
+WIRE_VIEW = 'Wire'
+
+
+def wire_stats(ic, view=WIRE_VIEW):
+    """Bytes enviados y recibidos por las conexiones del communicator según
+    la vista IceMX `view`. Con bzip2 son los bytes ya comprimidos, el tráfico
+    real en la red. Vacío si no hay admin (Ice.Admin.Endpoints) o esa vista."""
+    if (admin := ic.getAdmin()) is None:
+        return {}
+    try:
+        metrics, _ = IceMX.MetricsAdminPrx.uncheckedCast(
+            admin, 'Metrics').getMetricsView(view)
+    except (IceMX.UnknownMetricsView, Ice.FacetNotExistException):
+        return {}
+
+    connections = metrics.get('Connection', [])
+    return {
+        'wire_sent_bytes': sum(m.sentBytes for m in connections),
+        'wire_received_bytes': sum(m.receivedBytes for m in connections),
+    }
+
+
+class CompressionPolicy:
+    """Qué invocaciones viajan comprimidas (bzip2 de Ice) y cuáles no.
+
+    Sólo las operaciones de metadatos: el audio MP3 ya está comprimido y
+    bzip2 gastaría CPU en cada chunk sin ahorrar bytes. En las paginadas,
+    una página de menos de `min_items` elementos tampoco compensa. Ice
+    comprime la respuesta si la petición lo fue, así que basta con elegir
+    el proxy con que se envía cada operación.
+    """
+
+    MIN_ITEMS = 50
+
+    def __init__(self, enabled=True, operations=METADATA_OPERATIONS,
+                 min_items=MIN_ITEMS):
+        self.enabled = enabled
+        self.operations = frozenset(operations)
+        self.min_items = min_items
+        self.lock = threading.Lock()
+        self.calls = Counter()
+
+    @classmethod
+    def from_properties(cls, properties, component):
+        """Lee <Componente>.Compress, .Compress.Operations (separadas por comas)
+        y .Compress.MinItems; las propiedades del adaptador no admiten claves
+        propias, Ice avisaría de propiedades desconocidas"""
+        prefix = f'{component}.Compress'
+        return cls(
+            enabled=properties.getPropertyAsIntWithDefault(prefix, 1) > 0,
+            operations=properties.getPropertyAsList(f'{prefix}.Operations')
+            or METADATA_OPERATIONS,
+            min_items=properties.getPropertyAsIntWithDefault(
+                f'{prefix}.MinItems', cls.MIN_ITEMS))
+
+    def compress(self, operation, args=()):
+        if not self.enabled or operation not in self.operations:
+            return False
+        if (position := ITEM_ARGS.get(operation)) is not None and position < len(args):
+            items = args[position]
+            if not isinstance(items, int):
+                count = len(items)
+            else:
+                count = items if items > 0 else DEFAULT_ITEMS.get(operation, 0)
+            return count >= self.min_items
+        return True
+
+    def wrap(self, proxy):
+        return PolicyProxy(proxy, self)
+
+    def record(self, compressed):
+        with self.lock:
+            self.calls['compressed' if compressed else 'uncompressed'] += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'enabled': int(self.enabled),
+                'min_items': self.min_items,
+                'compressed_calls': self.calls['compressed'],
+                'uncompressed_calls': self.calls['uncompressed'],
+            }
+
+
+class PolicyProxy:
+    """Proxy que envía cada operación por su variante comprimida o sin comprimir.
+
+    Los métodos ice_* (ice_oneway, ice_getIdentity...) se resuelven sobre
+    la variante sin comprimir, de modo que los proxies derivados (oneway
+    para créditos, batch para push_chunk) nunca comprimen audio.
+    """
+
+    def __init__(self, proxy, policy):
+        self.policy = policy
+        self.plain = proxy.ice_compress(False)
+        self.compressed = proxy.ice_compress(True)
+
+    def __getattr__(self, name):
+        target = getattr(self.plain, name)
+        if name.startswith('ice_') or not callable(target):
+            return target
+
+        operation = name.removesuffix('Async')
+
+        def invoke(*args, **kwargs):
+            compressed = self.policy.compress(operation, args)
+            self.policy.record(compressed)
+            proxy = self.compressed if compressed else self.plain
+            return getattr(proxy, name)(*args, **kwargs)
+        return invoke
+
+    def __str__(self):
+        return str(self.plain)
@@ -33,17 +33,28 @@ class Cmd(Enum):
 
 class GstPlayer(threading.Thread):
     CHUNK_SIZE = 4096
-    PIPELINE = 'appsrc name=src ! decodebin ! audioconvert ! audioresample ! autoaudiosink'
+    MAX_BYTES = 8192
+    PIPELINE = ('appsrc name=src ! decodebin name=decoder ! audioconvert name=convert'
+                ' ! audioresample name=resample ! {sink}')
+    AUDIO_SINK = 'autoaudiosink'
     TIMEOUT_SECS = 2
 
-    def __init__(self, **kwargs):
+    def __init__(self, reuse_pipeline=True, audio_sink=AUDIO_SINK, **kwargs):
         super().__init__(**kwargs)
         self.command_queue = queue.Queue()
         self.play_confirmed_e = threading.Event()
         self.stop_confirmed_e = threading.Event()
         self.stop_confirmed_e.set()
+        self.first_audio_e = threading.Event()
 
+        # Con reuse_pipeline el pipeline se crea una vez y cada pista sólo lo
+        # devuelve a READY; si no, se reconstruye con parse_launch por pista
+        self.reuse_pipeline = reuse_pipeline
+        self.audio_sink = audio_sink
+        self.active = False
         self.pipeline: Gst.Pipeline = None
+        self.appsrc = None
+        self.max_bytes = self.MAX_BYTES
         self.get_chunk_hook = None
         self.track_exhausted_hook = lambda: None
 
@@ -59,6 +70,7 @@ class GstPlayer(threading.Thread):
                 case Cmd.STOP | Cmd.EXHAUSTED | Cmd.SHUTDOWN:
                     was_active = self.deactivate_stream()
                     if command == Cmd.SHUTDOWN:
+                        self.release_pipeline()
                         break
                     if command == Cmd.EXHAUSTED and was_active:
                         threading.Thread(target=self.track_exhausted_hook).start()
@@ -66,29 +78,60 @@ class GstPlayer(threading.Thread):
                     logger.warning(f"Unexpected command: {command}")
 
     def setup_pipeline(self):
-        retval = Gst.parse_launch(self.PIPELINE)
+        retval = Gst.parse_launch(self.PIPELINE.format(sink=self.audio_sink))
         self.appsrc = retval.get_by_name('src')
         self.appsrc.set_properties(
-            format=Gst.Format.TIME, block=True, is_live=True, max_bytes=8192)
+            format=Gst.Format.TIME, block=True, is_live=True, max_bytes=self.max_bytes)
         self.appsrc.connect('need-data', self.on_need_data)
+
+        # decodebin rehace su pad de salida en cada pista al volver de READY
+        convert = retval.get_by_name('convert')
+        retval.get_by_name('decoder').connect('pad-added', self.on_decoded_pad, convert)
+        retval.get_by_name('resample').get_static_pad('src').add_probe(
+            Gst.PadProbeType.BUFFER, self.on_audio_buffer)
         return retval
 
+    def release_pipeline(self):
+        if not self.pipeline:
+            return
+
+        self.appsrc.disconnect_by_func(self.on_need_data)
+        self.pipeline.set_state(Gst.State.NULL)
+        self.pipeline = None
+        self.appsrc = None
+
+    @staticmethod
+    def on_decoded_pad(decoder, pad, convert):
+        sink_pad = convert.get_static_pad('sink')
+        if not sink_pad.is_linked():
+            pad.link(sink_pad)
+
+    def on_audio_buffer(self, pad, info):
+        self.first_audio_e.set()
+        return Gst.PadProbeReturn.OK
+
     def activate_stream(self):
         self.last_time = None
+        self.first_audio_e.clear()
         self.stop_confirmed_e.clear()
-        self.pipeline = self.setup_pipeline()
+        if self.pipeline is None:
+            self.pipeline = self.setup_pipeline()
         self.pipeline.set_state(Gst.State.PLAYING)
+        self.active = True
         self.play_confirmed_e.set()
         logger.info("Playing...")
 
     def deactivate_stream(self):
-        if not self.pipeline:
+        if not self.active:
             return False
 
+        self.active = False
         self.play_confirmed_e.clear()
-        self.appsrc.disconnect_by_func(self.on_need_data)
-        self.pipeline.set_state(Gst.State.NULL)
-        self.pipeline = None
+        if self.reuse_pipeline:
+            # READY vacía appsrc y decodebin pero el sink de audio sigue abierto
+            self.pipeline.set_state(Gst.State.READY)
+        else:
+            self.release_pipeline()
         self.stop_confirmed_e.set()
         logger.info("Stopped.")
         return True
@@ -118,6 +161,11 @@ class GstPlayer(threading.Thread):
                 print(f"\rbitrate: {bitrate:.2f} kB/s    ", end='', flush=True)
         self.last_time = monotonic()
 
+    def set_queue_bytes(self, max_bytes):
+        self.max_bytes = max_bytes
+        if self.appsrc:
+            self.appsrc.set_property('max-bytes', max_bytes)
+
     def configure(self, get_chunk_hook, track_exhausted_hook=None):
         self.get_chunk_hook = get_chunk_hook
         self.track_exhausted_hook = track_exhausted_hook or (lambda: None)
@@ -142,7 +190,7 @@ class GstPlayer(threading.Thread):
         self.pipeline.set_state(Gst.State.PLAYING)
 
     def get_state(self):
-        if self.pipeline is None:
+        if self.pipeline is None or not self.active:
             return 'STOP'
 
         state = self.pipeline.get_state(Gst.SECOND)
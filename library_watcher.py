@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+import logging
+import threading
+
+try:
+    from inotify_simple import INotify
+    from inotify_simple import flags as inotify_flags
+except ImportError:
+    INotify = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("LibraryWatcher")
+
+
+def directory_stamps(directory, suffix):
+    "filename -> (size, mtime_ns) de los ficheros con esa extensión"
+    retval = {}
+    for filepath in directory.iterdir():
+        if filepath.suffix.lower() != suffix:
+            continue
+        try:
+            stat = filepath.stat()
+        except FileNotFoundError:
+            continue  # borrado mientras se listaba
+        retval[filepath.name] = (stat.st_size, stat.st_mtime_ns)
+    return retval
+
+
+class LibraryWatcher(threading.Thread):
+    """Recarga pistas y playlists del servidor cuando cambian en disco.
+
+    Con inotify_simple instalado despierta con los eventos de los
+    directorios; si no, compara cada `interval` segundos el tamaño y mtime
+    de los ficheros. En ambos casos el servidor aplica sólo las diferencias.
+    """
+
+    INTERVAL_SECS = 2
+    SETTLE_MS = 200  # agrupa las ráfagas de eventos de una copia
+
+    def __init__(self, servant, interval=INTERVAL_SECS, use_inotify=True):
+        super().__init__(daemon=True)
+        self.servant = servant
+        self.interval = interval
+        self.stopped = threading.Event()
+        # Lo que el servidor ya cargó: nada que cambie después se pierde
+        self.media = dict(servant.track_stamps)
+        self.playlists = {name: stamp for name, (stamp, _)
+                          in servant.playlist_files.items()}
+
+        self.inotify = None
+        if use_inotify and INotify is not None:
+            self.inotify = INotify()
+            mask = (inotify_flags.CREATE | inotify_flags.DELETE | inotify_flags.MODIFY
+                    | inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_FROM
+                    | inotify_flags.MOVED_TO)
+            for directory in (servant.media_dir, servant.playlists_dir):
+                self.inotify.add_watch(str(directory), mask)
+
+    def run(self):
+        logger.info("Watching library ({})".format(
+            "inotify" if self.inotify else f"polling every {self.interval}s"))
+        try:
+            while self.wait_for_changes():
+                try:
+                    self.check()
+                except Exception as e:
+                    logger.error(f"Library reload failed: {e}")
+        finally:
+            if self.inotify:
+                self.inotify.close()
+
+    def wait_for_changes(self):
+        if self.inotify is None:
+            return not self.stopped.wait(self.interval)
+
+        # El timeout permite atender stop() y hace de sondeo de respaldo
+        if self.inotify.read(timeout=int(self.interval * 1000)):
+            while self.inotify.read(timeout=self.SETTLE_MS):
+                pass
+        return not self.stopped.is_set()
+
+    def check(self):
+        media = directory_stamps(self.servant.media_dir, '.mp3')
+        playlists = directory_stamps(self.servant.playlists_dir, '.playlist')
+
+        tracks_changed = False
+        if media != self.media:
+            added, removed, _ = self.servant.load_media()
+            # Sólo altas y bajas cambian qué track_ids de las playlists son válidos
+            tracks_changed = bool(added or removed)
+            self.media = media
+
+        if tracks_changed or playlists != self.playlists:
+            self.servant.load_playlists()
+            self.playlists = playlists
+
+    def stop(self):
+        self.stopped.set()
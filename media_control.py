@@ -5,6 +5,8 @@ from time import sleep
 
 import Ice
 
+from compression import CompressionPolicy
+
 Ice.loadSlice('-I{} spotifice_v1.ice'.format(Ice.getSliceDir()))
 import Spotifice  # type: ignore # noqa: E402
 
@@ -30,8 +32,12 @@ def main(ic):
     server = get_proxy(ic, 'MediaServer.Proxy', Spotifice.MediaServerPrx)
     render = get_proxy(ic, 'MediaRender.Proxy', Spotifice.MediaRenderPrx)
 
+    # El listado completo viaja comprimido; ver MediaControl.Compress
+    catalog = CompressionPolicy.from_properties(
+        ic.getProperties(), 'MediaControl').wrap(server)
+
     print("Fetching all tracks...")
-    tracks = server.get_all_tracks()
+    tracks = catalog.get_all_tracks()
     for t in tracks:
         print(f"- {t.title}")
 
@@ -19,7 +19,7 @@ def get_proxy_via_locator(ic, identity, interface_class):
     
     Args:
         ic: Ice communicator
-        identity: Identity del objeto (ej: "mediaServer1")
+        identity: Identity del objeto (ej: "mediaServer", el grupo de réplicas)
         interface_class: Clase del proxy (ej: Spotifice.MediaServerPrx)
     """
     # Crear proxy indirecto usando la identidad
@@ -50,7 +50,7 @@ def main(ic):
     
     # Obtener proxies a través de IceGrid
     print("Conectando a MediaServer...")
-    server = get_proxy_via_locator(ic, 'mediaServer1', Spotifice.MediaServerPrx)
+    server = get_proxy_via_locator(ic, 'mediaServer', Spotifice.MediaServerPrx)
     print("✓ Conectado a MediaServer\n")
     
     print("Conectando a MediaRender...")
@@ -12,6 +12,8 @@ from gi.repository import Gtk, GLib
 
 import Ice
 
+from compression import CompressionPolicy  # noqa: E402
+
 Ice.loadSlice('-I{} spotifice_v1.ice'.format(Ice.getSliceDir()))
 import Spotifice  # type: ignore # noqa: E402
 
@@ -216,7 +218,9 @@ class SpotificeControlWindow(Gtk.ApplicationWindow):
             logger.error(f"Error initializing Ice proxies: {e}")
             sys.exit(1)
 
-        return server, render
+        # Las páginas de playlists viajan comprimidas; ver MediaControl.Compress
+        return CompressionPolicy.from_properties(
+            self.communicator.getProperties(), 'MediaControl').wrap(server), render
 
     def create_ui(self):
         callbacks = {
@@ -352,7 +356,17 @@ class SpotificeControlWindow(Gtk.ApplicationWindow):
 
         return True
 
-    def load_playlists(self):
+    PLAYLIST_PAGE = 50
+
+    # Pide las playlists por páginas y en segundo plano: el desplegable se
+    # va llenando sin bloquear la interfaz aunque el catálogo sea grande
+    def load_playlists(self, cursor=''):
+        future = self.server.get_playlistsAsync(
+            cursor, self.PLAYLIST_PAGE, '', Spotifice.MatchMode.PREFIX)
+        future.add_done_callback(
+            lambda f: GLib.idle_add(self.on_playlist_page, f, cursor == ''))
+
+    def load_all_playlists(self):
         try:
             playlists = self.server.get_all_playlists()
         except Exception as e:
@@ -360,11 +374,31 @@ class SpotificeControlWindow(Gtk.ApplicationWindow):
             self.update_status(f"Error loading playlists: {e}")
             return
 
+        self.add_playlists(playlists, first_page=True)
+
+    def on_playlist_page(self, future, first_page):
+        try:
+            page = future.result()
+        except Ice.OperationNotExistException:
+            # Servidor de versión 1: sin paginación
+            self.load_all_playlists()
+            return GLib.SOURCE_REMOVE
+        except Exception as e:
+            logger.error(f"Error loading playlists: {e}")
+            self.update_status(f"Error loading playlists: {e}")
+            return GLib.SOURCE_REMOVE
+
+        self.add_playlists(page.playlists, first_page)
+        if page.next_cursor:
+            self.load_playlists(page.next_cursor)
+        return GLib.SOURCE_REMOVE
+
+    def add_playlists(self, playlists, first_page):
         for playlist in playlists:
             self.playlist_model.append(playlist.name)
             self.playlist_ids.append(playlist.id)
 
-        if playlists:
+        if first_page and playlists:
             self.playlist_dropdown.set_selected(0)
 
     def on_playlist_changed(self, dropdown, _pspec):
@@ -1,13 +1,27 @@
 #!/usr/bin/env python3
 
+import functools
 import logging
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 
 import Ice
 from Ice import identityToString as id2str
 
+from compression import CompressionPolicy, wire_stats
 from gst_player import GstPlayer
+from metadata_cache import MetadataCache
+from prefetch import (
+    AdaptiveChunkSizer,
+    ChunkPrefetcher,
+    PushBuffer,
+    TrackSequence,
+    VariantSelector,
+    server_fetch,
+)
+from stats_facet import add_stats_facet
 
 Ice.loadSlice('-I{} spotifice_v1.ice'.format(Ice.getSliceDir()))
 import Spotifice  # type: ignore # noqa: E402
@@ -16,9 +30,51 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("MediaRender")
 
 
+class AudioSinkI(Spotifice.AudioSink):
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def push_chunk(self, offset, data, current=None):
+        self.buffer.push(offset, data)
+
+    def end_of_stream(self, size, current=None):
+        self.buffer.end(size)
+
+
+def synchronized(method):
+    "Con el cerrojo de estado del render (RPC de control y cambios de pista)"
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.state_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 class MediaRenderI(Spotifice.MediaRender):
-    def __init__(self, player):
+    def __init__(self, player, prefetch_settings=None, push_streaming=False,
+                 adaptive_settings=None, gapless=False, metadata=None, compression=None,
+                 paced=False, variants=False):
         self.player = player
+        self.prefetch_settings = prefetch_settings or {}
+        self.push_streaming = push_streaming
+        # Lecturas por offset con get_audio_chunk_paced: respeta la pista de
+        # espera del servidor cuando éste limita el ancho de banda
+        self.paced = paced
+        # Cambiar entre las variantes transcodificadas según el throughput;
+        # el último selector conserva lo medido para la pista siguiente
+        self.variants = variants
+        self.selector = None
+        self.gapless = gapless
+        self.stream_source = None     # ChunkPrefetcher, TrackSequence o PushBuffer
+        self.sink_id = None
+        # El sizer se conserva entre pistas: lo aprendido del enlace sigue valiendo
+        self.sizer = None
+        if adaptive_settings is not None:
+            self.sizer = AdaptiveChunkSizer(
+                byte_rate=self.prefetch_settings.get(
+                    'byte_rate', ChunkPrefetcher.BYTE_RATE),
+                on_change=lambda sizer: player.set_queue_bytes(sizer.queue_bytes()),
+                **adaptive_settings)
         self.server: Spotifice.MediaServerPrx = None
         self.current_track = None
         # Nuevo en Hito 1: Gestión de playlists y estado de reproducción
@@ -28,6 +84,21 @@ class MediaRenderI(Spotifice.MediaRender):
         self.repeat_mode = False      # Modo repeat activado/desactivado
         self.playback_state = Spotifice.PlaybackState.STOPPED  # Estado actual
         self.proxy_actual = None      # Guarda el proxy actual para el hook de pista agotada
+        # TrackInfo y Playlist por servidor; se revalida con su versión de biblioteca
+        self.metadata = metadata if metadata is not None else MetadataCache()
+        self.server_key = None
+        # Metadatos por un proxy comprimido, audio por uno sin comprimir
+        self.compression = compression if compression is not None \
+            else CompressionPolicy()
+        # Réplica que tiene el stream: proxy fijado a su conexión
+        self.stream_server = None
+        self.stream_connection = None
+        self.stream_lock = threading.Lock()
+        self.failovers = 0
+        # Reentrante: next(), previous() y load_track() llaman a stop() y play()
+        self.state_lock = threading.RLock()
+        # Cambios de pista gapless en orden, fuera del hilo de GStreamer
+        self.transitions = ThreadPoolExecutor(1, thread_name_prefix='GaplessTransition')
 
     def ensure_player_stopped(self):
         if self.player.is_playing():
@@ -37,8 +108,73 @@ class MediaRenderI(Spotifice.MediaRender):
         if not self.server:
             raise Spotifice.BadReference(reason="No MediaServer bound")
 
+    @staticmethod
+    def server_identity(proxy):
+        # Identidad más adaptador o endpoints: dos servidores pueden compartir identidad
+        location = proxy.ice_getAdapterId() or \
+            ':'.join(endpoint.toString() for endpoint in proxy.ice_getEndpoints())
+        return f"{id2str(proxy.ice_getIdentity())}@{location}"
+
+    @staticmethod
+    def library_version(proxy):
+        try:
+            return proxy.get_library_version()
+        except Ice.OperationNotExistException:
+            return None  # servidor de versión 1
+
+    def cached(self, kind, key, fetch):
+        value, fresh = self.metadata.get(self.server_key, kind, key)
+        if value is not None and (fresh or self.metadata.revalidate(
+                self.server_key, self.library_version(self.server))):
+            return value
+
+        value = fetch()
+        self.metadata.put(self.server_key, kind, key, value)
+        return value
+
+    def lookup_track(self, track_id):
+        return self.cached(
+            'track', track_id, lambda: self.server.get_track_info(track_id))
+
+    # Con un grupo de réplicas cada MediaServer guarda sus propios streams:
+    # todas las operaciones de streaming van por la conexión de la réplica
+    # que abrió el stream, no por la que resuelva el localizador cada vez.
+    # Si esa conexión se cae se fija otra (otra réplica, si la anterior murió)
+    # y el prefetcher reabre el stream en ella con el offset ya recibido
+    # Lo llaman el hilo de prefetch y los de Ice a la vez: una sola conmutación
+    def streaming_server(self):
+        with self.stream_lock:
+            if self.stream_server is not None:
+                try:
+                    self.stream_connection.throwException()
+                    return self.stream_server
+                except Ice.LocalException as e:
+                    self.failovers += 1
+                    logger.warning(
+                        f"Lost MediaServer replica ({type(e).__name__}), failing over")
+
+            # Conexión propia: la anterior, si existe, puede estar ya cerrada
+            proxy = self.server.ice_connectionId(f'stream-{self.failovers}')
+            self.stream_connection = proxy.ice_getConnection()
+            self.stream_server = proxy.ice_fixed(self.stream_connection)
+            logger.info(f"Streaming from {self.stream_connection.getEndpoint()}")
+            return self.stream_server
+
+    # Una sola invocación trae la playlist y todas sus pistas; con un
+    # servidor de versión 1 se piden las pistas según se necesitan
+    def fetch_playlist(self, playlist_id):
+        try:
+            expanded = self.server.get_playlist_expanded(playlist_id)
+        except Ice.OperationNotExistException:
+            return self.server.get_playlist(playlist_id)
+
+        for track in expanded.tracks:
+            self.metadata.put(self.server_key, 'track', track.id, track)
+        return expanded.playlist
+
     # --- RenderConnectivity ---
 
+    @synchronized
     def bind_media_server(self, media_server, current=None):
         try:
             proxy = media_server.ice_timeout(500)
@@ -46,21 +182,37 @@ class MediaRenderI(Spotifice.MediaRender):
         except Ice.ConnectionRefusedException as e:
             raise Spotifice.BadReference(reason=f"MediaServer not reachable: {e}")
 
-        self.server = media_server
+        # Los metadatos de otro servidor ya no sirven; los del mismo sólo si
+        # su biblioteca no ha cambiado desde entonces
+        server_key = self.server_identity(media_server)
+        if self.server_key not in (None, server_key):
+            self.metadata.flush(self.server_key)
+        if (version := self.library_version(media_server)) is None:
+            self.metadata.flush(server_key)
+        self.metadata.set_version(server_key, version)
+
+        self.server = self.compression.wrap(media_server)
+        self.server_key = server_key
+        self.stream_server = None
         # Resetear historial cuando se enlaza nuevo servidor
         self.playback_history = []
         logger.info(f"Bound to MediaServer '{id2str(media_server.ice_getIdentity())}'")
 
+    @synchronized
     def unbind_media_server(self, current=None):
         self.stop(current)
         self.server = None
+        self.stream_server = None
         self.current_playlist = None
         self.playlist_position = -1
         self.playback_history = []
+        self.metadata.flush(self.server_key)
+        self.server_key = None
         logger.info("Unbound MediaServer")
 
     # --- ContentManager ---
 
+    @synchronized
     def load_track(self, track_id, current=None):
         self.ensure_server_bound()
 
@@ -70,7 +222,7 @@ class MediaRenderI(Spotifice.MediaRender):
             self.playlist_position = -1
             
             with self.keep_playing_state(current):
-                self.current_track = self.server.get_track_info(track_id)
+                self.current_track = self.lookup_track(track_id)
 
             logger.info(f"Current track set to: {self.current_track.title}")
 
@@ -78,16 +230,19 @@ class MediaRenderI(Spotifice.MediaRender):
             logger.error(f"Error setting track: {e.reason}")
             raise
 
+    @synchronized
     def get_current_track(self, current=None):
         return self.current_track
 
+    @synchronized
     def load_playlist(self, playlist_id, current=None):
         # Cargar playlist y establecer primera pista sin reproducir
         self.ensure_server_bound()
 
         try:
             # Obtener playlist desde el servidor
-            self.current_playlist = self.server.get_playlist(playlist_id)
+            self.current_playlist = self.cached(
+                'playlist', playlist_id, lambda: self.fetch_playlist(playlist_id))
             
             # Resetear historial al cargar nueva playlist
             self.playback_history = []
@@ -101,7 +256,7 @@ class MediaRenderI(Spotifice.MediaRender):
             primera_pista_id = self.current_playlist.track_ids[0]
             
             # Cargar primera pista pero NO reproducir
-            self.current_track = self.server.get_track_info(primera_pista_id)
+            self.current_track = self.lookup_track(primera_pista_id)
             
             # Añadir primera pista al historial para que previous() funcione después de next()
             self.playback_history.append(self.current_track.id)
@@ -130,11 +285,19 @@ class MediaRenderI(Spotifice.MediaRender):
             if playing:
                 self.play(current)
 
+    @synchronized
     def handle_track_exhausted(self):
         # Handler llamado automáticamente cuando una pista termina
         # Implementa la lógica completa de repeat según el contexto
         logger.info("Track exhausted, handling repeat logic...")
-        
+
+        # Las lecturas por offset no cierran el stream al llegar al final
+        if self.server and self.proxy_actual:
+            try:
+                self.streaming_server().close_stream(self.proxy_actual.id)
+            except Ice.Exception as e:
+                logger.warning(f"Error closing exhausted stream: {e}")
+
         if self.current_playlist:
             # Tenemos playlist cargada
             if self.playlist_position < len(self.current_playlist.track_ids) - 1:
@@ -142,7 +305,7 @@ class MediaRenderI(Spotifice.MediaRender):
                 try:
                     self.playlist_position += 1
                     id_pista = self.current_playlist.track_ids[self.playlist_position]
-                    self.current_track = self.server.get_track_info(id_pista)
+                    self.current_track = self.lookup_track(id_pista)
                     logger.info(f"Auto-advancing to next track: {self.current_track.title}")
                     self.play(self.proxy_actual)
                 except Exception as e:
@@ -156,7 +319,7 @@ class MediaRenderI(Spotifice.MediaRender):
                     self.playlist_position = 0
                     try:
                         id_pista = self.current_playlist.track_ids[0]
-                        self.current_track = self.server.get_track_info(id_pista)
+                        self.current_track = self.lookup_track(id_pista)
                         self.play(self.proxy_actual)
                     except Exception as e:
                         logger.error(f"Error restarting playlist: {e}")
@@ -180,15 +343,206 @@ class MediaRenderI(Spotifice.MediaRender):
                 logger.info("Track finished, stopping")
                 self.playback_state = Spotifice.PlaybackState.STOPPED
 
-    def play(self, current=None):
-        def get_chunk_hook(chunk_size):
-            try:
-                return self.server.get_audio_chunk(current.id, chunk_size)
-            except Spotifice.IOError as e:
-                logger.error(e)
-            except Ice.Exception as e:
-                logger.critical(e)
+    def variant_selector(self, track):
+        # Hace falta el bitrate del original para situarlo en la escalera
+        if not self.variants or not track.variants or not track.bitrate:
+            return None
+        self.selector = VariantSelector(
+            [*track.variants, track.bitrate], track.bitrate,
+            self.selector.throughput if self.selector else None)
+        return self.selector
+
+    def create_prefetcher(self, render_id, track, offset=0, audio_only=False):
+        selector = self.variant_selector(track)
+        # Con profundidad > 1 se usan lecturas por offset (varias en vuelo),
+        # también al cambiar de variante; con 1 y sin variantes se mantiene
+        # el get_audio_chunk secuencial de versiones previas
+        pipelined = self.prefetch_settings.get('depth', 1) > 1 or selector is not None
+        track_id = track.id
+        stream = {'variant': 0, 'audio_only': audio_only}  # 0 = el original
+
+        # Tras un fallo se reabre el stream donde se quedó, no desde el byte 0,
+        # en la misma réplica o en otra si su conexión se ha perdido
+        def resume(offset):
+            logger.warning(f"Resuming stream of '{track_id}' at byte {offset}")
+            self.streaming_server().open_stream_with(
+                track_id, render_id,
+                Spotifice.StreamOptions(offset=offset, **stream))
+            return True
+
+        # El servidor traduce el offset al mismo instante de la otra variante
+        # (por duración, sin las etiquetas ID3). Se corta en el límite de un
+        # chunk y el decodificador se resincroniza con la siguiente trama MP3
+        def switch(offset, kbps):
+            variant = 0 if kbps == track.bitrate else kbps
+            info = self.streaming_server().open_stream_with(
+                track_id, render_id, Spotifice.StreamOptions(
+                    variant=variant, offset=offset, from_variant=stream['variant'],
+                    audio_only=audio_only))
+            stream['variant'] = variant
+            return info.offset
+
+        # El buffer se dimensiona con el bitrate real de la pista si el
+        # servidor lo conoce (índice de metadatos)
+        settings = dict(self.prefetch_settings)
+        if track.bitrate not in (Ice.Unset, None) and track.bitrate > 0:
+            settings['byte_rate'] = track.bitrate * 1000 // 8
+
+        fetch_async = server_fetch(
+            self.streaming_server, render_id, pipelined=pipelined, paced=self.paced)
+        return ChunkPrefetcher(
+            fetch_async, offset=offset, resume=resume, sizer=self.sizer,
+            selector=selector, switch=switch, **settings)
+
+    def following_track(self, position):
+        # Misma lógica de avance y repeat que handle_track_exhausted
+        if self.current_playlist:
+            track_ids = self.current_playlist.track_ids
+            if position < len(track_ids) - 1:
+                return position + 1, track_ids[position + 1]
+            if self.repeat_mode:
+                return 0, track_ids[0]
+        elif self.repeat_mode and self.current_track:
+            return position, self.current_track.id
+        return None
+
+    # Entre pistas el decodificador recibe un único flujo MP3: cada una
+    # aporta sólo sus tramas de audio, sin etiquetas ID3 ni la trama Info
+    # que lo cortarían. Devuelve el offset de la primera trama
+    def open_audio_stream(self, current, track_id):
+        try:
+            return self.streaming_server().open_stream_with(
+                track_id, current.id, Spotifice.StreamOptions(audio_only=True)).offset
+        except Ice.OperationNotExistException:
+            self.streaming_server().open_stream(track_id, current.id)
+            return 0
+
+    def open_gapless_source(self, current):
+        offset = self.open_audio_stream(current, self.current_track.id)
+        prefetcher = self.create_prefetcher(
+            current.id, self.current_track, offset, audio_only=True)
+        sequence = TrackSequence(
+            prefetcher, lambda following: self.on_gapless_transition(sequence, following))
+        self.chain_preload(prefetcher, current, sequence, self.playlist_position)
+        prefetcher.start()
+        return sequence
+
+    def chain_preload(self, prefetcher, current, sequence, position):
+        prefetcher.on_exhausted = \
+            lambda: self.preload_next(current, sequence, position)
+
+    # Se ejecuta en el hilo de prefetch cuando ya se ha descargado toda la
+    # pista: abre el stream de la siguiente y empieza a llenar su buffer.
+    # Si la descargada es a su vez una precarga, espera a que empiece a
+    # sonar: nunca hay más de una pista por delante
+    def preload_next(self, current, sequence, position):
+        if not sequence.wait_slot():
+            return
+        if not (following := self.following_track(position)):
+            sequence.finish()
+            return
+
+        next_position, track_id = following
+        try:
+            track = self.lookup_track(track_id)
+            offset = self.open_audio_stream(current, track_id)
+        except Exception as e:
+            logger.error(f"Error preloading next track: {e}")
+            sequence.finish()
+            return
+
+        # Encolada antes de empezar: si acaba enseguida, su precarga ya la
+        # encuentra esperando en la secuencia
+        prefetcher = self.create_prefetcher(current.id, track, offset, audio_only=True)
+        self.chain_preload(prefetcher, current, sequence, next_position)
+        sequence.enqueue(prefetcher, (next_position, track))
+        prefetcher.start()
+        logger.info(f"Preloaded next track: {track.title}")
+
+    # La llama el hilo de GStreamer al pasar a la pista precargada. El estado
+    # se actualiza en otro hilo: una RPC con el cerrojo puede estar en stop()
+    # esperando a que ese mismo hilo de GStreamer se detenga
+    def on_gapless_transition(self, sequence, following):
+        self.transitions.submit(self.apply_gapless_transition, sequence, following)
+
+    @synchronized
+    def apply_gapless_transition(self, sequence, following):
+        if self.stream_source is not sequence:
+            return  # parada o sustituida mientras tanto
+        self.playlist_position, self.current_track = following
+        if self.current_track.id not in self.playback_history:
+            self.playback_history.append(self.current_track.id)
+        logger.info(f"Gapless transition to: {self.current_track.title}")
+
+    def open_push_stream(self, current):
+        # Negociación: si el servidor no conoce open_stream_with o rechaza el
+        # modo push, se devuelve None y se usa el modo pull de siempre
+        server = self.streaming_server()
+        oneway = server.ice_oneway()
+        buffer = PushBuffer(
+            lambda credits: oneway.grant_credits(current.id, credits),
+            **self.prefetch_settings)
+        sink = Spotifice.AudioSinkPrx.uncheckedCast(
+            current.adapter.addWithUUID(AudioSinkI(buffer)))
+        self.sink_id = sink.ice_getIdentity()
+        options = Spotifice.StreamOptions(
+            sink=sink, credits=buffer.window, chunk_size=buffer.chunk_size)
+
+        try:
+            info = server.open_stream_with(self.current_track.id, current.id, options)
+        except Ice.OperationNotExistException:
+            info = Spotifice.StreamInfo(push=False)
+        except Exception:
+            self.remove_sink(current.adapter)
+            raise
+
+        if not info.push:
+            logger.info("Push streaming not available, falling back to pull")
+            self.remove_sink(current.adapter)
+            return None
+
+        return buffer
+
+    def open_stream_source(self, current):
+        self.close_stream_source(current)
+
+        if self.push_streaming and (source := self.open_push_stream(current)):
+            return source
+
+        if self.sizer:
+            self.sizer.restart()
+        if self.gapless:
+            return self.open_gapless_source(current)
+
+        self.streaming_server().open_stream(self.current_track.id, current.id)
+        prefetcher = self.create_prefetcher(current.id, self.current_track)
+        prefetcher.start()
+        return prefetcher
 
+    def stream_stats(self):
+        stats = self.stream_source.stats() if self.stream_source else {}
+        stats['replica_failovers'] = self.failovers
+        if self.sizer:
+            stats.update({f"adaptive_{k}": v for k, v in self.sizer.stats().items()})
+        return stats
+
+    def remove_sink(self, adapter):
+        if self.sink_id:
+            adapter.remove(self.sink_id)
+            self.sink_id = None
+
+    def close_stream_source(self, current=None):
+        if not self.stream_source:
+            return
+
+        logger.info(f"Stream stats: {self.stream_source.stats()}")
+        self.stream_source.close()
+        self.stream_source = None
+        if current:
+            self.remove_sink(current.adapter)
+
+    @synchronized
+    def play(self, current=None):
         assert current, "remote invocation required"
 
         # Si estamos en pausa, simplemente reanudar
@@ -208,13 +562,14 @@ class MediaRenderI(Spotifice.MediaRender):
         self.proxy_actual = current
 
         try:
-            self.server.open_stream(self.current_track.id, current.id)
+            self.stream_source = self.open_stream_source(current)
         except Spotifice.BadIdentity as e:
             logger.error(f"Error starting stream: {e.reason}")
             raise Spotifice.StreamError(reason="Strean setup failed")
 
-        # Configurar player con hook de fin de pista
-        self.player.configure(get_chunk_hook, track_exhausted_hook=self.handle_track_exhausted)
+        # El player lee del buffer local (prefetch o push), no del servidor
+        self.player.configure(
+            self.stream_source.read, track_exhausted_hook=self.handle_track_exhausted)
         if not self.player.confirm_play_starts():
             raise Spotifice.PlayerError(reason="Failed to confirm playback")
         
@@ -223,9 +578,11 @@ class MediaRenderI(Spotifice.MediaRender):
         if self.current_track.id not in self.playback_history:
             self.playback_history.append(self.current_track.id)
 
+    @synchronized
     def stop(self, current=None):
+        self.close_stream_source(current)
         if self.server and current:
-            self.server.close_stream(current.id)
+            self.streaming_server().close_stream(current.id)
 
         if not self.player.stop():
             raise Spotifice.PlayerError(reason="Failed to confirm stop")
@@ -234,6 +591,7 @@ class MediaRenderI(Spotifice.MediaRender):
         self.playback_state = Spotifice.PlaybackState.STOPPED
         logger.info("Stopped")
 
+    @synchronized
     def pause(self, current=None):
         # Pausar reproducción
         if not self.player.is_playing():
@@ -246,6 +604,7 @@ class MediaRenderI(Spotifice.MediaRender):
         except Exception as e:
             raise Spotifice.PlayerError(reason=f"Failed to pause: {e}")
 
+    @synchronized
     def get_status(self, current=None):
         # Devolver estado actual de reproducción
         status = Spotifice.PlaybackStatus()
@@ -254,6 +613,14 @@ class MediaRenderI(Spotifice.MediaRender):
         status.repeat = self.repeat_mode
         return status
 
+    @synchronized
+    def get_status_record(self, current=None):
+        return Spotifice.PlaybackStatusRecord(
+            self.playback_state,
+            self.current_track.id if self.current_track else "",
+            self.repeat_mode)
+
+    @synchronized
     def next(self, current=None):
         # Avanzar a siguiente pista en playlist, manteniendo estado play/pause
         if not self.current_playlist:
@@ -284,7 +651,7 @@ class MediaRenderI(Spotifice.MediaRender):
         
         # Cargar la nueva pista
         id_pista = self.current_playlist.track_ids[self.playlist_position]
-        self.current_track = self.server.get_track_info(id_pista)
+        self.current_track = self.lookup_track(id_pista)
         logger.info(f"Next track: {self.current_track.title}")
         
         # Añadir al historial para que previous() funcione
@@ -295,6 +662,7 @@ class MediaRenderI(Spotifice.MediaRender):
         if estaba_reproduciendo:
             self.play(current)
 
+    @synchronized
     def previous(self, current=None):
         # Retroceder a pista anterior en historial, manteniendo estado play/pause
         if len(self.playback_history) < 2:
@@ -322,21 +690,68 @@ class MediaRenderI(Spotifice.MediaRender):
                 self.playlist_position = -1
         
         # Cargar la pista anterior
-        self.current_track = self.server.get_track_info(id_pista_anterior)
+        self.current_track = self.lookup_track(id_pista_anterior)
         logger.info(f"Previous track: {self.current_track.title}")
         
         # Reanudar reproducción si estaba reproduciendo
         if estaba_reproduciendo:
             self.play(current)
 
+    @synchronized
     def set_repeat(self, value, current=None):
         # Establecer modo repeat
         self.repeat_mode = value
         logger.info(f"Repeat mode: {'ON' if value else 'OFF'}")
 
 
+def prefetch_settings(properties):
+    bitrate_kbps = properties.getPropertyAsIntWithDefault(
+        'MediaRender.Prefetch.Bitrate', ChunkPrefetcher.BYTE_RATE * 8 // 1000)
+    max_seconds = properties.getPropertyWithDefault(
+        'MediaRender.Prefetch.MaxSeconds', str(ChunkPrefetcher.MAX_SECONDS))
+
+    return dict(
+        max_bytes=properties.getPropertyAsIntWithDefault(
+            'MediaRender.Prefetch.MaxBytes', ChunkPrefetcher.MAX_BYTES),
+        max_seconds=float(max_seconds),
+        byte_rate=bitrate_kbps * 1000 // 8,
+        depth=properties.getPropertyAsIntWithDefault('MediaRender.Pipeline.Depth', 1))
+
+
+def adaptive_settings(properties):
+    if properties.getPropertyAsIntWithDefault('MediaRender.Adaptive', 0) <= 0:
+        return None
+
+    target_seconds = properties.getPropertyWithDefault(
+        'MediaRender.Adaptive.TargetSeconds', str(AdaptiveChunkSizer.TARGET_SECONDS))
+    return dict(
+        min_chunk=properties.getPropertyAsIntWithDefault(
+            'MediaRender.Adaptive.MinChunk', AdaptiveChunkSizer.MIN_CHUNK),
+        max_chunk=properties.getPropertyAsIntWithDefault(
+            'MediaRender.Adaptive.MaxChunk', AdaptiveChunkSizer.MAX_CHUNK),
+        target_seconds=float(target_seconds))
+
+
 def main(ic, player):
-    servant = MediaRenderI(player)
+    properties = ic.getProperties()
+    servant = MediaRenderI(
+        player, prefetch_settings(properties),
+        push_streaming=properties.getPropertyAsIntWithDefault(
+            'MediaRender.Push', 0) > 0,
+        adaptive_settings=adaptive_settings(properties),
+        gapless=properties.getPropertyAsIntWithDefault('MediaRender.Gapless', 0) > 0,
+        paced=properties.getPropertyAsIntWithDefault('MediaRender.Paced', 0) > 0,
+        variants=properties.getPropertyAsIntWithDefault('MediaRender.Variants', 0) > 0,
+        metadata=MetadataCache(
+            properties.getPropertyAsIntWithDefault(
+                'MediaRender.Metadata.TTL', MetadataCache.TTL_SECS),
+            properties.getPropertyAsIntWithDefault(
+                'MediaRender.Metadata.MaxEntries', MetadataCache.MAX_ENTRIES)),
+        compression=CompressionPolicy.from_properties(properties, 'MediaRender'))
+    add_stats_facet(ic, "Prefetch", servant.stream_stats)
+    add_stats_facet(ic, "Metadata", servant.metadata.stats)
+    add_stats_facet(
+        ic, "Compression", lambda: servant.compression.stats() | wire_stats(ic))
 
     adapter = ic.createObjectAdapter("MediaRenderAdapter")
     proxy = adapter.add(servant, ic.stringToIdentity("mediaRender1"))
@@ -1,14 +1,32 @@
 #!/usr/bin/env python3
 
+import asyncio
 import json
 import logging
+import math
+import mmap
+import os
 import sys
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
+from time import monotonic, time_ns
 
 import Ice
 from Ice import identityToString as id2str
 
+from bandwidth import BandwidthShaper, ReplyTimer
+from chunk_cache import ChunkCache
+from library_watcher import LibraryWatcher
+from search_index import SearchIndex
+from sorted_index import PREFIX, SUBSTRING, SortedIndex
+from stats_facet import add_stats_facet
+from stream_registry import StreamRegistry
+from track_index import TrackIndex, audio_range
+from variants import map_offset, scan_variants, variants_dir
+
 Ice.loadSlice('-I{} spotifice_v1.ice'.format(Ice.getSliceDir()))
 import Spotifice  # type: ignore # noqa: E402
 
@@ -16,173 +34,1024 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("MediaServer")
 
 
+class MappedFile:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.size = os.fstat(f.fileno()).st_size
+            # mmap no admite ficheros vacíos
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) \
+                if self.size else None
+        self.view = memoryview(self.map) if self.map else memoryview(b'')
+        self.refs = 0
+
+    def slice(self, offset, size):
+        # Vista sin copia sobre la página del fichero; Ice la serializa directamente
+        return self.view[offset:offset + size]
+
+    def close(self):
+        self.view.release()
+        if self.map:
+            self.map.close()
+
+
+class MediaStore:
+    """Un único mmap de solo lectura por pista, compartido por todos los
+    streams que la reproducen y liberado cuando se cierra el último.
+
+    Una vista aún referenciada (p.ej. un chunk pendiente de serializar)
+    impide cerrar el mapa; se reintenta en la siguiente liberación."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.mappings = {}  # path -> MappedFile
+        self.retired = []
+
+    def acquire(self, path):
+        with self.lock:
+            if not (mapped := self.mappings.get(path)):
+                mapped = self.mappings[path] = MappedFile(path)
+            mapped.refs += 1
+            return mapped
+
+    def release(self, mapped):
+        with self.lock:
+            mapped.refs -= 1
+            if mapped.refs == 0:
+                if self.mappings.get(mapped.path) is mapped:
+                    del self.mappings[mapped.path]
+                self.retired.append(mapped)
+            self.close_retired()
+
+    def invalidate(self, path):
+        # El fichero ha cambiado: los streams abiertos conservan su mapa y
+        # los nuevos abren uno nuevo
+        with self.lock:
+            self.mappings.pop(path, None)
+
+    def close_retired(self):
+        pending = []
+        for mapped in self.retired:
+            try:
+                mapped.close()
+            except BufferError:
+                pending.append(mapped)
+        self.retired = pending
+
+    def __len__(self):
+        return len(self.mappings)
+
+
 class StreamedFile:
-    def __init__(self, track_info, media_dir):
+    def __init__(self, track_info, media_dir, store, offset=0, cache=None,
+                 variant=0, path=None, end=None):
         self.track = track_info
-        filepath = media_dir / track_info.filename
+        self.sender = None
+        self.cache = cache
+        self.store = store
+        self.path = path or media_dir / track_info.filename
+        # Una variante transcodificada es otro fichero: otra clave en la caché
+        self.variant = variant
+        self.cache_key = f'{track_info.id}@{variant}' if variant else track_info.id
+        self.bitrate = variant or track_info.bitrate
+        self.position = offset
+        self.mapped = None
+        self.connection = None
+        self.last_used = monotonic()
+        # Serializa las lecturas de un mismo render y su cierre
+        self.lock = threading.RLock()
 
         try:
-            self.file = open(filepath, 'rb')
+            self.mapped = store.acquire(self.path)
+            self.size = self.mapped.size
         except Exception as e:
             raise Spotifice.IOError(track_info.filename, f"Error opening media file: {e}")
+        # Con audio_only el stream acaba antes de la etiqueta ID3v1
+        self.end = self.size if end is None else min(end, self.size)
 
     def read(self, size):
-        return self.file.read(size)
+        with self.lock:
+            data = self.read_at(self.position, size)
+            self.position += len(data)
+            return data
+
+    def read_at(self, offset, size):
+        # No usa ni mueve el cursor de read(): admite peticiones fuera de orden
+        with self.lock:
+            if self.mapped is None:
+                raise ValueError("stream closed")
+            self.last_used = monotonic()
+            size = max(0, min(size, self.end - offset))
+            if self.cache is not None:
+                return self.cache.read(self.cache_key, offset, size, self.mapped.slice)
+            return self.mapped.slice(offset, size)
 
     def close(self):
-        try:
-            if self.file:
-                self.file.close()
-        except Exception as e:
-            logger.error(f"Error closing file for track '{self.track.id}': {e}")
+        if self.sender:
+            self.sender.close()
+
+        with self.lock:
+            try:
+                if self.mapped:
+                    self.store.release(self.mapped)
+                    self.mapped = None
+            except Exception as e:
+                logger.error(f"Error closing file for track '{self.track.id}': {e}")
 
     def __repr__(self):
         return f"<StreamState '{self.track.id}'>"
 
 
+class PushSender(threading.Thread):
+    """Envía los chunks de un stream al AudioSink del render.
+
+    Control de flujo por créditos: cada crédito concedido por el render
+    permite enviar un chunk más, así su cola nunca crece sin límite. Con un
+    `shaper`, además, no envía más deprisa de lo que le toca al render.
+    """
+
+    CHUNK_SIZE = 4096
+
+    def __init__(self, streamed_file, sink, credits, chunk_size=CHUNK_SIZE, batch_size=1,
+                 shaper=None, render=None):
+        super().__init__(daemon=True)
+        self.streamed_file = streamed_file
+        self.shaper = shaper
+        self.render = render
+        self.batch_size = max(1, batch_size)
+        self.sink = sink.ice_batchOneway() if self.batch_size > 1 else sink.ice_oneway()
+        self.chunk_size = chunk_size
+        self.credits = credits
+        self.offset = streamed_file.position
+        self.cond = threading.Condition()
+        self.closed = False
+
+    def grant(self, credits):
+        with self.cond:
+            self.credits += credits
+            self.cond.notify()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+
+    def flush(self):
+        if self.batch_size > 1:
+            self.sink.ice_flushBatchRequests()
+
+    def run(self):
+        try:
+            while self.send_granted():
+                pass
+        except Exception as e:
+            if not self.closed:
+                track_id = self.streamed_file.track.id
+                logger.error(f"Push stream of '{track_id}' failed: {e}")
+
+    def send_granted(self):
+        with self.cond:
+            self.cond.wait_for(lambda: self.closed or self.credits > 0)
+            if self.closed:
+                return False
+            credits, self.credits = self.credits, 0
+
+        for sent in range(1, credits + 1):
+            if (data := self.read_chunk()) is None:
+                return False
+            if not data:
+                self.sink.end_of_stream(self.offset)
+                self.flush()
+                logger.info(f"Track pushed: '{self.streamed_file.track.id}'")
+                return False
+
+            self.sink.push_chunk(self.offset, data)
+            self.offset += len(data)
+            if sent % self.batch_size == 0:
+                self.flush()
+
+        self.flush()
+        return True
+
+
+    def read_chunk(self):
+        "El siguiente chunk cuando el shaper lo permita; None si se cierra esperando"
+        if self.shaper is None:
+            return self.streamed_file.read_at(self.offset, self.chunk_size)
+
+        while True:
+            granted, wait = self.shaper.take(
+                self.render, self.chunk_size, self.streamed_file.bitrate, debt=False)
+            if granted:
+                break
+            self.flush()
+            with self.cond:
+                if self.cond.wait_for(lambda: self.closed, wait):
+                    return None
+
+        data = self.streamed_file.read_at(self.offset, granted)
+        self.shaper.served(self.render, granted, len(data))
+        return data
+
+
+class StreamReaper(threading.Thread):
+    "Cierra periódicamente los streams sin actividad durante más de `ttl` segundos"
+
+    def __init__(self, servant, ttl):
+        super().__init__(daemon=True)
+        self.servant = servant
+        self.interval = max(ttl / 4, 0.1)
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.servant.reap_idle_streams()
+            except Exception as e:
+                logger.error(f"Stream reaper failed: {e}")
+
+    def stop(self):
+        self.stopped.set()
+
+
 class MediaServerI(Spotifice.MediaServer):
-    def __init__(self, media_dir, playlists_dir):
+    PAGE_LIMIT = 1000
+    SEARCH_LIMIT = 20
+
+    def __init__(self, media_dir, playlists_dir, push_enabled=True, push_batch_size=1,
+                 cache=None, stream_ttl=0, max_streams=0, index=None, shaper=None,
+                 variants_dir=None):
         self.media_dir = Path(media_dir)
         self.playlists_dir = Path(playlists_dir)
+        self.push_enabled = push_enabled
+        self.push_batch_size = push_batch_size
+        self.cache = cache
+        self.index = index if index is not None else TrackIndex()
+        # Reparto del ancho de banda de audio entre renders (None = sin límite)
+        self.shaper = shaper
+        self.reply_timer = None
+        if shaper is not None:
+            self.reply_timer = ReplyTimer()
+            self.reply_timer.start()
+        # Copy-on-write: las recargas construyen diccionarios nuevos y los
+        # sustituyen de una vez; los lectores toman una sola referencia
         self.tracks = {}
+        self.track_stamps = {}     # filename -> (size, mtime_ns)
         self.playlists = {}
-        self.active_streams = {}  # media_render_id -> StreamedFile
+        self.playlist_files = {}   # filename -> ((size, mtime_ns), Playlist sin filtrar)
+        self.track_order = self.sorted_tracks({})
+        self.playlist_order = self.sorted_playlists({})
+        self.search_index = SearchIndex()
+        self.track_views = None  # (tracks, TrackRecordSeq, TrackBatch) de la instantánea
+        self.track_playlists = {}  # track_id -> nombres de sus playlists
+        # Variantes de menor bitrate generadas por variants.py (None = sin ellas)
+        self.variants_dir = variants_dir
+        self.variants = {}         # filename -> {kbps: ruta}
+        self.variant_stamps = {}   # (filename, kbps) -> (size, mtime_ns)
+        self.library_lock = threading.Lock()
+        # Parte del reloj: tampoco se repite tras reiniciar el servidor
+        self.library_version = time_ns() // 1000
+        self.active_streams = StreamRegistry()  # media_render_id -> StreamedFile
+
+        # Streams abandonados: TTL de inactividad (0 = sin reaper), límite
+        # global con expulsión LRU (0 = sin límite) y cierre de conexión
+        self.stream_ttl = stream_ttl
+        self.max_streams = max_streams
+        self.connections = {}  # Ice.Connection -> {media_render_id}
+        self.counters_lock = threading.Lock()
+        self.counters = Counter()
+        self.store = MediaStore()
         self.load_media()
         self.load_playlists()
 
     def ensure_track_exists(self, track_id):
-        if track_id not in self.tracks:
+        if (track := self.tracks.get(track_id)) is None:
             raise Spotifice.TrackError(track_id, "Track not found")
+        return track
 
+    @staticmethod
+    def list_files(directory, suffix):
+        return [
+            filepath for filepath in sorted(Path(directory).iterdir())
+            if filepath.is_file() and filepath.suffix.lower() == suffix
+        ]
+
+    # Devuelve los filenames añadidos, borrados y modificados desde la carga anterior
     def load_media(self):
-        for filepath in sorted(Path(self.media_dir).iterdir()):
-            if not filepath.is_file() or filepath.suffix.lower() != ".mp3":
-                continue
+        with self.library_lock:
+            records = self.index.update(self.list_files(self.media_dir, ".mp3"))
+            stamps = {name: (r['size'], r['mtime_ns']) for name, r in records.items()}
+            added = stamps.keys() - self.track_stamps.keys()
+            removed = self.track_stamps.keys() - stamps.keys()
+            changed = {name for name in stamps.keys() & self.track_stamps.keys()
+                       if stamps[name] != self.track_stamps[name]}
 
-            self.tracks[filepath.name] = self.track_info(filepath)
+            variants, variant_stamps = self.read_variants()
+            stale_variants = {key for key, stamp in self.variant_stamps.items()
+                              if variant_stamps.get(key) != stamp}
 
-        logger.info(f"Load media:  {len(self.tracks)} tracks")
+            # Sólo se crean TrackInfo nuevos para lo que ha cambiado (también
+            # sus variantes); el resto se comparte con la instantánea anterior
+            previous = self.tracks
+            rebuilt = added | changed | {
+                name for name in variants.keys() | self.variants.keys()
+                if name in stamps
+                and sorted(variants.get(name, ())) != sorted(self.variants.get(name, ()))}
+            if removed or rebuilt:
+                fresh = {name: self.track_info(records[name], variants.get(name))
+                         for name in rebuilt}
+                # Mismo orden que los registros del índice (por filename)
+                tracks = {name: fresh[name] if name in fresh else previous[name]
+                          for name in records}
+                self.track_order = self.track_order.replace(
+                    [previous[name] for name in removed | rebuilt if name in previous],
+                    fresh.values())
+                self.tracks = tracks
+            self.track_stamps = stamps
+            self.variants = variants
+            if added or removed or changed or variant_stamps != self.variant_stamps:
+                self.library_version += 1
+            self.variant_stamps = variant_stamps
 
-    # Carga todas las playlists desde el directorio de playlists.
-    def load_playlists(self):
-        for filepath in sorted(self.playlists_dir.iterdir()):
-            if not filepath.is_file() or filepath.suffix.lower() != ".playlist":
-                continue
+            for name in removed:
+                self.search_index.remove(name)
+            self.search_index.update_many(
+                (name, self.search_fields(self.tracks[name])) for name in added | changed)
 
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+        # Lo ya cacheado o mapeado de un fichero modificado o borrado no vale
+        for name in removed | changed:
+            self.store.invalidate(self.media_dir / name)
+            if self.cache is not None:
+                self.cache.invalidate(name)
+        for name, kbps in stale_variants:
+            self.store.invalidate(self.variants_dir / str(kbps) / name)
+            if self.cache is not None:
+                self.cache.invalidate(f'{name}@{kbps}')
 
-                # Filtrar pistas que no existen
-                valid_track_ids = [
-                    track_id for track_id in data.get('track_ids', [])
-                    if track_id in self.tracks
-                ]
+        logger.info(f"Load media:  {len(self.tracks)} tracks "
+                    f"(+{len(added)} -{len(removed)} ~{len(changed)})")
+        return added, removed, changed
 
-                # Convertir fecha string a timestamp (long)
-                created_at_str = data.get('created_at', '')
+    def read_variants(self):
+        variants, stamps = {}, {}
+        for name, rungs in scan_variants(self.variants_dir).items():
+            for kbps, path in rungs.items():
                 try:
-                    created_at = int(datetime.strptime(
-                        created_at_str, '%d-%m-%Y').timestamp())
-                except ValueError:
-                    created_at = 0  # Fecha por defecto si no se puede parsear
-
-                # Crear objeto Playlist de Ice
-                playlist = Spotifice.Playlist(
-                    id=data.get('id', filepath.stem),
-                    name=data.get('name', ''),
-                    description=data.get('description', ''),
-                    owner=data.get('owner', ''),
-                    created_at=created_at,
-                    track_ids=valid_track_ids
-                )
-
-                self.playlists[playlist.id] = playlist
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                variants.setdefault(name, {})[kbps] = path
+                stamps[name, kbps] = (stat.st_size, stat.st_mtime_ns)
+        return variants, stamps
+
+    def search_fields(self, track):
+        return {
+            'title': track.title,
+            'artist': track.artist or '',
+            'album': track.album or '',
+            'filename': Path(track.filename).stem,
+            'playlists': ' '.join(self.track_playlists.get(track.id, ())),
+        }
+
+    @staticmethod
+    def track_record(track):
+        return Spotifice.TrackRecord(
+            track.id, track.title, track.filename,
+            track.artist or '', track.album or '',
+            track.duration_ms or 0, track.bitrate or 0, track.size or 0)
+
+    # Las respuestas struct y por columnas se construyen una vez por instantánea
+    def track_records(self):
+        tracks = self.tracks
+        if (views := self.track_views) is None or views[0] is not tracks:
+            records = [self.track_record(track) for track in tracks.values()]
+            batch = Spotifice.TrackBatch(
+                ids=[r.id for r in records],
+                titles=[r.title for r in records],
+                filenames=[r.filename for r in records],
+                artists=[r.artist for r in records],
+                albums=[r.album for r in records],
+                durations_ms=[r.duration_ms for r in records],
+                bitrates=[r.bitrate for r in records],
+                sizes=[r.size for r in records])
+            views = self.track_views = (tracks, records, batch)
+        return views
+
+    @staticmethod
+    def sorted_tracks(tracks):
+        return SortedIndex(tracks.values(), lambda t: t.title, lambda t: t.id)
+
+    @staticmethod
+    def sorted_playlists(playlists):
+        return SortedIndex(playlists.values(), lambda pl: pl.name, lambda pl: pl.id)
+
+    def page(self, index, cursor, limit, filter_text, mode):
+        limit = min(limit, self.PAGE_LIMIT) if limit > 0 else self.PAGE_LIMIT
+        mode = SUBSTRING if mode == Spotifice.MatchMode.SUBSTRING else PREFIX
+        try:
+            return index.page(cursor, limit, filter_text, mode)
+        except ValueError as e:
+            raise Spotifice.Error(cursor, str(e))
 
+    @staticmethod
+    def parse_playlist(filepath):
+        with open(filepath, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        # Convertir fecha string a timestamp (long)
+        created_at_str = data.get('created_at', '')
+        try:
+            created_at = int(datetime.strptime(
+                created_at_str, '%d-%m-%Y').timestamp())
+        except ValueError:
+            created_at = 0  # Fecha por defecto si no se puede parsear
+
+        # Crear objeto Playlist de Ice
+        return Spotifice.Playlist(
+            id=data.get('id', filepath.stem),
+            name=data.get('name', ''),
+            description=data.get('description', ''),
+            owner=data.get('owner', ''),
+            created_at=created_at,
+            track_ids=data.get('track_ids', [])
+        )
+
+    # filename -> (stamp, Playlist sin filtrar); sólo vuelve a leer los
+    # ficheros modificados desde la carga anterior
+    def read_playlist_files(self):
+        playlist_files = {}
+        for filepath in self.list_files(self.playlists_dir, ".playlist"):
+            stat = filepath.stat()
+            stamp = (stat.st_size, stat.st_mtime_ns)
+            known = self.playlist_files.get(filepath.name)
+            if known and known[0] == stamp:
+                playlist_files[filepath.name] = known
+                continue
+
+            try:
+                playlist_files[filepath.name] = (stamp, self.parse_playlist(filepath))
             except Exception as e:
                 logger.error(f"Error loading playlist '{filepath.name}': {e}")
+        return playlist_files
+
+    # Carga las playlists del directorio y las revalida todas contra las
+    # pistas actuales
+    def load_playlists(self):
+        with self.library_lock:
+            tracks = self.tracks
+            playlist_files = self.read_playlist_files()
+
+            playlists = {}
+            for _, source in playlist_files.values():
+                # Filtrar pistas que no existen
+                playlists[source.id] = Spotifice.Playlist(
+                    id=source.id,
+                    name=source.name,
+                    description=source.description,
+                    owner=source.owner,
+                    created_at=source.created_at,
+                    track_ids=[track_id for track_id in source.track_ids
+                               if track_id in tracks])
+
+            self.playlist_files = playlist_files
+            self.playlist_order = self.sorted_playlists(playlists)
+            self.playlists = playlists
+            self.library_version += 1
+
+            # Los nombres de playlist son un campo más de la búsqueda
+            track_playlists = {}
+            for playlist in playlists.values():
+                for track_id in playlist.track_ids:
+                    track_playlists.setdefault(track_id, []).append(playlist.name)
+            previous, self.track_playlists = self.track_playlists, track_playlists
+            stale = {track_id for track_id in track_playlists.keys() | previous.keys()
+                     if track_playlists.get(track_id) != previous.get(track_id)}
+            self.search_index.update_many(
+                (track_id, self.search_fields(tracks[track_id]))
+                for track_id in stale if track_id in tracks)
 
         logger.info(f"Load playlists: {len(self.playlists)} playlists")
 
+    # Precarga en caché el comienzo de las pistas con que empiezan más playlists
+    def warm_up_cache(self, size, tracks_per_playlist=1):
+        heads = Counter(
+            track_id for playlist in self.playlists.values()
+            for track_id in playlist.track_ids[:tracks_per_playlist])
+
+        for track_id, _ in heads.most_common():
+            path = self.media_dir / self.tracks[track_id].filename
+            try:
+                mapped = self.store.acquire(path)
+            except Exception as e:
+                logger.error(f"Error warming up '{track_id}': {e}")
+                continue
+
+            try:
+                self.cache.warm_up(track_id, size, mapped.slice)
+            finally:
+                self.store.release(mapped)
+
+        logger.info(f"Cache warm-up: {len(self.cache)} blocks, {self.cache.size} bytes")
+
     @staticmethod
-    def track_info(filepath):
-        return  Spotifice.TrackInfo(
-            id=filepath.name,
-            title=filepath.stem,
-            filename=filepath.name)
+    def track_info(record, variants=None):
+        track = Spotifice.TrackInfo(
+            id=record['filename'],
+            title=record['title'],
+            filename=record['filename'],
+            artist=record['artist'],
+            album=record['album'],
+            duration_ms=record['duration_ms'],
+            bitrate=record['bitrate'],
+            size=record['size'])
+        if variants:
+            track.variants = sorted(variants)
+        return track
 
     # ---- MusicLibrary ----
     def get_all_tracks(self, current=None):
         return list(self.tracks.values())
 
+    def get_tracks(self, cursor, limit, filter_text, mode, current=None):
+        tracks, next_cursor, total = self.page(
+            self.track_order, cursor, limit, filter_text, mode)
+        return Spotifice.TrackPage(tracks, next_cursor, total)
+
+    def get_all_track_records(self, current=None):
+        return self.track_records()[1]
+
+    def get_track_batch(self, current=None):
+        return self.track_records()[2]
+
+    def search(self, query, limit, current=None):
+        limit = min(limit, self.PAGE_LIMIT) if limit > 0 else self.SEARCH_LIMIT
+        tracks = self.tracks
+        return [tracks[track_id] for track_id in self.search_index.search(query, limit)
+                if track_id in tracks]
+
     def get_track_info(self, track_id, current=None):
-        self.ensure_track_exists(track_id)
-        return self.tracks[track_id]
+        return self.ensure_track_exists(track_id)
+
+    def get_library_version(self, current=None):
+        return self.library_version
+
+    def get_tracks_info(self, track_ids, current=None):
+        tracks = self.tracks
+        for track_id in track_ids:
+            if track_id not in tracks:
+                raise Spotifice.TrackError(track_id, "Track not found")
+        return [tracks[track_id] for track_id in track_ids]
 
     # ---- StreamManager ----
     def open_stream(self, track_id, render_id, current=None):
+        self.create_stream(track_id, render_id, current)
+
+    def variant_file(self, track, variant, str_render_id):
+        "Fichero de la variante (0 = el original)"
+        if not variant:
+            return self.media_dir / track.filename
+        if (path := self.variants.get(track.filename, {}).get(variant)) is None:
+            raise Spotifice.StreamError(
+                str_render_id, f"No {variant} kbps variant of '{track.id}'")
+        return path
+
+    def create_stream(self, track_id, render_id, current=None, offset=0, variant=0,
+                      from_variant=None, audio_only=False):
         str_render_id = id2str(render_id)
-        self.ensure_track_exists(track_id)
+        track = self.ensure_track_exists(track_id)
 
         if not render_id.name:
             raise Spotifice.BadIdentity(str_render_id, "Invalid render identity")
 
-        self.active_streams[str_render_id] = StreamedFile(
-            self.tracks[track_id], self.media_dir)
+        path = self.variant_file(track, variant, str_render_id)
+        if from_variant is not None:
+            # Cambio de variante: el offset es de la otra, mismo instante en ésta
+            source = self.variant_file(track, from_variant, str_render_id)
+            try:
+                offset = map_offset(offset, source, path)
+            except OSError as e:
+                raise Spotifice.IOError(track.filename, f"Error mapping offset: {e}")
+        end = None
+        if audio_only:
+            try:
+                start, end = audio_range(path)
+            except OSError as e:
+                raise Spotifice.IOError(track.filename, f"Error reading MPEG frames: {e}")
+            offset = max(offset, start)
 
-        logger.info("Open stream for track '{}' on render '{}'".format(
-            track_id, str_render_id))
+        streamed_file = StreamedFile(
+            track, self.media_dir, self.store, offset, self.cache, variant, path, end)
+        if previous := self.active_streams.put(str_render_id, streamed_file):
+            previous.close()
+        if current and current.con:
+            self.track_connection(current.con, str_render_id, streamed_file)
+        if self.max_streams > 0:
+            self.evict_streams(keep=streamed_file)
 
-    def close_stream(self, render_id, current=None):
-        str_render_id = id2str(render_id)
-        if stream_state := self.active_streams.pop(str_render_id, None):
-            stream_state.close()
-            logger.info(f"Closed stream for render '{str_render_id}'")
+        logger.info("Open stream for track '{}'{} on render '{}' at {}".format(
+            track_id, f" ({variant} kbps)" if variant else "", str_render_id, offset))
+        return streamed_file
 
-    def get_audio_chunk(self, render_id, chunk_size, current=None):
+    def close_stream(self, render_id, current=None, expected=None):
+        self.discard_stream(id2str(render_id), expected)
+
+    def discard_stream(self, str_render_id, expected=None, reason=None):
+        if not (stream_state := self.active_streams.pop(str_render_id, expected)):
+            return False
+
+        stream_state.close()
+        if reason:
+            with self.counters_lock:
+                self.counters[reason] += 1
+        logger.info("Closed stream for render '{}'{}".format(
+            str_render_id, f" ({reason})" if reason else ""))
+        return True
+
+    def track_connection(self, con, str_render_id, streamed_file):
+        streamed_file.connection = con
+        with self.counters_lock:
+            if (renders := self.connections.get(con)) is None:
+                renders = self.connections[con] = set()
+                register = True
+            else:
+                register = False
+            renders.add(str_render_id)
+
+        # Fuera del cerrojo: si ya está cerrada, Ice llama al callback en el acto.
+        # IcePy sólo acepta funciones, no métodos ligados
+        if register:
+            con.setCloseCallback(lambda con: self.on_connection_closed(con))
+
+    def on_connection_closed(self, con):
+        with self.counters_lock:
+            renders = self.connections.pop(con, set())
+
+        for str_render_id in renders:
+            streamed_file = self.active_streams.get(str_render_id)
+            if streamed_file is not None and streamed_file.connection == con:
+                self.discard_stream(str_render_id, streamed_file, 'disconnected')
+
+    def reap_idle_streams(self, now=None):
+        now = monotonic() if now is None else now
+        idle = self.active_streams.idle(self.stream_ttl, now)
+        for str_render_id, streamed_file in idle:
+            self.discard_stream(str_render_id, streamed_file, 'reaped')
+
+    def evict_streams(self, keep=None):
+        while len(self.active_streams) > self.max_streams:
+            if (lru := self.active_streams.least_recently_used()) is None:
+                return
+            str_render_id, streamed_file = lru
+            if streamed_file is keep:
+                return
+            self.discard_stream(str_render_id, streamed_file, 'evicted')
+
+    def stream_stats(self):
+        with self.counters_lock:
+            return {
+                'open_streams': len(self.active_streams),
+                'open_files': len(self.store),
+                'max_streams': self.max_streams,
+                'idle_ttl_secs': self.stream_ttl,
+                'reaped': self.counters['reaped'],
+                'evicted': self.counters['evicted'],
+                'disconnected': self.counters['disconnected'],
+            }
+
+    def get_stream(self, render_id):
         str_render_id = id2str(render_id)
-        try:
-            streamed_file = self.active_streams[str_render_id]
-        except KeyError:
+        if (streamed_file := self.active_streams.get(str_render_id)) is None:
             raise Spotifice.StreamError(str_render_id, "No open stream for render")
+        return streamed_file
+
+    # Lee con `read(size)` lo que permita el shaper; devuelve (data, espera en s).
+    # Las operaciones sin pista de espera reciben al menos min_chunk bytes
+    # (lectura corta, un chunk vacío significaría fin de pista) y su
+    # respuesta se retiene la espera con AMD, sin ocupar un hilo de Ice
+    def shaped_read(self, render_id, streamed_file, size, read, debt=True):
+        if self.shaper is None:
+            return read(size), 0.0
+
+        str_render_id = id2str(render_id)
+        granted, wait = self.shaper.take(
+            str_render_id, size, streamed_file.bitrate, debt)
+        data = read(granted) if granted else b''
+        self.shaper.served(str_render_id, granted, len(data))
+        return data, wait
+
+    def reply_later(self, data, delay):
+        if delay <= 0:
+            return data
+        future = Ice.Future()
+        self.reply_timer.call_later(delay, lambda: future.set_result(data))
+        return future
+
+    def get_audio_chunk(self, render_id, chunk_size, current=None):
+        streamed_file = self.get_stream(render_id)
 
         try:
-            data = streamed_file.read(chunk_size)
+            data, delay = self.shaped_read(
+                render_id, streamed_file, chunk_size, streamed_file.read)
             if not data:
                 logger.info(f"Track exhausted: '{streamed_file.track.id}'")
-                self.close_stream(render_id, current)
-            return data
+                # Sólo este stream: el render puede haber abierto otro entretanto
+                self.close_stream(render_id, current, expected=streamed_file)
+            return self.reply_later(data, delay)
 
         except Exception as e:
             raise Spotifice.IOError(
                 streamed_file.track.filename, f"Error reading file: {e}")
 
+    # El stream no se cierra al llegar al final: puede haber otras peticiones
+    # en vuelo para offsets anteriores. Lo cierra el render con close_stream.
+    def get_audio_chunk_at(self, render_id, offset, chunk_size, current=None):
+        return self.reply_later(*self.read_chunk_at(render_id, offset, chunk_size))
+
+    # Como get_audio_chunk_at, pero si el render supera su parte del ancho de
+    # banda puede recibir menos bytes (o ninguno) y cuánto esperar
+    def get_audio_chunk_paced(self, render_id, offset, chunk_size, current=None):
+        data, wait = self.read_chunk_at(render_id, offset, chunk_size, debt=False)
+        return Spotifice.PacedChunk(data, math.ceil(wait * 1000))
+
+    def read_chunk_at(self, render_id, offset, chunk_size, debt=True):
+        streamed_file = self.get_stream(render_id)
+        if offset < 0:
+            raise Spotifice.StreamError(id2str(render_id), "Invalid offset")
+
+        try:
+            return self.shaped_read(
+                render_id, streamed_file, chunk_size,
+                lambda size: streamed_file.read_at(offset, size), debt)
+        except Exception as e:
+            raise Spotifice.IOError(
+                streamed_file.track.filename, f"Error reading file: {e}")
+
+    # Abre el stream (opcionalmente desde un offset, p.ej. para reanudar tras
+    # un fallo) y, si el render registra un AudioSink y el servidor lo
+    # permite, lo sirve en modo push. Si no, el render sigue pidiendo chunks.
+    def open_stream_with(self, track_id, render_id, options, current=None):
+        offset = options.offset if options and options.offset is not Ice.Unset else 0
+        if offset < 0:
+            raise Spotifice.StreamError(id2str(render_id), "Invalid offset")
+        variant = options.variant if options and options.variant is not Ice.Unset else 0
+        from_variant = options.from_variant \
+            if options and options.from_variant is not Ice.Unset else None
+        audio_only = bool(options and options.audio_only is not Ice.Unset
+                          and options.audio_only)
+
+        streamed_file = self.create_stream(
+            track_id, render_id, current, offset, variant, from_variant, audio_only)
+        info = Spotifice.StreamInfo(
+            push=False, size=streamed_file.size, offset=streamed_file.position)
+
+        sink = options.sink if options else Ice.Unset
+        if not self.push_enabled or sink in (Ice.Unset, None):
+            return info
+
+        credits = options.credits if options.credits is not Ice.Unset else 0
+        chunk_size = options.chunk_size
+        if chunk_size is Ice.Unset or chunk_size <= 0:
+            chunk_size = PushSender.CHUNK_SIZE
+
+        streamed_file.sender = PushSender(
+            streamed_file, sink, credits, chunk_size,
+            self.push_batch_size, self.shaper, id2str(render_id))
+        streamed_file.sender.start()
+
+        logger.info(f"Push stream for render '{id2str(render_id)}'")
+        info.push = True
+        return info
+
+    def grant_credits(self, render_id, credits, current=None):
+        streamed_file = self.active_streams.get(id2str(render_id))
+        if streamed_file is not None and streamed_file.sender:
+            streamed_file.last_used = monotonic()
+            streamed_file.sender.grant(credits)
+
+    def shutdown(self):
+        if self.reply_timer is not None:
+            self.reply_timer.stop()
+
     # ---- PlaylistManager ----
+    # Devuelve la playlist junto a la información de todas sus pistas.
+    def get_playlist_expanded(self, playlist_id, current=None):
+        playlist = self.get_playlist(playlist_id)
+        tracks = self.tracks
+        return Spotifice.ExpandedPlaylist(playlist, [
+            tracks[track_id] for track_id in playlist.track_ids if track_id in tracks])
+
     # Devuelve la lista de todas las playlists disponibles.
     def get_all_playlists(self, current=None):
         return list(self.playlists.values())
 
+    # Devuelve una página de playlists ordenadas por nombre.
+    def get_playlists(self, cursor, limit, filter_text, mode, current=None):
+        playlists, next_cursor, total = self.page(
+            self.playlist_order, cursor, limit, filter_text, mode)
+        return Spotifice.PlaylistPage(playlists, next_cursor, total)
+
     # Devuelve la información de una playlist específica.
     def get_playlist(self, playlist_id, current=None):
-        if playlist_id not in self.playlists:
+        if (playlist := self.playlists.get(playlist_id)) is None:
             raise Spotifice.PlaylistError(playlist_id, "Playlist not found")
-        return self.playlists[playlist_id]
+        return playlist
+
+
+def complete_future(ice_future, future):
+    if (exception := future.exception()) is not None:
+        ice_future.set_exception(exception)
+    elif isinstance(result := future.result(), Ice.Future):
+        # Respuesta retenida por el shaper
+        result.add_done_callback(lambda result: complete_future(ice_future, result))
+    else:
+        ice_future.set_result(result)
+
+
+class AsyncMediaServerI(MediaServerI):
+    """MediaServerI con despacho asíncrono (AMD) de las operaciones de audio.
+
+    open_stream y get_audio_chunk* devuelven un Ice.Future: el hilo de Ice
+    sólo lanza una corrutina en un bucle asyncio propio y queda libre para
+    la siguiente petición. La lectura del mmap, que puede bloquear en un
+    fallo de página, se hace en un pool de `readers` hilos; los bloques que
+    ya están en la ChunkCache se devuelven en el acto. Así miles de
+    peticiones en vuelo no necesitan miles de hilos.
+    """
+
+    READERS = 8
+
+    def __init__(self, *args, readers=READERS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.readers = ThreadPoolExecutor(readers, thread_name_prefix='MediaReader')
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(self.readers)
+        threading.Thread(
+            target=self.loop.run_forever, name='MediaServerLoop', daemon=True).start()
+        # Sólo los modifica el hilo del bucle
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def defer(self, call, *args):
+        future = Ice.Future()
+        task = asyncio.run_coroutine_threadsafe(self.run_blocking(call, args), self.loop)
+        task.add_done_callback(lambda task: complete_future(future, task))
+        return future
+
+    async def run_blocking(self, call, args):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return await self.loop.run_in_executor(None, call, *args)
+        finally:
+            self.in_flight -= 1
+
+    def read_async(self, streamed_file, offset, size, read, *args):
+        if self.cache is not None and \
+                self.cache.covers(streamed_file.cache_key, offset, size):
+            with self.counters_lock:
+                self.counters['cached_reads'] += 1
+            return read(*args)
+
+        with self.counters_lock:
+            self.counters['deferred_reads'] += 1
+        return self.defer(read, *args)
+
+    def open_stream(self, track_id, render_id, current=None):
+        return self.defer(super().open_stream, track_id, render_id, current)
+
+    def get_audio_chunk(self, render_id, chunk_size, current=None):
+        # Los errores de validación se lanzan aquí, antes de crear el future
+        streamed_file = self.get_stream(render_id)
+        return self.read_async(
+            streamed_file, streamed_file.position, chunk_size,
+            super().get_audio_chunk, render_id, chunk_size, current)
+
+    def get_audio_chunk_at(self, render_id, offset, chunk_size, current=None):
+        streamed_file = self.get_stream(render_id)
+        if offset < 0:
+            raise Spotifice.StreamError(id2str(render_id), "Invalid offset")
+        return self.read_async(
+            streamed_file, offset, chunk_size,
+            super().get_audio_chunk_at, render_id, offset, chunk_size, current)
+
+    def get_audio_chunk_paced(self, render_id, offset, chunk_size, current=None):
+        streamed_file = self.get_stream(render_id)
+        if offset < 0:
+            raise Spotifice.StreamError(id2str(render_id), "Invalid offset")
+        return self.read_async(
+            streamed_file, offset, chunk_size,
+            super().get_audio_chunk_paced, render_id, offset, chunk_size, current)
+
+    def stream_stats(self):
+        stats = super().stream_stats()
+        with self.counters_lock:
+            stats.update(
+                in_flight=self.in_flight,
+                max_in_flight=self.max_in_flight,
+                cached_reads=self.counters['cached_reads'],
+                deferred_reads=self.counters['deferred_reads'])
+        return stats
+
+    def shutdown(self):
+        super().shutdown()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.readers.shutdown(wait=False)
+
+
+SERVANT_MODES = {'threads': MediaServerI, 'asyncio': AsyncMediaServerI}
+
+
+def library_dirs(properties):
+    return (
+        Path(properties.getPropertyWithDefault('MediaServer.Content', 'media')),
+        Path(properties.getPropertyWithDefault('MediaServer.Playlists', 'playlists')))
+
+
+def create_track_index(properties):
+    # Sin fichero, el índice vive en memoria y se reconstruye en cada arranque
+    return TrackIndex(
+        properties.getPropertyWithDefault('MediaServer.Index', ':memory:'),
+        properties.getPropertyAsInt('MediaServer.Index.Workers') or None)
+
+
+def create_cache(properties):
+    if (cache_bytes := properties.getPropertyAsInt('MediaServer.Cache.MaxBytes')) <= 0:
+        return None
+    return ChunkCache(cache_bytes, properties.getPropertyAsIntWithDefault(
+        'MediaServer.Cache.BlockSize', ChunkCache.BLOCK_SIZE))
+
+
+def create_shaper(properties):
+    shaper = BandwidthShaper.from_properties(properties, 'MediaServer')
+    return shaper if shaper.enabled else None
+
+
+def servant_options(properties):
+    "Parámetros de streaming de MediaServerI, comunes al servidor y a sus workers"
+    return dict(
+        push_enabled=properties.getPropertyAsIntWithDefault(
+            'MediaServer.Push.Enabled', 1) > 0,
+        push_batch_size=properties.getPropertyAsIntWithDefault(
+            'MediaServer.Push.BatchSize', 1),
+        stream_ttl=properties.getPropertyAsInt('MediaServer.Streams.IdleTimeout'),
+        max_streams=properties.getPropertyAsInt('MediaServer.Streams.Max'),
+        shaper=create_shaper(properties),
+        variants_dir=variants_dir(properties))
 
 
 def main(ic):
     properties = ic.getProperties()
-    media_dir = properties.getPropertyWithDefault(
-        'MediaServer.Content', 'media')
-    playlists_dir = properties.getPropertyWithDefault(
-        'MediaServer.Playlists', 'playlists')
-    servant = MediaServerI(Path(media_dir), Path(playlists_dir))
+    # Modo supervisor: M procesos worker tras un localizador (media_workers
+    # importa este módulo, de ahí que no se importe arriba)
+    if properties.getPropertyAsInt('MediaServer.Workers') > 1:
+        import media_workers
+        return media_workers.main(ic)
+
+    index = create_track_index(properties)
+    if (cache := create_cache(properties)) is not None:
+        add_stats_facet(ic, "Cache", cache.stats)
+
+    # threads: despacho síncrono en el pool de Ice; asyncio: AMD con futures
+    mode = properties.getPropertyWithDefault('MediaServer.Mode', 'threads')
+    if mode not in SERVANT_MODES:
+        sys.exit(f"Unknown MediaServer.Mode '{mode}'")
+    servant = SERVANT_MODES[mode](
+        *library_dirs(properties), cache=cache, index=index,
+        **servant_options(properties))
+    add_stats_facet(ic, "Streams", servant.stream_stats)
+    if servant.shaper is not None:
+        add_stats_facet(ic, "Shaping", servant.shaper.stats)
+
+    if cache is not None:
+        servant.warm_up_cache(
+            properties.getPropertyAsIntWithDefault(
+                'MediaServer.Cache.WarmupBytes', 4 * ChunkCache.BLOCK_SIZE),
+            properties.getPropertyAsIntWithDefault('MediaServer.Cache.WarmupTracks', 1))
 
     adapter = ic.createObjectAdapter("MediaServerAdapter")
-    proxy = adapter.add(servant, ic.stringToIdentity("mediaServer1"))
+    # Todas las réplicas de un grupo de IceGrid comparten la identidad
+    proxy = adapter.add(servant, ic.stringToIdentity(
+        properties.getPropertyWithDefault('MediaServer.Identity', 'mediaServer1')))
     logger.info(f"MediaServer: {proxy}")
 
+    reaper = None
+    if servant.stream_ttl > 0:
+        reaper = StreamReaper(servant, servant.stream_ttl)
+        reaper.start()
+
+    # Recarga de pistas y playlists sin reiniciar (0 = desactivada)
+    watcher = None
+    if (watch_interval := properties.getPropertyAsInt('MediaServer.Watch.Interval')) > 0:
+        watcher = LibraryWatcher(servant, watch_interval)
+        watcher.start()
+
     adapter.activate()
     ic.waitForShutdown()
+    for thread in (reaper, watcher):
+        if thread:
+            thread.stop()
+    servant.shutdown()
+    index.close()
 
     logger.info("Shutdown")
 
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+
+import logging
+import multiprocessing
+import threading
+from collections import Counter
+
+import Ice
+
+from chunk_cache import ChunkCache
+from library_watcher import LibraryWatcher
+from media_server import (
+    MediaServerI,
+    Spotifice,
+    StreamReaper,
+    create_cache,
+    create_track_index,
+    library_dirs,
+    servant_options,
+)
+from shared_catalogue import SharedCatalogue
+from stats_facet import add_stats_facet
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("MediaWorkers")
+
+LOCATOR_IDENTITY = 'MediaServer/Locator'
+
+
+def catalogue_snapshot(servant):
+    "Lo que un worker necesita para servir la biblioteca sin leer el disco"
+    with servant.library_lock:
+        return servant.library_version, {
+            'records': servant.index.records(),
+            'playlists': {
+                name: (stamp, dict(
+                    id=playlist.id, name=playlist.name,
+                    description=playlist.description, owner=playlist.owner,
+                    created_at=playlist.created_at, track_ids=list(playlist.track_ids)))
+                for name, (stamp, playlist) in servant.playlist_files.items()},
+        }
+
+
+def publish_catalogue(servant, catalogue):
+    if servant.library_version != catalogue.version():
+        catalogue.publish(*catalogue_snapshot(servant))
+        logger.info(f"Catalogue v{catalogue.version()} published: "
+                    f"{len(servant.tracks)} tracks, {len(servant.playlists)} playlists")
+
+
+class PeriodicTask(threading.Thread):
+    def __init__(self, interval, task):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.task = task
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.task()
+            except Exception as e:
+                logger.error(f"Periodic task failed: {e}")
+
+    def stop(self):
+        self.stopped.set()
+
+
+class SnapshotIndex:
+    "Hace de TrackIndex en los workers: los registros salen de la instantánea"
+
+    def __init__(self, servant):
+        self.servant = servant
+
+    def update(self, files):
+        return self.servant.snapshot['records']
+
+    def records(self):
+        return self.servant.snapshot['records']
+
+    def close(self):
+        pass
+
+
+class WorkerServerI(MediaServerI):
+    """MediaServerI de un proceso worker.
+
+    Pistas y playlists salen de la instantánea que publica el supervisor
+    en memoria compartida: el worker no analiza MP3 ni lee playlists, sólo
+    sirve el audio. Todos los workers usan la versión de la instantánea
+    como versión de biblioteca, así la caché del render no depende de cuál
+    le haya tocado.
+    """
+
+    def __init__(self, media_dir, playlists_dir, catalogue, **kwargs):
+        self.catalogue = catalogue
+        self.snapshot_version, self.snapshot = catalogue.read()
+        super().__init__(media_dir, playlists_dir, index=SnapshotIndex(self), **kwargs)
+        self.library_version = self.snapshot_version
+
+    def read_playlist_files(self):
+        playlist_files = {}
+        for name, (stamp, fields) in self.snapshot['playlists'].items():
+            known = self.playlist_files.get(name)
+            playlist_files[name] = known if known and known[0] == stamp \
+                else (stamp, Spotifice.Playlist(**fields))
+        return playlist_files
+
+    def refresh(self):
+        "Aplica la instantánea publicada si es más nueva que la cargada"
+        if (published := self.catalogue.read(self.snapshot_version)) is None:
+            return False
+
+        self.snapshot_version, self.snapshot = published
+        self.load_media()
+        self.load_playlists()
+        with self.library_lock:
+            self.library_version = self.snapshot_version
+        return True
+
+
+def worker_properties(properties):
+    "Las del supervisor, sin el admin (un puerto por proceso) ni el modo supervisor"
+    return {
+        key: value for key, value in properties.getPropertiesForPrefix('').items()
+        if not key.startswith('Ice.Admin.') and not key.startswith('MediaServer.Workers')
+    } | {'MediaServer.Workers.Endpoints': properties.getPropertyWithDefault(
+        'MediaServer.Workers.Endpoints', 'tcp')}
+
+
+def worker_main(number, properties, catalogue_name, identity, pipe):
+    init_data = Ice.InitializationData()
+    init_data.properties = Ice.createProperties()
+    for key, value in properties.items():
+        init_data.properties.setProperty(key, value)
+
+    with Ice.initialize(init_data) as ic:
+        properties = ic.getProperties()
+        catalogue = SharedCatalogue.attach(catalogue_name)
+        cache = create_cache(properties)
+        servant = WorkerServerI(
+            *library_dirs(properties), catalogue, cache=cache,
+            **servant_options(properties))
+        if cache is not None:
+            servant.warm_up_cache(
+                properties.getPropertyAsIntWithDefault(
+                    'MediaServer.Cache.WarmupBytes', 4 * ChunkCache.BLOCK_SIZE),
+                properties.getPropertyAsIntWithDefault(
+                    'MediaServer.Cache.WarmupTracks', 1))
+
+        adapter = ic.createObjectAdapterWithEndpoints(
+            f'MediaServerWorker{number}',
+            properties.getProperty('MediaServer.Workers.Endpoints'))
+        proxy = adapter.add(servant, identity)
+        adapter.activate()
+
+        threads = []
+        if servant.stream_ttl > 0:
+            threads.append(StreamReaper(servant, servant.stream_ttl))
+        if (interval := properties.getPropertyAsInt('MediaServer.Watch.Interval')) > 0:
+            threads.append(PeriodicTask(interval, servant.refresh))
+        for thread in threads:
+            thread.start()
+
+        pipe.send(ic.proxyToString(proxy))
+        # Hasta que el supervisor cierre su extremo (también si muere)
+        try:
+            pipe.recv()
+        except EOFError:
+            pass
+
+        for thread in threads:
+            thread.stop()
+        servant.shutdown()
+        catalogue.close()
+
+
+class WorkerPool:
+    "Procesos worker y reparto de clientes entre ellos por turnos"
+
+    STARTUP_SECS = 30
+    RESPAWN_SECS = 1
+
+    def __init__(self, ic, count, properties, catalogue_name, identity):
+        self.ic = ic
+        self.count = count
+        self.properties = properties
+        self.catalogue_name = catalogue_name
+        self.identity = identity
+        # spawn: un proceso nuevo no hereda los hilos del communicator
+        self.context = multiprocessing.get_context('spawn')
+        self.workers = []  # (proceso, extremo del pipe, proxy)
+        self.lock = threading.Lock()
+        self.turn = 0
+        self.routed = Counter()
+        self.respawned = 0
+
+    def spawn(self, number):
+        pipe, child_pipe = self.context.Pipe()
+        process = self.context.Process(
+            target=worker_main, name=f'MediaServerWorker{number}', daemon=True,
+            args=(number, self.properties, self.catalogue_name, self.identity,
+                  child_pipe))
+        process.start()
+        child_pipe.close()
+        return process, pipe
+
+    def wait_ready(self, process, pipe):
+        # poll() también vuelve si el worker muere al arrancar y cierra su extremo
+        proxy = None
+        if pipe.poll(self.STARTUP_SECS) and process.is_alive():
+            try:
+                proxy = self.ic.stringToProxy(pipe.recv())
+            except EOFError:
+                pass
+        if proxy is None:
+            process.terminate()
+            pipe.close()
+            raise RuntimeError(f"{process.name} did not start")
+        logger.info(f"{process.name} (pid {process.pid}): {proxy}")
+        return process, pipe, proxy
+
+    def start(self):
+        spawned = [self.spawn(number) for number in range(self.count)]
+        self.workers = [self.wait_ready(*worker) for worker in spawned]
+
+    def respawn(self):
+        """Relanza los workers que han muerto.
+
+        Mientras tanto next_proxy los salta; los clientes que tenían uno
+        en la caché de localizador vuelven a resolver al fallar la conexión.
+        """
+        for number, (process, pipe, _) in enumerate(list(self.workers)):
+            if process.is_alive():
+                continue
+            logger.error(f"{process.name} (pid {process.pid}) died with exit code "
+                         f"{process.exitcode}, respawning")
+            pipe.close()
+            worker = self.wait_ready(*self.spawn(number))
+            with self.lock:
+                self.workers[number] = worker
+                self.respawned += 1
+
+    def next_proxy(self):
+        with self.lock:
+            for _ in range(len(self.workers)):
+                number = self.turn % len(self.workers)
+                self.turn += 1
+                process, _, proxy = self.workers[number]
+                if process.is_alive():
+                    self.routed[number] += 1
+                    return proxy
+        return None
+
+    def stop(self):
+        for process, pipe, *_ in self.workers:
+            pipe.close()
+        for process, *_ in self.workers:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+    def stats(self):
+        with self.lock:
+            stats = {
+                'workers': len(self.workers),
+                'alive': sum(process.is_alive() for process, *_ in self.workers),
+                'respawned': self.respawned,
+            }
+            stats.update(
+                {f'routed_{number}': count for number, count in self.routed.items()})
+            return stats
+
+
+class WorkerLocatorI(Ice.Locator):
+    """Localizador que resuelve la identidad del MediaServer a un worker.
+
+    Cada communicator cliente guarda la respuesta en su caché de
+    localizador, así que un render sigue con el mismo worker (y sus
+    streams) mientras no falle la conexión.
+    """
+
+    def __init__(self, identity, pool):
+        self.identity = identity
+        self.pool = pool
+
+    def findObjectById(self, id, current=None):
+        if id != self.identity or (proxy := self.pool.next_proxy()) is None:
+            raise Ice.ObjectNotFoundException()
+        return proxy
+
+    def findAdapterById(self, id, current=None):
+        raise Ice.AdapterNotFoundException()
+
+    def getRegistry(self, current=None):
+        return None
+
+
+def main(ic):
+    properties = ic.getProperties()
+    index = create_track_index(properties)
+    # El supervisor carga y vigila la biblioteca; servir es cosa de los workers
+    servant = MediaServerI(*library_dirs(properties), index=index)
+    catalogue = SharedCatalogue.create()
+    publish_catalogue(servant, catalogue)
+
+    identity = ic.stringToIdentity(
+        properties.getPropertyWithDefault('MediaServer.Identity', 'mediaServer1'))
+    pool = WorkerPool(
+        ic, properties.getPropertyAsInt('MediaServer.Workers'),
+        worker_properties(properties), catalogue.name, identity)
+    threads = [PeriodicTask(WorkerPool.RESPAWN_SECS, pool.respawn)]
+    try:
+        pool.start()
+        add_stats_facet(ic, "Workers", pool.stats)
+
+        adapter = ic.createObjectAdapter("MediaServerAdapter")
+        locator = adapter.add(
+            WorkerLocatorI(identity, pool), ic.stringToIdentity(LOCATOR_IDENTITY))
+        logger.info(f"MediaServer locator: {locator}")
+
+        if (interval := properties.getPropertyAsInt('MediaServer.Watch.Interval')) > 0:
+            threads += [
+                LibraryWatcher(servant, interval),
+                PeriodicTask(interval, lambda: publish_catalogue(servant, catalogue))]
+        for thread in threads:
+            thread.start()
+
+        adapter.activate()
+        ic.waitForShutdown()
+    finally:
+        for thread in threads:
+            thread.stop()
+        pool.stop()
+        catalogue.close()
+        index.close()
+
+    logger.info("Shutdown")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+import threading
+from collections import OrderedDict
+from time import monotonic
+
+
+class MetadataCache:
+    """Caché LRU con TTL de TrackInfo y Playlist, por servidor.
+
+    Las claves son (servidor, tipo, id). Al caducar, una entrada no se
+    descarta sin más: `revalidate()` compara la versión de la biblioteca del
+    servidor con la que tenía al guardarla y, si no ha cambiado, renueva
+    todas las de ese servidor con una sola consulta.
+    """
+
+    TTL_SECS = 60
+    MAX_ENTRIES = 4096
+
+    def __init__(self, ttl=TTL_SECS, max_entries=MAX_ENTRIES, clock=monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # (server, kind, id) -> (value, expires)
+        self.versions = {}            # server -> versión de su biblioteca
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, server, kind, key):
+        "Devuelve (valor, vigente); valor None si no está"
+        with self.lock:
+            if (entry := self.entries.get((server, kind, key))) is None:
+                self.misses += 1
+                return None, False
+
+            self.entries.move_to_end((server, kind, key))
+            value, expires = entry
+            if self.clock() < expires:
+                self.hits += 1
+                return value, True
+            self.stale += 1
+            return value, False
+
+    def put(self, server, kind, key, value):
+        with self.lock:
+            self.entries[(server, kind, key)] = (value, self.clock() + self.ttl)
+            self.entries.move_to_end((server, kind, key))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def revalidate(self, server, version):
+        """Con la misma versión renueva las entradas del servidor y devuelve
+        True; si cambió (o es None, servidor sin versiones) las descarta."""
+        with self.lock:
+            if version is not None and self.versions.get(server) == version:
+                expires = self.clock() + self.ttl
+                for key, (value, _) in self.entries.items():
+                    if key[0] == server:
+                        self.entries[key] = (value, expires)
+                return True
+
+            self.drop(server)
+            self.versions[server] = version
+            self.invalidations += 1
+            return False
+
+    def set_version(self, server, version):
+        "Versión vista al rellenar la caché; otra distinta la invalida"
+        with self.lock:
+            if self.versions.get(server) not in (None, version):
+                self.drop(server)
+                self.invalidations += 1
+            self.versions[server] = version
+
+    def expire(self, server):
+        "Fuerza la revalidación en el próximo acceso"
+        with self.lock:
+            for key, (value, _) in self.entries.items():
+                if key[0] == server:
+                    self.entries[key] = (value, 0)
+
+    def flush(self, server=None):
+        with self.lock:
+            if server is None:
+                self.entries.clear()
+                self.versions.clear()
+            else:
+                self.drop(server)
+                self.versions.pop(server, None)
+
+    def drop(self, server):
+        for key in [key for key in self.entries if key[0] == server]:
+            del self.entries[key]
+
+    def stats(self):
+        with self.lock:
+            lookups = max(self.hits + self.misses + self.stale, 1)
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'ttl_secs': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'hit_ratio': self.hits / lookups,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+    def __repr__(self):
+        return f"<MetadataCache {len(self.entries)}/{self.max_entries} entries>"
@@ -0,0 +1,638 @@
+#!/usr/bin/env python3
+
+import logging
+import math
+import threading
+from collections import deque
+from concurrent.futures import Future
+from time import monotonic, sleep
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("Prefetcher")
+
+
+def server_fetch(server, render_id, pipelined=False, paced=False):
+    """`fetch_async` de ChunkPrefetcher sobre un MediaServerPrx.
+
+    `server()` devuelve el proxy en cada petición: la réplica puede cambiar
+    tras una conmutación. Sin `pipelined` se usa el get_audio_chunk
+    secuencial; con `paced`, get_audio_chunk_paced y sus esperas.
+    """
+    def fetch_async(offset, size):
+        proxy = server()
+        if paced:
+            return proxy.get_audio_chunk_pacedAsync(render_id, offset, size)
+        if pipelined:
+            return proxy.get_audio_chunk_atAsync(render_id, offset, size)
+        return proxy.get_audio_chunkAsync(render_id, size)
+    return fetch_async
+
+
+class ChunkPrefetcher(threading.Thread):
+    """Read-ahead de chunks de audio desacoplado del hilo de GStreamer.
+
+    Un hilo en segundo plano mantiene lleno un buffer acotado (en bytes y en
+    segundos de audio) lanzando peticiones asíncronas con
+    `fetch_async(offset, size)`, que debe devolver un futuro (Ice.Future o
+    similar). Con `depth` > 1 se mantienen varias peticiones en vuelo y las
+    respuestas se reensamblan por offset. `read()` es el hook que usa
+    GstPlayer y sólo saca chunks de memoria local.
+
+    Si una petición falla y se da `resume(offset)`, se llama con el primer
+    byte aún no recibido para reabrir el stream (en el mismo u otro servidor)
+    y se continúa desde ahí en vez de terminar la pista.
+
+    Con un `sizer` (AdaptiveChunkSizer) el tamaño de cada petición y la
+    capacidad del buffer siguen las medidas del enlace en lugar de ser fijos.
+
+    El futuro puede resolverse a un PacedChunk (data, retry_after_ms): si el
+    servidor pide esperar, no se lanzan más peticiones hasta entonces y un
+    chunk vacío con espera no es el fin de la pista.
+
+    Con un `selector` (VariantSelector) y `switch(offset, kbps)`, al acabar
+    de recibir un chunk se puede cambiar a otra variante de la pista:
+    `switch` reabre el stream y devuelve el offset equivalente en ella, desde
+    donde siguen las peticiones; las que estaban en vuelo se descartan.
+    """
+
+    CHUNK_SIZE = 4096
+    MAX_BYTES = 64 * 1024
+    MAX_SECONDS = 4.0
+    BYTE_RATE = 128 * 1000 // 8  # 128 kbps
+    FETCH_TIMEOUT_SECS = 5
+    MAX_RESUMES = 3
+    RESUME_DELAY_SECS = 0.5
+
+    def __init__(self, fetch_async, chunk_size=CHUNK_SIZE, max_bytes=MAX_BYTES,
+                 max_seconds=MAX_SECONDS, byte_rate=BYTE_RATE, depth=1, offset=0,
+                 resume=None, sizer=None, on_exhausted=None, selector=None, switch=None):
+        super().__init__(daemon=True)
+        self.fetch_async = fetch_async
+        self.on_exhausted = on_exhausted
+        self.sizer = sizer
+        self.selector = selector
+        self.switch = switch
+        self.max_bytes = max_bytes
+        self.resume = resume
+        self.resumes = 0  # seguidos, sin un chunk recibido entre medias
+        self.resumed = 0
+        self.chunk_size = chunk_size
+        self.depth = max(1, depth)
+        self.offset = offset     # siguiente offset a pedir
+        self.delivered = offset  # fin de los datos ya recibidos en orden
+        self.pending = deque()  # (offset, size, future, start) en orden de offset
+        self.byte_rate = byte_rate
+        self.capacity = max(chunk_size, min(max_bytes, int(max_seconds * byte_rate)))
+        if sizer:
+            self.adapt()
+
+        self.cond = threading.Condition()
+        self.chunks = deque()
+        self.buffered = 0
+        self.exhausted = False
+        self.closed = False
+
+        self.underruns = 0
+        self.throttled = 0
+        self.throttled_secs = 0.0
+        self.switches = 0
+        self.fetches = 0
+        self.fetched_bytes = 0
+        self.latency_last = 0.0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def has_room(self):
+        in_flight = sum(request[1] for request in self.pending)
+        return self.buffered + in_flight + self.chunk_size <= self.capacity
+
+    def request(self, offset, size):
+        try:
+            future = self.fetch_async(offset, size)
+        except Exception as e:
+            # Un error al lanzar la petición se trata como el de su respuesta
+            future = Future()
+            future.set_exception(e)
+        return offset, size, future, monotonic()
+
+    def fill_pipeline(self):
+        while len(self.pending) < self.depth and self.has_room():
+            self.pending.append(self.request(self.offset, self.chunk_size))
+            self.offset += self.chunk_size
+
+    def run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.closed or self.pending or self.has_room())
+                if self.closed:
+                    return
+                self.fill_pipeline()
+                offset, size, future, start = self.pending.popleft()
+
+            try:
+                chunk = future.result(self.FETCH_TIMEOUT_SECS)
+                backoff = 0
+                if hasattr(chunk, 'retry_after_ms'):
+                    chunk, backoff = chunk.data, chunk.retry_after_ms / 1000
+            except Exception as e:
+                if self.closed:
+                    return
+                logger.error(f"Chunk fetch failed at offset {offset}: {e}")
+                if self.try_resume():
+                    continue
+                chunk, backoff = None, 0
+
+            with self.cond:
+                self.record_fetch(monotonic() - start, chunk)
+                if self.selector:
+                    self.selector.on_fetch(
+                        len(chunk or b''), monotonic() - start + backoff,
+                        len(self.pending) + 1)
+                if chunk:
+                    self.chunks.append(chunk)
+                    self.buffered += len(chunk)
+                    self.delivered = offset + len(chunk)
+                    self.resumes = 0
+                if chunk or backoff:
+                    self.cond.notify_all()
+                    if backoff and not self.wait_backoff(backoff):
+                        return
+                    if len(chunk) < size:
+                        # Lectura corta: se vuelve a pedir el hueco antes que el resto
+                        self.pending.appendleft(
+                            self.request(offset + len(chunk), size - len(chunk)))
+                else:
+                    self.exhausted = True
+                    self.pending.clear()
+                self.cond.notify_all()
+
+            if not chunk and not backoff:
+                logger.debug(f"Prefetch finished: {self.stats()}")
+                if self.on_exhausted and not self.closed:
+                    self.on_exhausted()
+                return
+
+            if chunk and self.selector and (kbps := self.selector.choose()) is not None:
+                self.switch_variant(kbps)
+
+    def switch_variant(self, kbps):
+        "En el límite del último chunk recibido"
+        with self.cond:
+            self.pending.clear()
+            offset = self.delivered
+        try:
+            offset = self.switch(offset, kbps)
+            self.selector.switched(kbps)
+            self.byte_rate = kbps * 1000 // 8
+            self.switches += 1
+            logger.info(f"Switched to {kbps} kbps variant at byte {offset}")
+        except Exception as e:
+            logger.error(f"Variant switch to {kbps} kbps failed: {e}")
+            self.selector.switched(self.selector.current)  # no reintentar enseguida
+
+        with self.cond:
+            self.offset = self.delivered = offset
+
+    def wait_backoff(self, backoff):
+        "Con el cerrojo tomado; read() sigue sirviendo mientras se espera"
+        self.throttled += 1
+        self.throttled_secs += backoff
+        return not self.cond.wait_for(lambda: self.closed, backoff)
+
+    def try_resume(self):
+        if not self.resume or self.resumes >= self.MAX_RESUMES:
+            return False
+
+        with self.cond:
+            self.pending.clear()
+            self.offset = self.delivered
+        self.resumes += 1
+        self.resumed += 1
+
+        sleep(self.RESUME_DELAY_SECS)
+        try:
+            return bool(self.resume(self.delivered))
+        except Exception as e:
+            logger.error(f"Stream resume at offset {self.delivered} failed: {e}")
+            return False
+
+    def adapt(self):
+        self.chunk_size = self.sizer.chunk_size
+        self.capacity = max(
+            self.chunk_size, min(self.max_bytes, self.sizer.buffer_bytes()))
+
+    def record_fetch(self, elapsed, chunk):
+        if self.sizer and chunk:
+            self.sizer.on_fetch(elapsed, self.depth)
+            self.adapt()
+
+        self.fetches += 1
+        self.fetched_bytes += len(chunk or b'')
+        self.latency_last = elapsed
+        self.latency_total += elapsed
+        self.latency_max = max(self.latency_max, elapsed)
+
+    def read(self, size=None):
+        with self.cond:
+            if not self.chunks and not (self.exhausted or self.closed):
+                if self.fetched_bytes:
+                    self.underruns += 1
+                self.cond.wait_for(
+                    lambda: self.chunks or self.exhausted or self.closed)
+
+            if not self.chunks:
+                return b''
+
+            chunk = self.chunks.popleft()
+            self.buffered -= len(chunk)
+            self.cond.notify_all()
+
+        if self.sizer:
+            self.sizer.on_consume(len(chunk))
+        return chunk
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.pending.clear()
+            self.chunks.clear()
+            self.buffered = 0
+            self.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            fetches = max(self.fetches, 1)
+            stats = {
+                'mode': 'pull',
+                'capacity_bytes': self.capacity,
+                'chunk_size': self.chunk_size,
+                'depth': self.depth,
+                'in_flight': len(self.pending),
+                'fill_bytes': self.buffered,
+                'fill_ratio': self.buffered / self.capacity,
+                'fill_seconds': self.buffered / self.byte_rate,
+                'fetches': self.fetches,
+                'fetched_bytes': self.fetched_bytes,
+                'refill_latency_last_ms': self.latency_last * 1000,
+                'refill_latency_avg_ms': self.latency_total / fetches * 1000,
+                'refill_latency_max_ms': self.latency_max * 1000,
+                'underruns': self.underruns,
+                'resumes': self.resumed,
+                'throttled': self.throttled,
+                'throttled_secs': self.throttled_secs,
+                'variant_switches': self.switches,
+            }
+        if self.selector:
+            stats.update(self.selector.stats())
+        return stats
+
+    def __repr__(self):
+        return f"<ChunkPrefetcher {self.buffered}/{self.capacity} bytes>"
+
+
+class PushBuffer:
+    """Buffer de recepción para streams en modo push.
+
+    El servidor envía chunks mientras tenga créditos. Cada chunk consumido
+    por `read()` devuelve su crédito con `grant_credits(n)`, agrupados por
+    media ventana, de modo que nunca hay más de `window` chunks pendientes.
+    """
+
+    def __init__(self, grant_credits, chunk_size=ChunkPrefetcher.CHUNK_SIZE,
+                 max_bytes=ChunkPrefetcher.MAX_BYTES,
+                 max_seconds=ChunkPrefetcher.MAX_SECONDS,
+                 byte_rate=ChunkPrefetcher.BYTE_RATE, **kwargs):
+        self.grant_credits = grant_credits
+        self.chunk_size = chunk_size
+        self.byte_rate = byte_rate
+        capacity = max(chunk_size, min(max_bytes, int(max_seconds * byte_rate)))
+        self.window = max(1, capacity // chunk_size)
+
+        self.cond = threading.Condition()
+        self.chunks = deque()
+        self.out_of_order = {}  # offset -> chunk
+        self.offset = 0         # siguiente offset esperado
+        self.buffered = 0
+        self.size = None        # tamaño total, conocido al final del stream
+        self.closed = False
+        self.returned = 0
+
+        self.underruns = 0
+        self.received = 0
+        self.received_bytes = 0
+
+    @property
+    def exhausted(self):
+        return self.size is not None and self.offset >= self.size
+
+    def push(self, offset, chunk):
+        with self.cond:
+            if self.closed or offset < self.offset:
+                return
+
+            self.received += 1
+            self.received_bytes += len(chunk)
+            self.out_of_order[offset] = chunk
+            while self.offset in self.out_of_order:
+                chunk = self.out_of_order.pop(self.offset)
+                self.chunks.append(chunk)
+                self.buffered += len(chunk)
+                self.offset += len(chunk)
+            self.cond.notify_all()
+
+    def end(self, size):
+        with self.cond:
+            self.size = size
+            self.cond.notify_all()
+
+    def read(self, size=None):
+        with self.cond:
+            if not self.chunks and not (self.exhausted or self.closed):
+                if self.received:
+                    self.underruns += 1
+                self.cond.wait_for(
+                    lambda: self.chunks or self.exhausted or self.closed)
+
+            if not self.chunks:
+                return b''
+
+            chunk = self.chunks.popleft()
+            self.buffered -= len(chunk)
+            self.returned += 1
+            credits = 0
+            if self.returned >= max(1, self.window // 2):
+                credits, self.returned = self.returned, 0
+
+        if credits and not self.exhausted:
+            self.grant_credits(credits)
+        return chunk
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.chunks.clear()
+            self.out_of_order.clear()
+            self.buffered = 0
+            self.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            return {
+                'mode': 'push',
+                'window_chunks': self.window,
+                'fill_bytes': self.buffered,
+                'fill_ratio': len(self.chunks) / self.window,
+                'fill_seconds': self.buffered / self.byte_rate,
+                'received': self.received,
+                'received_bytes': self.received_bytes,
+                'underruns': self.underruns,
+            }
+
+    def __repr__(self):
+        return f"<PushBuffer {len(self.chunks)}/{self.window} chunks>"
+
+
+class TrackSequence:
+    """Encadena los buffers de varias pistas en un único flujo de bytes.
+
+    Mientras suena una pista se puede encolar (`enqueue`) la fuente ya
+    precargada de la siguiente; al agotarse la actual, `read()` continúa con
+    ella sin fin de stream, así el decodificador no se detiene entre pistas.
+    `finish()` indica que no habrá siguiente y deja terminar el stream.
+
+    Sólo se precarga una pista por delante: `wait_slot()` espera a que la
+    encolada pase a sonar y `enqueue` rechaza (cierra) la fuente si ya hay
+    otra esperando. Con pistas más cortas que el buffer de prefetch la
+    precarga de una pista acaba antes de que empiece a sonar.
+    """
+
+    def __init__(self, source, on_track_change=None):
+        self.current = source
+        self.on_track_change = on_track_change or (lambda track: None)
+        self.cond = threading.Condition()
+        self.next = None
+        self.finished = False
+        self.closed = False
+
+        self.transitions = 0
+        self.gap_last = 0.0
+        self.gap_max = 0.0
+
+    def wait_slot(self):
+        "Espera a que no haya pista encolada; False si la secuencia se cierra"
+        with self.cond:
+            self.cond.wait_for(lambda: self.next is None or self.closed)
+            return not self.closed
+
+    def enqueue(self, source, track):
+        with self.cond:
+            if not self.closed and self.next is None:
+                self.next = (source, track)
+                self.cond.notify_all()
+                return
+        logger.warning(f"Next track already queued, dropping preload of {track!r}")
+        source.close()
+
+    def finish(self):
+        with self.cond:
+            self.finished = True
+            self.cond.notify_all()
+
+    def read(self, size=None):
+        while True:
+            if chunk := self.current.read(size):
+                return chunk
+
+            start = monotonic()
+            with self.cond:
+                self.cond.wait_for(lambda: self.next or self.finished or self.closed)
+                if not self.next:
+                    return b''
+                (source, track), self.next = self.next, None
+                previous, self.current = self.current, source
+                self.record_gap(monotonic() - start)
+                self.cond.notify_all()
+
+            previous.close()
+            self.on_track_change(track)
+
+    def record_gap(self, elapsed):
+        self.transitions += 1
+        self.gap_last = elapsed
+        self.gap_max = max(self.gap_max, elapsed)
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            pending, self.next = self.next, None
+            self.cond.notify_all()
+
+        self.current.close()
+        if pending:
+            pending[0].close()
+
+    def stats(self):
+        stats = self.current.stats()
+        stats.update({
+            'gapless_transitions': self.transitions,
+            'gapless_last_gap_ms': self.gap_last * 1000,
+            'gapless_max_gap_ms': self.gap_max * 1000,
+        })
+        return stats
+
+    def __repr__(self):
+        return f"<TrackSequence {self.current!r}>"
+
+
+class AdaptiveChunkSizer:
+    """Ajusta el tamaño de chunk y los buffers al enlace.
+
+    Con la latencia media por petición (L) y el bitrate que consume el
+    decodificador (R), cada petición debe traer al menos R·L/depth bytes para
+    no vaciar el buffer; se pide el doble como margen, redondeado a potencia
+    de 2 y acotado a [min_chunk, max_chunk]. El buffer de prefetch se
+    dimensiona para `target_seconds` de audio y la cola de appsrc a dos chunks.
+    """
+
+    MIN_CHUNK = 1024
+    MAX_CHUNK = 256 * 1024
+    TARGET_SECONDS = 2.0
+    HEADROOM = 2.0
+    ALPHA = 0.25
+
+    def __init__(self, chunk_size=ChunkPrefetcher.CHUNK_SIZE, min_chunk=MIN_CHUNK,
+                 max_chunk=MAX_CHUNK, target_seconds=TARGET_SECONDS,
+                 byte_rate=ChunkPrefetcher.BYTE_RATE, on_change=None):
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+        self.target_seconds = target_seconds
+        self.chunk_size = self.clamp(chunk_size)
+        self.on_change = on_change or (lambda sizer: None)
+
+        self.lock = threading.Lock()
+        self.latency = None       # segundos, media exponencial
+        self.byte_rate = byte_rate  # bytes/s consumidos, media exponencial
+        self.last_consume = None
+
+        self.grows = 0
+        self.shrinks = 0
+
+    def clamp(self, size):
+        size = 1 << round(math.log2(max(size, 1)))
+        return max(self.min_chunk, min(self.max_chunk, size))
+
+    def average(self, current, sample):
+        if current is None:
+            return sample
+        return (1 - self.ALPHA) * current + self.ALPHA * sample
+
+    def restart(self):
+        with self.lock:
+            self.last_consume = None
+
+    def on_fetch(self, elapsed, depth=1):
+        with self.lock:
+            self.latency = self.average(self.latency, elapsed)
+            wanted = self.HEADROOM * self.byte_rate * self.latency / max(1, depth)
+            size = self.clamp(wanted)
+            if size == self.chunk_size:
+                return
+
+            if size > self.chunk_size:
+                self.grows += 1
+            else:
+                self.shrinks += 1
+            self.chunk_size = size
+
+        logger.debug(f"Chunk size -> {size} bytes")
+        self.on_change(self)
+
+    def on_consume(self, size, now=None):
+        now = monotonic() if now is None else now
+        with self.lock:
+            if self.last_consume is not None and now > self.last_consume:
+                sample = size / (now - self.last_consume)
+                self.byte_rate = self.average(self.byte_rate, sample)
+            self.last_consume = now
+
+    def buffer_bytes(self):
+        return int(self.target_seconds * self.byte_rate)
+
+    def queue_bytes(self):
+        return 2 * self.chunk_size
+
+    def stats(self):
+        with self.lock:
+            return {
+                'chunk_size': self.chunk_size,
+                'queue_bytes': self.queue_bytes(),
+                'buffer_target_bytes': self.buffer_bytes(),
+                'latency_ms': (self.latency or 0) * 1000,
+                'consumed_kbps': self.byte_rate * 8 / 1000,
+                'grows': self.grows,
+                'shrinks': self.shrinks,
+            }
+
+
+class VariantSelector:
+    """Elige entre las variantes (kbps) de una pista según el throughput medido.
+
+    Cada petición completada aporta una muestra de throughput del enlace:
+    bytes por segundo con las peticiones que había en vuelo, contando la
+    espera que pida el servidor, suavizada con una media exponencial. Se
+    sube a la variante más alta cuyo bitrate cabe UP_HEADROOM veces en el
+    throughput y se baja si la actual no cabe DOWN_HEADROOM veces; tras un
+    cambio se mantiene HOLD_SECS para no oscilar.
+    """
+
+    UP_HEADROOM = 2.0
+    DOWN_HEADROOM = 1.2
+    HOLD_SECS = 4.0
+    ALPHA = 0.25
+
+    def __init__(self, bitrates, current, throughput=None):
+        self.bitrates = sorted(set(bitrates))
+        self.current = current
+        self.throughput = throughput  # bytes/s, media exponencial
+        self.changed_at = None
+        self.lock = threading.Lock()
+
+    def on_fetch(self, size, elapsed, in_flight=1):
+        if elapsed <= 0:
+            return
+        sample = size * max(1, in_flight) / elapsed
+        with self.lock:
+            self.throughput = sample if self.throughput is None \
+                else (1 - self.ALPHA) * self.throughput + self.ALPHA * sample
+
+    def fitting(self, headroom):
+        return [kbps for kbps in self.bitrates
+                if kbps * 1000 / 8 * headroom <= self.throughput]
+
+    def choose(self, now=None):
+        "Los kbps a los que cambiar, o None para seguir con la variante actual"
+        now = monotonic() if now is None else now
+        with self.lock:
+            held = self.changed_at is not None and now - self.changed_at < self.HOLD_SECS
+            if self.throughput is None or held:
+                return None
+
+            target = max(self.fitting(self.UP_HEADROOM), default=self.bitrates[0])
+            if target < self.current:
+                if self.current in self.fitting(self.DOWN_HEADROOM):
+                    return None
+                target = max(self.fitting(self.DOWN_HEADROOM), default=self.bitrates[0])
+            return target if target != self.current else None
+
+    def switched(self, kbps, now=None):
+        with self.lock:
+            self.current = kbps
+            self.changed_at = monotonic() if now is None else now
+
+    def stats(self):
+        with self.lock:
+            return {
+                'variant_kbps': self.current,
+                'variants': len(self.bitrates),
+                'throughput_kbps': (self.throughput or 0) * 8 / 1000,
+            }
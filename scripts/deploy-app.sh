@@ -22,8 +22,10 @@ if [ $EXIT_CODE -eq 0 ]; then
     
     # Iniciar los servidores manualmente
     echo "Iniciando servidores..."
-    printf '\n\n' | icegridadmin --Ice.Default.Locator="SpotificeGrid/Locator:tcp -h localhost -p 4061" \
-      -e "server start MediaServer-1" 2>&1 | grep -v "user id:" | grep -v "password:" | grep -v "^$"
+    for server in MediaServer-1 MediaServer-2 MediaServer-3; do
+        printf '\n\n' | icegridadmin --Ice.Default.Locator="SpotificeGrid/Locator:tcp -h localhost -p 4061" \
+          -e "server start $server" 2>&1 | grep -v "user id:" | grep -v "password:" | grep -v "^$"
+    done
     
     printf '\n\n' | icegridadmin --Ice.Default.Locator="SpotificeGrid/Locator:tcp -h localhost -p 4061" \
       -e "server start MediaRender-1" 2>&1 | grep -v "user id:" | grep -v "password:" | grep -v "^$"
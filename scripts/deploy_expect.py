@@ -6,6 +6,8 @@ Script para desplegar la aplicación usando pexpect con icegridadmin.
 import sys
 import pexpect
 
+SERVERS = ('MediaServer-1', 'MediaServer-2', 'MediaServer-3', 'MediaRender-1')
+
 def main():
     try:
         # Iniciar icegridadmin
@@ -31,15 +33,12 @@ def main():
         
         print("✓ Aplicación desplegada exitosamente")
         
-        # Iniciar los servidores
+        # Iniciar los servidores (las tres réplicas de MediaServer y el render)
         print("\nIniciando servidores...")
-        child.sendline("server start MediaServer-1")
-        child.expect('>>>')
-        print("✓ MediaServer-1 iniciado")
-        
-        child.sendline("server start MediaRender-1")
-        child.expect('>>>')
-        print("✓ MediaRender-1 iniciado")
+        for server in SERVERS:
+            child.sendline(f"server start {server}")
+            child.expect('>>>')
+            print(f"✓ {server} iniciado")
         
         # Salir
         child.sendline("exit")
@@ -23,7 +23,7 @@ sleep 2
 
 # 0. Iniciar verificador de permisos
 echo ""
-echo "[0/5] Iniciando verificador de permisos..."
+echo "[0/6] Iniciando verificador de permisos..."
 "$PROJECT_DIR/config/admin_verifier.py" &
 VERIFIER_PID=$!
 sleep 2
@@ -37,7 +37,7 @@ fi
 
 # 1. Iniciar Registry
 echo ""
-echo "[1/5] Iniciando Registry..."
+echo "[1/6] Iniciando Registry..."
 "$SCRIPT_DIR/start-registry.sh" &
 REGISTRY_PID=$!
 sleep 3
@@ -51,7 +51,7 @@ fi
 
 # 2. Iniciar Node 1
 echo ""
-echo "[2/5] Iniciando Node 1..."
+echo "[2/6] Iniciando Node 1..."
 "$SCRIPT_DIR/start-node1.sh" &
 NODE1_PID=$!
 sleep 2
@@ -65,7 +65,7 @@ fi
 
 # 3. Iniciar Node 2
 echo ""
-echo "[3/5] Iniciando Node 2..."
+echo "[3/6] Iniciando Node 2..."
 "$SCRIPT_DIR/start-node2.sh" &
 NODE2_PID=$!
 sleep 2
@@ -77,9 +77,23 @@ else
     exit 1
 fi
 
-# 4. Desplegar aplicación
+# 4. Iniciar Node 3
 echo ""
-echo "[4/5] Desplegando aplicación..."
+echo "[4/6] Iniciando Node 3..."
+"$SCRIPT_DIR/start-node3.sh" &
+NODE3_PID=$!
+sleep 2
+
+if check_process "icegridnode.*node3"; then
+    echo "✓ Node 3 iniciado (PID: $NODE3_PID)"
+else
+    echo "✗ Error: Node 3 no pudo iniciarse"
+    exit 1
+fi
+
+# 5. Desplegar aplicación
+echo ""
+echo "[5/6] Desplegando aplicación..."
 "$SCRIPT_DIR/deploy_expect.py"
 
 if [ $? -eq 0 ]; then
@@ -93,6 +107,7 @@ if [ $? -eq 0 ]; then
     echo "  Registry: $REGISTRY_PID"
     echo "  Node 1:   $NODE1_PID"
     echo "  Node 2:   $NODE2_PID"
+    echo "  Node 3:   $NODE3_PID"
     echo ""
     echo "Para detener todo: ./scripts/stop-all.sh"
     echo "Para monitorear: tail -f node*_output/*.log"
@@ -0,0 +1,16 @@
+#!/bin/bash
+# Script para iniciar el Nodo 3 de IceGrid (réplica de MediaServer)
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+PROJECT_DIR="$(dirname "$SCRIPT_DIR")"
+CONFIG_DIR="$PROJECT_DIR/config"
+
+echo "=== Iniciando IceGrid Node 3 (MediaServer) ==="
+echo "Directorio de configuración: $CONFIG_DIR"
+
+# Crear directorios necesarios
+mkdir -p "$PROJECT_DIR/node3_data"
+mkdir -p "$PROJECT_DIR/node3_output"
+
+# Iniciar el nodo
+icegridnode --Ice.Config="$CONFIG_DIR/node3.config"
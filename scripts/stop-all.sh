@@ -17,6 +17,9 @@ icegridadmin --Ice.Default.Locator="SpotificeGrid/Locator:tcp -h localhost -p 40
 icegridadmin --Ice.Default.Locator="SpotificeGrid/Locator:tcp -h localhost -p 4061" \
   -u "" -p "" \
   -e "node shutdown node2" 2>/dev/null
+icegridadmin --Ice.Default.Locator="SpotificeGrid/Locator:tcp -h localhost -p 4061" \
+  -u "" -p "" \
+  -e "node shutdown node3" 2>/dev/null
 
 # Apagar el registry
 echo "Apagando registry..."
@@ -28,6 +28,7 @@ def main():
     print("\nDeteniendo nodos...")
     stop_process('icegridnode.*node1')
     stop_process('icegridnode.*node2')
+    stop_process('icegridnode.*node3')
     time.sleep(2)
     
     # Detener registry
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+import heapq
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+
+TOKEN = re.compile(r'\w+')
+
+
+def fold(text):
+    "Minúsculas y sin acentos: 'Canción' -> 'cancion'"
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text):
+    return TOKEN.findall(fold(text))
+
+
+class SearchIndex:
+    """Índice invertido en memoria para la búsqueda de pistas.
+
+    Cada término apunta a {documento: peso}, donde el peso acumula el de los
+    campos en que aparece. Todos los términos de la consulta deben aparecer;
+    cada uno casa también como prefijo (búsqueda mientras se escribe) pero
+    puntúa la mitad que una coincidencia exacta. El vocabulario ordenado
+    permite expandir un prefijo con búsqueda binaria.
+    """
+
+    FIELD_WEIGHTS = {
+        'title': 4, 'artist': 2, 'album': 2, 'filename': 1, 'playlists': 1}
+    PREFIX_FACTOR = 0.5
+    MAX_EXPANSIONS = 64  # términos por prefijo; acota el coste de 'a', 'e'...
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.postings = {}     # término -> {doc: peso}
+        self.vocabulary = []   # términos ordenados
+        self.doc_terms = {}    # doc -> {término: peso}
+        self.doc_ids = {}      # track_id -> doc
+        self.track_ids = []    # doc -> track_id (None si se borró)
+        self.free_docs = []
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def __contains__(self, track_id):
+        return track_id in self.doc_ids
+
+    @classmethod
+    def terms(cls, fields):
+        retval = {}
+        for field, text in fields.items():
+            weight = cls.FIELD_WEIGHTS.get(field, 1)
+            for token in tokenize(text or ''):
+                retval[token] = retval.get(token, 0) + weight
+        return retval
+
+    def update(self, track_id, fields):
+        "Indexa (o reindexa) la pista con sus campos de texto"
+        self.update_many([(track_id, fields)])
+
+    def update_many(self, tracks):
+        "Como update() para muchas pistas; en la carga inicial, de una vez"
+        tracks = [(track_id, self.terms(fields)) for track_id, fields in tracks]
+        with self.lock:
+            # Conjunto: una pista repetida en el lote puede volver a crear un término
+            new_terms = set()
+            for track_id, terms in tracks:
+                if (doc := self.doc_ids.get(track_id)) is not None:
+                    self.unlink(doc)
+                else:
+                    doc = self.allocate(track_id)
+
+                self.doc_terms[doc] = terms
+                for term, weight in terms.items():
+                    if (docs := self.postings.get(term)) is None:
+                        docs = self.postings[term] = {}
+                        new_terms.add(term)
+                    docs[doc] = weight
+
+            # Insertar ordenado es O(V) por término: con muchos, reordenar
+            if len(new_terms) > 64:
+                self.vocabulary = sorted(self.postings)
+            else:
+                for term in new_terms:
+                    if term in self.postings:
+                        insort(self.vocabulary, term)
+
+    def remove(self, track_id):
+        with self.lock:
+            if (doc := self.doc_ids.pop(track_id, None)) is None:
+                return
+            self.unlink(doc)
+            del self.doc_terms[doc]
+            self.track_ids[doc] = None
+            self.free_docs.append(doc)
+
+    def allocate(self, track_id):
+        if self.free_docs:
+            doc = self.free_docs.pop()
+            self.track_ids[doc] = track_id
+        else:
+            doc = len(self.track_ids)
+            self.track_ids.append(track_id)
+        self.doc_ids[track_id] = doc
+        return doc
+
+    def unlink(self, doc):
+        for term in self.doc_terms.get(doc, ()):
+            docs = self.postings[term]
+            del docs[doc]
+            if not docs:
+                del self.postings[term]
+                # Puede no estar aún si se añadió en este mismo update_many
+                i = bisect_left(self.vocabulary, term)
+                if i < len(self.vocabulary) and self.vocabulary[i] == term:
+                    del self.vocabulary[i]
+
+    def expand(self, token):
+        "Términos que empiezan por `token`, el exacto primero"
+        start = bisect_left(self.vocabulary, token)
+        retval = []
+        for term in self.vocabulary[start:start + self.MAX_EXPANSIONS]:
+            if not term.startswith(token):
+                break
+            retval.append(term)
+        return retval
+
+    def token_scores(self, token):
+        terms = self.expand(token)
+        if terms == [token]:
+            return self.postings[token]  # sólo lectura: search() no lo modifica
+
+        scores = {}
+        for term in terms:
+            factor = 1 if term == token else self.PREFIX_FACTOR
+            for doc, weight in self.postings[term].items():
+                score = weight * factor
+                if score > scores.get(doc, 0):
+                    scores[doc] = score
+        return scores
+
+    def search(self, query, limit=20):
+        "Devuelve los track_id mejor puntuados, de mayor a menor relevancia"
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens or limit <= 0:
+            return []
+
+        with self.lock:
+            per_token = sorted((self.token_scores(token) for token in tokens), key=len)
+            # Se intersecta empezando por el término más selectivo
+            totals = per_token[0]
+            for scores in per_token[1:]:
+                totals = {doc: total + scores[doc]
+                          for doc, total in totals.items() if doc in scores}
+                if not totals:
+                    return []
+
+            best = heapq.nsmallest(
+                limit, totals.items(),
+                key=lambda item: (-item[1], self.track_ids[item[0]]))
+            return [self.track_ids[doc] for doc, _ in best]
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+import pickle
+import struct
+from multiprocessing import shared_memory
+from os import getpid
+
+
+class SharedCatalogue:
+    """Instantánea de la biblioteca en memoria compartida entre procesos.
+
+    Un segmento de control pequeño y de nombre fijo indica la versión
+    vigente y el segmento de datos que la contiene (registros de pistas y
+    playlists serializados). Publicar crea un segmento de datos nuevo y
+    actualiza el control con un seqlock: quien lee a la vez lo detecta y
+    reintenta. Se conservan los `KEEP` últimos segmentos para que un lector
+    rezagado aún pueda abrir el anterior.
+    """
+
+    CONTROL = struct.Struct('<QQQ64s')  # secuencia, versión, tamaño, segmento
+    KEEP = 2
+
+    def __init__(self, control, owner):
+        self.control = control
+        self.owner = owner
+        self.segments = []  # segmentos de datos publicados (sólo el dueño)
+        self.published = 0
+
+    @property
+    def name(self):
+        return self.control.name
+
+    @classmethod
+    def create(cls):
+        control = shared_memory.SharedMemory(create=True, size=cls.CONTROL.size)
+        cls.CONTROL.pack_into(control.buf, 0, 0, 0, 0, b'')
+        return cls(control, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    def publish(self, version, snapshot):
+        assert self.owner, "only the creator publishes"
+        payload = pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+        self.published += 1
+        segment = shared_memory.SharedMemory(
+            name=f'spotifice-{getpid()}-{self.published}', create=True,
+            size=max(1, len(payload)))
+        segment.buf[:len(payload)] = payload
+
+        sequence = self.CONTROL.unpack_from(self.control.buf, 0)[0]
+        struct.pack_into('<Q', self.control.buf, 0, sequence + 1)  # impar: escribiendo
+        self.CONTROL.pack_into(
+            self.control.buf, 0, sequence + 1, version, len(payload),
+            segment.name.encode())
+        struct.pack_into('<Q', self.control.buf, 0, sequence + 2)
+
+        self.segments.append(segment)
+        while len(self.segments) > self.KEEP:
+            old = self.segments.pop(0)
+            old.close()
+            old.unlink()
+
+    def version(self):
+        return self.read_control()[0]
+
+    def read_control(self):
+        while True:
+            sequence, version, size, name = self.CONTROL.unpack_from(self.control.buf, 0)
+            if sequence % 2 == 0 and \
+                    struct.unpack_from('<Q', self.control.buf, 0)[0] == sequence:
+                return version, size, name.rstrip(b'\0').decode()
+
+    def read(self, known_version=None):
+        "Devuelve (versión, instantánea), o None si no hay otra que `known_version`"
+        while True:
+            version, size, name = self.read_control()
+            if not name or version == known_version:
+                return None
+            try:
+                segment = shared_memory.SharedMemory(name=name)
+            except FileNotFoundError:
+                continue  # sustituido mientras se leía el control
+            try:
+                with segment.buf[:size] as payload:
+                    return version, pickle.loads(payload)
+            finally:
+                segment.close()
+
+    def close(self):
+        if self.owner:
+            for segment in self.segments:
+                segment.close()
+                segment.unlink()
+            self.segments = []
+        self.control.close()
+        if self.owner:
+            self.control.unlink()
+
+    def __repr__(self):
+        return f"<SharedCatalogue '{self.name}' v{self.version()}>"
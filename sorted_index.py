@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+import base64
+import json
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+PREFIX = 'prefix'
+SUBSTRING = 'substring'
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor):
+    "Clave del último elemento devuelto; ValueError si el cursor no es válido"
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    # Se compara con las claves (texto, id): otra forma haría fallar a bisect
+    if not isinstance(key, list) or len(key) != 2 \
+            or not all(isinstance(part, str) for part in key):
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    return tuple(key)
+
+
+class SortedIndex:
+    """Instantánea inmutable de elementos ordenados por (texto normalizado, id).
+
+    Paginar, con o sin filtro por prefijo, cuesta O(log n + k): dos
+    búsquedas binarias acotan el rango y se copian k elementos. El filtro
+    por subcadena no puede acotarse así y recorre el índice; sus recuentos
+    se guardan para no repetir el recorrido en cada página.
+
+    `replace()` deriva otra instantánea con unos pocos cambios sin reordenar
+    todos los elementos.
+    """
+
+    COUNT_CACHE = 64
+    REBUILD_RATIO = 4  # con más de 1/4 de elementos cambiados, reordenar
+
+    def __init__(self, items, text, ident):
+        self.text = text
+        self.ident = ident
+        entries = sorted((self.key(item), item) for item in items)
+        self.keys = [key for key, _ in entries]
+        self.items = [item for _, item in entries]
+        self.counts = OrderedDict()  # filtro por subcadena -> total
+        self.lock = threading.Lock()
+
+    def key(self, item):
+        return self.text(item).casefold(), self.ident(item)
+
+    def replace(self, removed=(), added=()):
+        """Nueva instantánea sin los elementos `removed` y con los `added`.
+
+        Cada cambio se localiza con búsqueda binaria sobre copias de las
+        listas; ésta no se modifica, los lectores pueden seguir usándola."""
+        removed, added = list(removed), list(added)
+        if (len(removed) + len(added)) * self.REBUILD_RATIO > len(self.keys):
+            gone = {self.key(item) for item in removed}
+            return SortedIndex(
+                [item for key, item in zip(self.keys, self.items) if key not in gone]
+                + added, self.text, self.ident)
+
+        retval = SortedIndex((), self.text, self.ident)
+        keys, items = list(self.keys), list(self.items)
+        for item in removed:
+            key = self.key(item)
+            position = bisect_left(keys, key)
+            if position < len(keys) and keys[position] == key:
+                del keys[position]
+                del items[position]
+        for item in added:
+            key = self.key(item)
+            position = bisect_left(keys, key)
+            keys.insert(position, key)
+            items.insert(position, item)
+        retval.keys, retval.items = keys, items
+        return retval
+
+    def __len__(self):
+        return len(self.keys)
+
+    def prefix_range(self, prefix):
+        lo = bisect_left(self.keys, (prefix,))
+        hi = bisect_left(self.keys, (prefix + '\U0010ffff',))
+        return lo, hi
+
+    def page(self, cursor=None, limit=100, text='', mode=PREFIX):
+        "Devuelve (elementos, cursor siguiente o '' si no hay más, total)"
+        after = decode_cursor(cursor)
+        text = text.casefold()
+
+        if mode == SUBSTRING and text:
+            return self.substring_page(after, limit, text)
+
+        lo, hi = self.prefix_range(text) if text else (0, len(self.keys))
+        start = max(lo, bisect_right(self.keys, after)) if after else lo
+        end = min(start + limit, hi)
+        next_cursor = encode_cursor(self.keys[end - 1]) if end < hi else ''
+        return self.items[start:end], next_cursor, hi - lo
+
+    def substring_page(self, after, limit, text):
+        start = bisect_right(self.keys, after) if after else 0
+        matches = []
+        position = start
+        while position < len(self.keys) and len(matches) <= limit:
+            if text in self.keys[position][0]:
+                matches.append(position)
+            position += 1
+
+        next_cursor = ''
+        if len(matches) > limit:
+            matches.pop()
+            next_cursor = encode_cursor(self.keys[matches[-1]])
+        return [self.items[i] for i in matches], next_cursor, self.count(text)
+
+    def count(self, text):
+        with self.lock:
+            if (total := self.counts.get(text)) is not None:
+                self.counts.move_to_end(text)
+                return total
+
+        total = sum(1 for key, _ in self.keys if text in key)
+        with self.lock:
+            self.counts[text] = total
+            if len(self.counts) > self.COUNT_CACHE:
+                self.counts.popitem(last=False)
+        return total
@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+
+import Ice
+
+Ice.loadSlice('-I{} spotifice_v1.ice'.format(Ice.getSliceDir()))
+import Spotifice  # type: ignore # noqa: E402
+
+
+class StatsI(Spotifice.Stats):
+    "Admin facet that publishes the numeric values of a stats() dict"
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def get_metrics(self, current=None):
+        return {
+            key: float(value) for key, value in self.stats().items()
+            if isinstance(value, (int, float))
+        }
+
+
+def add_stats_facet(ic, name, stats):
+    ic.addAdminFacet(StatsI(stats), name)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+import threading
+import zlib
+
+
+class StreamRegistry:
+    """Streams abiertos por identidad de render, repartidos en `shards`
+    diccionarios con su propio cerrojo para que los hilos de despacho de Ice
+    no compitan por uno solo.
+
+    Sólo protege el registro: cerrar o leer un stream es responsabilidad del
+    llamante, siempre fuera del cerrojo del shard.
+    """
+
+    SHARDS = 16
+
+    def __init__(self, shards=SHARDS):
+        self.shards = [({}, threading.Lock()) for _ in range(max(1, shards))]
+
+    def shard(self, key):
+        return self.shards[zlib.crc32(key.encode()) % len(self.shards)]
+
+    def get(self, key, default=None):
+        streams, lock = self.shard(key)
+        with lock:
+            return streams.get(key, default)
+
+    def put(self, key, stream):
+        "Registra `stream` y devuelve el que sustituye, si lo había"
+        streams, lock = self.shard(key)
+        with lock:
+            previous = streams.get(key)
+            streams[key] = stream
+            return previous
+
+    def pop(self, key, expected=None):
+        """Quita el stream de `key`. Con `expected` sólo lo quita si sigue
+        siendo ese objeto (no uno abierto después por el mismo render)."""
+        streams, lock = self.shard(key)
+        with lock:
+            stream = streams.get(key)
+            if stream is None or (expected is not None and stream is not expected):
+                return None
+            return streams.pop(key)
+
+    # Los streams exponen `last_used` (monotonic) para el reaper y el límite
+    def idle(self, max_idle, now):
+        return [(key, stream) for key, stream in self.items()
+                if now - stream.last_used > max_idle]
+
+    def least_recently_used(self):
+        return min(self.items(), key=lambda item: item[1].last_used, default=None)
+
+    def items(self):
+        retval = []
+        for streams, lock in self.shards:
+            with lock:
+                retval.extend(streams.items())
+        return retval
+
+    def __len__(self):
+        return sum(len(streams) for streams, _ in self.shards)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __repr__(self):
+        return f"<StreamRegistry {len(self)} streams in {len(self.shards)} shards>"
@@ -0,0 +1,115 @@
+from unittest import TestCase
+
+import Ice
+
+from bandwidth import BandwidthShaper, TokenBucket
+
+
+class TokenBucketTests(TestCase):
+    def test_burst_then_rate(self):
+        sut = TokenBucket(rate=1000, burst=2000, now=0)
+
+        self.assertEqual(sut.take(1500, 0, now=0), (1500, 0.0))
+        self.assertEqual(sut.take(1500, 0, now=0)[0], 500)
+        self.assertEqual(sut.take(1500, 0, now=0)[0], 0)
+        self.assertEqual(sut.take(1500, 0, now=1.5)[0], 1500)
+
+    def test_minimum_leaves_debt(self):
+        sut = TokenBucket(rate=1000, burst=1000, now=0)
+        sut.take(1000, 0, now=0)
+
+        granted, wait = sut.take(1000, 100, now=0)
+
+        self.assertEqual(granted, 100)
+        self.assertAlmostEqual(wait, 0.1)
+        self.assertEqual(sut.take(1000, 0, now=0.1)[0], 0)
+
+    def test_without_debt_waits_for_minimum(self):
+        sut = TokenBucket(rate=1000, burst=1000, now=0)
+        sut.take(1000, 0, now=0)
+
+        self.assertEqual(sut.take(1000, 100, now=0.05, debt=False)[0], 0)
+        self.assertEqual(sut.take(1000, 100, now=0.1, debt=False)[0], 100)
+        self.assertEqual(sut.take(50, 100, now=0.2, debt=False)[0], 50)
+
+
+class BandwidthShaperTests(TestCase):
+    def test_disabled_without_limits(self):
+        sut = BandwidthShaper()
+
+        self.assertFalse(sut.enabled)
+        self.assertEqual(sut.take('r1', 1 << 20, now=0), (1 << 20, 0.0))
+
+    def test_stream_cap_from_bitrate(self):
+        sut = BandwidthShaper(bitrate_factor=2, burst_secs=1)
+
+        # 128 kbps * 2 = 32000 bytes/s, ráfaga de 1 s
+        self.assertEqual(sut.take('r1', 40000, 128, debt=False, now=0)[0], 32000)
+        self.assertEqual(sut.take('r2', 40000, None, debt=False, now=0)[0], 40000)
+
+    def test_fair_share_between_active_renders(self):
+        sut = BandwidthShaper(total_rate=10000, burst_secs=1)
+        served = {'greedy': 0, 'polite': 0}
+        for t in range(300):
+            # greedy pide 100 veces por segundo, polite 10
+            if t % 10 == 0:
+                served['polite'] += sut.take('polite', 1000, debt=False, now=t / 100)[0]
+            served['greedy'] += sut.take('greedy', 1000, debt=False, now=t / 100)[0]
+        greedy, polite = served['greedy'], served['polite']
+
+        # Cada uno a 5000 bytes/s durante 3 s, más la ráfaga inicial
+        self.assertLessEqual(greedy, 5000 * 4)
+        self.assertGreaterEqual(polite, 5000 * 3)
+
+    def test_idle_renders_free_their_share(self):
+        sut = BandwidthShaper(total_rate=10000)
+        sut.take('idle', 1, now=0)
+
+        self.assertEqual(sut.rate_for(sut.renders['idle'], None, now=0.5), 10000)
+        sut.take('busy', 1, now=0.5)
+        self.assertEqual(sut.rate_for(sut.renders['busy'], None, now=0.5), 5000)
+        self.assertEqual(sut.rate_for(sut.renders['busy'], None, now=2), 10000)
+
+    def test_idle_renders_forgotten_without_stats(self):
+        sut = BandwidthShaper(total_rate=10000)
+        for n in range(100):
+            sut.take(f'old-{n}', 1, now=0)
+        sut.take('recent', 1, now=sut.FORGET_SECS - 1)
+
+        sut.take('busy', 1, now=sut.FORGET_SECS + 1)
+
+        self.assertEqual(list(sut.renders), ['recent', 'busy'])
+        self.assertEqual(list(sut.active), ['busy'])
+
+    def test_unused_reservation_is_returned(self):
+        sut = BandwidthShaper(stream_rate=1000, burst_secs=1, min_chunk=100)
+        granted, _ = sut.take('r1', 1000, now=0)
+        sut.served('r1', granted, 200)
+
+        self.assertEqual(sut.take('r1', 1000, debt=False, now=0)[0], 800)
+
+    def test_stats_report_throughput_and_throttled_time(self):
+        sut = BandwidthShaper(stream_rate=1000, burst_secs=1, min_chunk=0)
+        granted, _ = sut.take('r1', 1000, now=0)
+        sut.served('r1', granted, granted)
+        sut.take('r1', 1000, now=0)
+        sut.take('r1', 1000, now=1.5)
+
+        stats = sut.stats(now=1.5)
+
+        self.assertEqual(stats['r1.served_bytes'], 1000)
+        self.assertEqual(stats['r1.throttled'], 1)
+        self.assertAlmostEqual(stats['r1.throttled_secs'], 1.5)
+
+    def test_from_properties(self):
+        properties = Ice.createProperties()
+        properties.setProperty('MediaServer.Shaping.TotalRate', '100000')
+        properties.setProperty('MediaServer.Shaping.BitrateFactor', '1.5')
+        properties.setProperty('MediaServer.Shaping.MinChunk', '0')
+
+        sut = BandwidthShaper.from_properties(properties, 'MediaServer')
+
+        self.assertTrue(sut.enabled)
+        self.assertEqual(sut.total_rate, 100000)
+        self.assertEqual(sut.stream_cap(128), 24000)
+        self.assertEqual(sut.min_chunk, 1)
@@ -0,0 +1,68 @@
+from unittest import TestCase
+
+from chunk_cache import ChunkCache
+
+
+class ChunkCacheTests(TestCase):
+    data = bytes(range(256)) * 40
+
+    def setUp(self):
+        self.loads = []
+
+    def loader(self, offset, size):
+        self.loads.append(offset)
+        return memoryview(self.data)[offset:offset + size]
+
+    def test_read_spanning_blocks(self):
+        sut = ChunkCache(1 << 20, block_size=1000)
+
+        chunk = sut.read('t', 900, 1200, self.loader)
+
+        self.assertEqual(bytes(chunk), self.data[900:2100])
+        self.assertEqual(self.loads, [0, 1000, 2000])
+
+    def test_second_read_is_a_hit(self):
+        sut = ChunkCache(1 << 20, block_size=1000)
+        sut.read('t', 0, 500, self.loader)
+        sut.read('t', 500, 500, self.loader)
+
+        stats = sut.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(self.loads, [0])
+
+    def test_read_past_end(self):
+        sut = ChunkCache(1 << 20, block_size=1000)
+
+        self.assertEqual(
+            bytes(sut.read('t', 10200, 1000, self.loader)), self.data[10200:])
+        self.assertEqual(bytes(sut.read('t', 20000, 1000, self.loader)), b'')
+
+    def test_covers_only_loaded_ranges(self):
+        sut = ChunkCache(1 << 20, block_size=1000)
+        sut.read('t', 0, 1500, self.loader)
+        sut.read('t', 10000, 500, self.loader)
+
+        self.assertTrue(sut.covers('t', 200, 1700))
+        self.assertFalse(sut.covers('t', 200, 1900))
+        self.assertTrue(sut.covers('t', 10100, 5000))  # el último bloque es corto
+        self.assertFalse(sut.covers('other', 0, 10))
+
+    def test_lru_eviction_within_budget(self):
+        sut = ChunkCache(2000, block_size=1000)
+        sut.read('t', 0, 10, self.loader)
+        sut.read('t', 1000, 10, self.loader)
+        sut.read('t', 0, 10, self.loader)
+        sut.read('t', 2000, 10, self.loader)
+
+        self.assertIn(('t', 0), sut)
+        self.assertNotIn(('t', 1000), sut)
+        self.assertLessEqual(sut.size, 2000)
+        self.assertEqual(sut.stats()['evictions'], 1)
+
+    def test_warm_up_respects_budget(self):
+        sut = ChunkCache(3000, block_size=1000)
+
+        sut.warm_up('t', 10000, self.loader)
+
+        self.assertEqual(len(sut), 3)
+        self.assertEqual(sut.stats()['evictions'], 0)
@@ -0,0 +1,125 @@
+from unittest import TestCase
+
+import Ice
+
+from compression import CompressionPolicy, PolicyProxy, wire_stats
+
+
+class FakeProxy:
+    "Registra qué variante (comprimida o no) recibe cada invocación"
+
+    def __init__(self, compress=None, calls=None):
+        self.compress = compress
+        self.calls = calls if calls is not None else []
+
+    def ice_compress(self, compress):
+        return FakeProxy(compress, self.calls)
+
+    def ice_oneway(self):
+        return self
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name, self.compress))
+
+
+class CompressionPolicyTests(TestCase):
+    def test_metadata_compressed_audio_not(self):
+        sut = CompressionPolicy()
+
+        self.assertTrue(sut.compress('get_all_tracks'))
+        self.assertTrue(sut.compress('get_playlist_expanded', ('rock',)))
+        self.assertFalse(sut.compress('get_audio_chunk', (None, 4096)))
+        self.assertFalse(sut.compress('push_chunk', (0, b'')))
+
+    def test_small_pages_uncompressed(self):
+        sut = CompressionPolicy(min_items=50)
+
+        self.assertFalse(sut.compress('get_tracks', ('', 10, '', None)))
+        self.assertTrue(sut.compress('get_tracks', ('', 50, '', None)))
+        self.assertFalse(sut.compress('get_tracks_info', (['1s.mp3'],)))
+        self.assertTrue(sut.compress('search', ('queen', 100)))
+
+    def test_unlimited_page_uses_server_default(self):
+        sut = CompressionPolicy(min_items=50)
+
+        # limit <= 0: la página por defecto del servidor (1000 pistas, 20 resultados)
+        self.assertTrue(sut.compress('get_tracks', ('', 0, '', None)))
+        self.assertTrue(sut.compress('get_playlists', ('', -1, '', None)))
+        self.assertFalse(sut.compress('search', ('queen', 0)))
+
+    def test_disabled(self):
+        sut = CompressionPolicy(enabled=False)
+        self.assertFalse(sut.compress('get_all_tracks'))
+
+    def test_from_properties(self):
+        properties = Ice.createProperties()
+        properties.setProperty(
+            'MediaRender.Compress.Operations', 'get_all_tracks, search')
+        properties.setProperty('MediaRender.Compress.MinItems', '5')
+
+        sut = CompressionPolicy.from_properties(properties, 'MediaRender')
+
+        self.assertTrue(sut.enabled)
+        self.assertEqual(sut.operations, {'get_all_tracks', 'search'})
+        self.assertEqual(sut.min_items, 5)
+        self.assertTrue(CompressionPolicy.from_properties(
+            Ice.createProperties(), 'MediaServer').compress('get_all_playlists'))
+
+
+class PolicyProxyTests(TestCase):
+    def test_routes_each_operation(self):
+        proxy = FakeProxy()
+        sut = PolicyProxy(proxy, CompressionPolicy())
+
+        sut.get_all_tracks()
+        sut.get_audio_chunkAsync(None, 4096)
+        sut.ice_oneway().grant_credits(None, 4)
+
+        self.assertEqual(proxy.calls, [
+            ('get_all_tracks', True),
+            ('get_audio_chunkAsync', False),
+            ('grant_credits', False)])
+        self.assertEqual(sut.policy.stats()['compressed_calls'], 1)
+        # Los proxies derivados con ice_* ya no pasan por la política
+        self.assertEqual(sut.policy.stats()['uncompressed_calls'], 1)
+
+
+class WireStatsTests(TestCase):
+    def initialize(self, **properties):
+        init_data = Ice.InitializationData()
+        init_data.properties = Ice.createProperties()
+        for key, value in properties.items():
+            init_data.properties.setProperty(key, value)
+        ic = Ice.initialize(init_data)
+        self.addCleanup(ic.destroy)
+        return ic
+
+    def remote_object(self):
+        adapter = self.initialize().createObjectAdapterWithEndpoints(
+            'Adapter', 'tcp -h 127.0.0.1')
+        proxy = adapter.add(Ice.Object(), Ice.stringToIdentity('object'))
+        adapter.activate()
+        return str(proxy)
+
+    def test_counts_bytes_of_all_connections(self):
+        sut = self.initialize(**{
+            'Ice.Admin.Endpoints': 'tcp -h 127.0.0.1',
+            'Ice.Admin.InstanceName': 'Client',
+            'IceMX.Metrics.Wire.GroupBy': 'none',
+            'IceMX.Metrics.Wire.Map.Connection.GroupBy': 'none'})
+        proxy = sut.stringToProxy(self.remote_object())
+
+        proxy.ice_ping()
+        before = wire_stats(sut)
+        proxy.ice_compress(True).ice_ping()
+        after = wire_stats(sut)
+
+        self.assertGreater(before['wire_sent_bytes'], 0)
+        self.assertGreater(after['wire_sent_bytes'], before['wire_sent_bytes'])
+        self.assertGreater(after['wire_received_bytes'], before['wire_received_bytes'])
+
+    def test_empty_without_admin_or_view(self):
+        self.assertEqual(wire_stats(self.initialize()), {})
+        self.assertEqual(wire_stats(self.initialize(**{
+            'Ice.Admin.Endpoints': 'tcp -h 127.0.0.1',
+            'Ice.Admin.InstanceName': 'Client'})), {})
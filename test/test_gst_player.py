@@ -0,0 +1,106 @@
+from io import BytesIO
+from threading import Event
+from unittest import TestCase
+
+from gst_player import Gst, GstPlayer
+from prefetch import TrackSequence
+from track_index import audio_range, scan_file
+
+
+class PipelineReuseTests(TestCase):
+    def create_player(self, **kwargs):
+        player = GstPlayer(audio_sink='fakesink sync=false', daemon=True, **kwargs)
+        player.start()
+        self.addCleanup(player.shutdown)
+        return player
+
+    def play(self, player, track_id, exhausted=None):
+        track = open(f'test/media/{track_id}', 'rb')
+        self.addCleanup(track.close)
+        player.configure(track.read, track_exhausted_hook=exhausted)
+        self.assertTrue(player.confirm_play_starts())
+        self.assertTrue(player.first_audio_e.wait(GstPlayer.TIMEOUT_SECS))
+
+    def test_same_pipeline_for_next_track(self):
+        sut = self.create_player()
+        self.play(sut, '1s.mp3')
+        pipeline = sut.pipeline
+
+        self.assertTrue(sut.stop())
+        self.assertEqual(pipeline.get_state(Gst.SECOND).state, Gst.State.READY)
+        self.play(sut, '2s.mp3')
+
+        self.assertIs(sut.pipeline, pipeline)
+
+    def test_same_pipeline_after_end_of_stream(self):
+        sut = self.create_player()
+        exhausted = Event()
+        self.play(sut, '1s.mp3', exhausted.set)
+        pipeline = sut.pipeline
+
+        self.assertTrue(exhausted.wait(GstPlayer.TIMEOUT_SECS))
+        self.assertFalse(sut.is_playing())
+        self.play(sut, '2s.mp3')
+
+        self.assertIs(sut.pipeline, pipeline)
+        self.assertTrue(sut.stop())
+
+    def test_rebuilt_per_track_without_reuse(self):
+        sut = self.create_player(reuse_pipeline=False)
+        self.play(sut, '1s.mp3')
+        first = sut.pipeline
+
+        self.assertTrue(sut.stop())
+        self.assertIsNone(sut.pipeline)
+        self.play(sut, '2s.mp3')
+
+        self.assertIsNot(sut.pipeline, first)
+
+
+class RecordingPlayer(GstPlayer):
+    "Guarda (pts, duración) de cada buffer de audio decodificado"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.buffers = []
+
+    def on_audio_buffer(self, pad, info):
+        buf = info.get_buffer()
+        self.buffers.append((buf.pts, buf.duration))
+        return super().on_audio_buffer(pad, info)
+
+
+class GaplessTests(TestCase):
+    TRACKS = ('1s.mp3', '2s.mp3')
+    FRAME_NS = 1152 * Gst.SECOND // 44100  # una trama MPEG-1 Layer III
+
+    def audio_only(self, track_id):
+        # Lo que sirve el servidor con StreamOptions.audio_only
+        path = f'test/media/{track_id}'
+        start, end = audio_range(path)
+        with open(path, 'rb') as f:
+            return BytesIO(f.read()[start:end])
+
+    def test_no_gap_between_tracks(self):
+        sut = RecordingPlayer(audio_sink='fakesink sync=false', daemon=True)
+        sut.start()
+        self.addCleanup(sut.shutdown)
+        first, second = (self.audio_only(track_id) for track_id in self.TRACKS)
+        sequence = TrackSequence(first)
+        sequence.enqueue(second, self.TRACKS[1])
+        sequence.finish()
+        exhausted = Event()
+
+        sut.configure(sequence.read, track_exhausted_hook=exhausted.set)
+
+        self.assertTrue(exhausted.wait(GstPlayer.TIMEOUT_SECS * 5))
+        self.assertEqual(sequence.transitions, 1)
+        # Marcas de tiempo continuas: ningún hueco entre buffers consecutivos
+        gaps = [pts - (prev_pts + prev_duration) for (prev_pts, prev_duration), (pts, _)
+                in zip(sut.buffers, sut.buffers[1:])]
+        self.assertLess(max(gaps), Gst.MSECOND)
+        # Y sin tramas de silencio: dura lo que suman las pistas (± una trama)
+        expected = sum(scan_file(f'test/media/{track_id}')['duration_ms']
+                       for track_id in self.TRACKS) * Gst.MSECOND
+        decoded = sum(duration for _, duration in sut.buffers)
+        self.assertAlmostEqual(decoded, expected, delta=self.FRAME_NS)
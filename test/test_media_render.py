@@ -70,3 +70,24 @@ class PlaybackTests(TestRender):
             self.sut.play()
 
         self.assertEqual(cm.exception.reason, "Already playing")
+
+    def test_play_again_after_stop(self):
+        tracks = self.server.get_all_tracks()
+        self.sut.bind_media_server(self.server)
+        self.sut.load_track(tracks[1].id)
+
+        self.sut.play()
+        self.sut.stop()
+        self.sut.play()
+
+        self.assertEqual(self.sut.get_status().state, Spotifice.PlaybackState.PLAYING)
+
+    def test_status_record_matches_status(self):
+        tracks = self.server.get_all_tracks()
+        self.sut.bind_media_server(self.server)
+        self.sut.load_track(tracks[1].id)
+
+        record = self.sut.get_status_record()
+
+        self.assertEqual(record.state, Spotifice.PlaybackState.STOPPED)
+        self.assertEqual(record.current_track_id, tracks[1].id)
@@ -1,19 +1,35 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from time import monotonic
+from unittest import TestCase
+
 import Ice
 
-from media_server import Spotifice, main
+from media_server import MediaServerI, Spotifice, main
+from prefetch import ChunkPrefetcher, server_fetch
+from sorted_index import encode_cursor
 
 from .icetest import IceTestCase
 
 
 class TestServer(IceTestCase):
     server_port = 10000
+    identity = 'mediaServer1'
+    extra_props = {}
 
     def setUp(self):
         server_props = {
             'MediaServerAdapter.Endpoints': f'tcp -p {self.server_port}',
-            'MediaServer.Content': 'test/media'
+            'MediaServer.Content': 'test/media',
+            'MediaServer.Identity': self.identity,
+            **self.extra_props
         }
-        server_endpoint = f'mediaServer1:default -p {self.server_port} -t 500'
+        server_endpoint = f'{self.identity}:default -p {self.server_port} -t 500'
         self.create_server(main, server_props)
         self.sut = self.create_proxy(server_endpoint, Spotifice.MediaServerPrx)
 
@@ -24,11 +40,84 @@ class MusicLibraryTests(TestServer):
         self.assertEqual(len(tracks), 4)
         self.assertEqual(tracks[0].id, '1s.mp3')
 
+    def test_get_all_tracks_compressed(self):
+        tracks = self.sut.ice_compress(True).get_all_tracks()
+        self.assertEqual([(t.id, t.title, t.size) for t in tracks],
+                         [(t.id, t.title, t.size) for t in self.sut.get_all_tracks()])
+
     def test_get_track_info(self):
         track = self.sut.get_track_info('1s.mp3')
         self.assertEqual(track.id, '1s.mp3')
         self.assertEqual(track.title, '1s')
 
+    def test_get_tracks_paginated(self):
+        first = self.sut.get_tracks('', 3, '', Spotifice.MatchMode.PREFIX)
+        second = self.sut.get_tracks(first.next_cursor, 3, '', Spotifice.MatchMode.PREFIX)
+
+        self.assertEqual(first.total, 4)
+        self.assertEqual([t.title for t in first.tracks + second.tracks],
+                         ['1s', '2s', '4s', 'bad-file'])
+        self.assertEqual(second.next_cursor, '')
+
+    def test_get_tracks_filtered(self):
+        page = self.sut.get_tracks('', 10, 'S', Spotifice.MatchMode.SUBSTRING)
+
+        self.assertEqual(page.total, 3)
+        self.assertEqual([t.id for t in page.tracks], ['1s.mp3', '2s.mp3', '4s.mp3'])
+
+    def test_get_tracks_bad_cursor(self):
+        with self.assertRaises(Spotifice.Error):
+            self.sut.get_tracks('bad', 10, '', Spotifice.MatchMode.PREFIX)
+
+    def test_get_tracks_cursor_wrong_shape(self):
+        with self.assertRaises(Spotifice.Error):
+            self.sut.get_tracks(encode_cursor([1, 2]), 10, '', Spotifice.MatchMode.PREFIX)
+
+    def test_track_records_match_track_info(self):
+        tracks = self.sut.get_all_tracks()
+        records = self.sut.get_all_track_records()
+
+        self.assertEqual([(r.id, r.title, r.size) for r in records],
+                         [(t.id, t.title, t.size) for t in tracks])
+
+    def test_track_batch_is_columnar(self):
+        batch = self.sut.get_track_batch()
+
+        self.assertEqual(batch.ids, ['1s.mp3', '2s.mp3', '4s.mp3', 'bad-file.mp3'])
+        self.assertEqual(len(batch.durations_ms), len(batch.ids))
+        self.assertEqual(batch.sizes[2], 32617)
+
+    def test_get_tracks_info(self):
+        tracks = self.sut.get_tracks_info(['4s.mp3', '1s.mp3'])
+
+        self.assertEqual([t.id for t in tracks], ['4s.mp3', '1s.mp3'])
+
+    def test_get_tracks_info_wrong_track(self):
+        with self.assertRaises(Spotifice.TrackError) as cm:
+            self.sut.get_tracks_info(['1s.mp3', 'bad-track-id'])
+
+        self.assertEqual(cm.exception.item, 'bad-track-id')
+
+    def test_search(self):
+        self.assertEqual([t.id for t in self.sut.search('2', 10)], ['2s.mp3'])
+        self.assertEqual(len(self.sut.search('portal', 2)), 0)
+
+    def test_get_playlists_paginated(self):
+        first = self.sut.get_playlists('', 2, 'portal 2', Spotifice.MatchMode.PREFIX)
+        second = self.sut.get_playlists(
+            first.next_cursor, 2, 'portal 2', Spotifice.MatchMode.PREFIX)
+
+        self.assertEqual(first.total, 3)
+        self.assertEqual([p.name[-1] for p in first.playlists + second.playlists],
+                         ['1', '2', '3'])
+
+    def test_get_track_info_metadata(self):
+        track = self.sut.get_track_info('2s.mp3')
+
+        self.assertAlmostEqual(track.duration_ms, 2000, delta=100)
+        self.assertAlmostEqual(track.bitrate, 64, delta=2)
+        self.assertEqual(track.size, 16526)
+
     def test_get_track_info_wrong_track(self):
         with self.assertRaises(Spotifice.TrackError) as cm:
             self.sut.get_track_info('bad-track-id')
@@ -37,6 +126,19 @@ class MusicLibraryTests(TestServer):
         self.assertEqual(cm.exception.reason, 'Track not found')
 
 
+class ReplicaIdentityTests(TestServer):
+    # Las réplicas de un grupo de IceGrid comparten la identidad 'mediaServer'
+    identity = 'mediaServer'
+
+    def test_served_under_configured_identity(self):
+        self.assertEqual(len(self.sut.get_all_tracks()), 4)
+
+        other = self.client_ic.stringToProxy(
+            f'mediaServer1:default -p {self.server_port}')
+        with self.assertRaises(Ice.ObjectNotExistException):
+            other.ice_ping()
+
+
 class StreamManagerTests(TestServer):
     def test_open_stream_wrong_track(self):
         track_id = 'bad-track-id'
@@ -81,3 +183,612 @@ class StreamManagerTests(TestServer):
 
         self.assertEqual(cm.exception.item, 'missing-render-id')
         self.assertEqual(cm.exception.reason, 'No open stream for render')
+
+    def test_get_audio_chunk_at_out_of_order(self):
+        track_id = self.sut.get_all_tracks()[0].id
+        render_id = Ice.Identity(name='fake-render-id')
+        self.sut.open_stream(track_id, render_id)
+
+        second = self.sut.get_audio_chunk_at(render_id, 1024, 1024)
+        first = self.sut.get_audio_chunk_at(render_id, 0, 1024)
+
+        with open('test/media/1s.mp3', 'rb') as f:
+            self.assertEqual(first + second, f.read(2048))
+
+    def test_get_audio_chunk_at_past_end(self):
+        track_id = self.sut.get_all_tracks()[0].id
+        render_id = Ice.Identity(name='fake-render-id')
+        self.sut.open_stream(track_id, render_id)
+
+        chunk = self.sut.get_audio_chunk_at(render_id, 1 << 20, 1024)
+
+        self.assertEqual(len(chunk), 0)
+
+    def test_concurrent_streams_of_same_track(self):
+        render_a = Ice.Identity(name='render-a')
+        render_b = Ice.Identity(name='render-b')
+        self.sut.open_stream('1s.mp3', render_a)
+        self.sut.open_stream('1s.mp3', render_b)
+
+        first_a = self.sut.get_audio_chunk(render_a, 1024)
+        self.sut.close_stream(render_b)
+        second_a = self.sut.get_audio_chunk(render_a, 1024)
+
+        with open('test/media/1s.mp3', 'rb') as f:
+            self.assertEqual(first_a + second_a, f.read(2048))
+
+    def test_empty_track(self):
+        render_id = Ice.Identity(name='fake-render-id')
+        self.sut.open_stream('bad-file.mp3', render_id)
+
+        self.assertEqual(len(self.sut.get_audio_chunk_at(render_id, 0, 1024)), 0)
+
+    def test_open_stream_with_offset(self):
+        render_id = Ice.Identity(name='fake-render-id')
+
+        info = self.sut.open_stream_with(
+            '1s.mp3', render_id, Spotifice.StreamOptions(offset=4096))
+        chunk = self.sut.get_audio_chunk(render_id, 1024)
+
+        with open('test/media/1s.mp3', 'rb') as f:
+            expected = f.read()
+        self.assertEqual(info.size, len(expected))
+        self.assertEqual(chunk, expected[4096:5120])
+
+    def test_open_stream_audio_only(self):
+        render_id = Ice.Identity(name='fake-render-id')
+
+        info = self.sut.open_stream_with(
+            '1s.mp3', render_id, Spotifice.StreamOptions(audio_only=True))
+        chunk = self.sut.get_audio_chunk(render_id, 1024)
+        tail = self.sut.get_audio_chunk_at(render_id, info.size - 100, 1024)
+
+        with open('test/media/1s.mp3', 'rb') as f:
+            expected = f.read()
+        # 44 bytes de ID3v2 y la trama Info de 182 bytes
+        self.assertEqual(info.offset, 226)
+        self.assertEqual(chunk, expected[226:1250])
+        self.assertEqual(tail, expected[-100:])
+
+    def test_open_stream_with_negative_offset(self):
+        render_id = Ice.Identity(name='fake-render-id')
+
+        with self.assertRaises(Spotifice.StreamError) as cm:
+            self.sut.open_stream_with(
+                '1s.mp3', render_id, Spotifice.StreamOptions(offset=-1))
+
+        self.assertEqual(cm.exception.reason, 'Invalid offset')
+
+
+class ConcurrentStreamsTests(TestServer):
+    renders = 300
+    tracks = ('1s.mp3', '2s.mp3', '4s.mp3')
+    extra_props = {
+        'Ice.ThreadPool.Server.Size': '8',
+        'Ice.ThreadPool.Server.SizeMax': '16',
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.expected = {}
+        for track_id in self.tracks:
+            with open(f'test/media/{track_id}', 'rb') as f:
+                self.expected[track_id] = f.read()
+
+    def stream_whole_track(self, index):
+        render_id = Ice.Identity(name=f'render-{index}')
+        track_id = self.tracks[index % len(self.tracks)]
+        self.sut.open_stream(track_id, render_id)
+
+        received = b''.join(iter(lambda: self.sut.get_audio_chunk(render_id, 1000), b''))
+        return track_id, received
+
+    def test_hundreds_of_concurrent_streams(self):
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            results = list(pool.map(self.stream_whole_track, range(self.renders)))
+
+        for track_id, received in results:
+            self.assertEqual(received, self.expected[track_id])
+
+        # todos se cerraron al agotarse
+        with self.assertRaises(Spotifice.StreamError):
+            self.sut.get_audio_chunk(Ice.Identity(name='render-0'), 1000)
+
+    def test_reads_of_one_render_do_not_interleave(self):
+        render_id = Ice.Identity(name='shared-render')
+        self.sut.open_stream('4s.mp3', render_id)
+
+        def read_chunk(_):
+            return self.sut.get_audio_chunk(render_id, 1000)
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            chunks = list(pool.map(read_chunk, range(30)))
+
+        # cada chunk es un tramo distinto y contiguo del fichero
+        expected = self.expected['4s.mp3']
+        offsets = sorted(expected.index(chunk) for chunk in chunks)
+        self.assertEqual(offsets, list(range(0, 30000, 1000)))
+
+
+# El prefetcher del render contra un MediaServerPrx real, no contra futuros
+# falsos: los nombres de las invocaciones asíncronas los genera IcePy
+class PrefetchFromServerTests(TestServer):
+    def prefetch_whole_track(self, track_id, **kwargs):
+        render_id = Ice.Identity(name='prefetch-render')
+        self.sut.open_stream(track_id, render_id)
+        prefetcher = ChunkPrefetcher(
+            server_fetch(lambda: self.sut, render_id, **kwargs), chunk_size=1000, depth=4)
+        prefetcher.start()
+        self.addCleanup(prefetcher.close)
+        return b''.join(iter(prefetcher.read, b''))
+
+    def assert_whole_track(self, **kwargs):
+        with open('test/media/2s.mp3', 'rb') as f:
+            self.assertEqual(self.prefetch_whole_track('2s.mp3', **kwargs), f.read())
+
+    def test_sequential(self):
+        self.assert_whole_track()
+
+    def test_pipelined(self):
+        self.assert_whole_track(pipelined=True)
+
+    def test_paced(self):
+        self.assert_whole_track(paced=True)
+
+
+class AsyncStreamManagerTests(StreamManagerTests):
+    extra_props = {'MediaServer.Mode': 'asyncio'}
+
+
+# Un solo hilo de despacho de Ice: sólo el modo asyncio solapa las lecturas
+class AsyncConcurrentStreamsTests(ConcurrentStreamsTests):
+    extra_props = {'MediaServer.Mode': 'asyncio'}
+
+
+class AsyncChunkCacheTests(TestServer):
+    admin_port = 10010
+    extra_props = {
+        'MediaServer.Mode': 'asyncio',
+        'MediaServer.Cache.MaxBytes': '65536',
+        'MediaServer.Cache.BlockSize': '4096',
+        'Ice.Admin.Endpoints': f'tcp -h 127.0.0.1 -p {admin_port}',
+        'Ice.Admin.InstanceName': 'MediaServer',
+    }
+
+    def test_cached_blocks_served_without_deferring(self):
+        render_id = Ice.Identity(name='fake-render-id')
+        self.sut.open_stream('1s.mp3', render_id)
+        first = self.sut.get_audio_chunk_at(render_id, 0, 1024)
+        second = self.sut.get_audio_chunk_at(render_id, 1024, 1024)
+
+        metrics = self.create_proxy(
+            f'MediaServer/admin -f Streams:tcp -h 127.0.0.1 -p {self.admin_port}',
+            Spotifice.StatsPrx).get_metrics()
+
+        with open('test/media/1s.mp3', 'rb') as f:
+            self.assertEqual(first + second, f.read(2048))
+        self.assertEqual(metrics['deferred_reads'], 1)
+        self.assertEqual(metrics['cached_reads'], 1)
+        self.assertEqual(metrics['in_flight'], 0)
+
+
+class ChunkCacheTests(TestServer):
+    admin_port = 10010
+    extra_props = {
+        'MediaServer.Cache.MaxBytes': '65536',
+        'MediaServer.Cache.BlockSize': '4096',
+        'Ice.Admin.Endpoints': f'tcp -h 127.0.0.1 -p {admin_port}',
+        'Ice.Admin.InstanceName': 'MediaServer',
+    }
+
+    def get_cache_metrics(self):
+        proxy = self.create_proxy(
+            f'MediaServer/admin -f Cache:tcp -h 127.0.0.1 -p {self.admin_port}',
+            Spotifice.StatsPrx)
+        return proxy.get_metrics()
+
+    def test_cached_chunks_match_file(self):
+        render_id = Ice.Identity(name='fake-render-id')
+        self.sut.open_stream('2s.mp3', render_id)
+
+        chunks = [self.sut.get_audio_chunk_at(render_id, offset, 3000)
+                  for offset in (6000, 0, 3000, 6000)]
+
+        with open('test/media/2s.mp3', 'rb') as f:
+            expected = f.read(9000)
+        self.assertEqual(b''.join(chunks[1:]), expected)
+        self.assertEqual(chunks[0], expected[6000:])
+
+    def test_stats_facet_counts_hits(self):
+        render_id = Ice.Identity(name='fake-render-id')
+        self.sut.open_stream('1s.mp3', render_id)
+        self.sut.get_audio_chunk_at(render_id, 0, 1024)
+        self.sut.get_audio_chunk_at(render_id, 1024, 1024)
+
+        metrics = self.get_cache_metrics()
+
+        self.assertEqual(metrics['misses'], 1)
+        self.assertEqual(metrics['hits'], 1)
+
+
+class StreamLifetimeTests(TestServer):
+    admin_port = 10010
+    extra_props = {
+        'MediaServer.Streams.IdleTimeout': '1',
+        'MediaServer.Streams.Max': '2',
+        'Ice.Admin.Endpoints': f'tcp -h 127.0.0.1 -p {admin_port}',
+        'Ice.Admin.InstanceName': 'MediaServer',
+    }
+
+    def get_stream_metrics(self):
+        proxy = self.create_proxy(
+            f'MediaServer/admin -f Streams:tcp -h 127.0.0.1 -p {self.admin_port}',
+            Spotifice.StatsPrx)
+        return proxy.get_metrics()
+
+    def is_open(self, render_id):
+        try:
+            self.sut.get_audio_chunk_at(render_id, 0, 1)
+            return True
+        except Spotifice.StreamError:
+            return False
+
+    def test_idle_stream_is_reaped(self):
+        render_id = Ice.Identity(name='idle-render')
+        self.sut.open_stream('1s.mp3', render_id)
+
+        self.assertTrue(wait_until(lambda: self.get_stream_metrics()['reaped'] == 1, 3))
+        self.assertFalse(self.is_open(render_id))
+        self.assertEqual(self.get_stream_metrics()['open_files'], 0)
+
+    def test_least_recently_used_evicted_over_limit(self):
+        renders = [Ice.Identity(name=f'render-{i}') for i in range(3)]
+        self.sut.open_stream('1s.mp3', renders[0])
+        self.sut.open_stream('1s.mp3', renders[1])
+        self.sut.get_audio_chunk(renders[0], 1024)
+        self.sut.open_stream('2s.mp3', renders[2])
+
+        self.assertEqual([self.is_open(r) for r in renders], [True, False, True])
+        self.assertEqual(self.get_stream_metrics()['evicted'], 1)
+
+    def test_streams_closed_when_connection_drops(self):
+        render_ic = Ice.initialize()
+        proxy = Spotifice.MediaServerPrx.uncheckedCast(render_ic.stringToProxy(
+            f'mediaServer1:default -p {self.server_port} -t 500'))
+        proxy.open_stream('1s.mp3', Ice.Identity(name='crashed-render'))
+
+        render_ic.destroy()
+
+        self.assertTrue(wait_until(
+            lambda: self.get_stream_metrics()['disconnected'] == 1))
+        self.assertEqual(self.get_stream_metrics()['open_streams'], 0)
+
+
+class LibraryWatchTests(TestServer):
+    def setUp(self):
+        root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, root)
+        self.media_dir = root / 'media'
+        self.playlists_dir = root / 'playlists'
+        shutil.copytree('test/media', self.media_dir)
+        self.playlists_dir.mkdir()
+        self.write_playlist(['1s.mp3', 'new.mp3'])
+
+        self.extra_props = {
+            'MediaServer.Content': str(self.media_dir),
+            'MediaServer.Playlists': str(self.playlists_dir),
+            'MediaServer.Watch.Interval': '1',
+        }
+        super().setUp()
+
+    def write_playlist(self, track_ids, name='Mix'):
+        with open(self.playlists_dir / 'mix.playlist', 'w') as f:
+            json.dump({'id': 'mix', 'name': name, 'track_ids': track_ids}, f)
+
+    def track_ids(self):
+        return [track.id for track in self.sut.get_all_tracks()]
+
+    def test_new_track_revalidates_playlists(self):
+        self.assertEqual(self.sut.get_playlist('mix').track_ids, ['1s.mp3'])
+
+        shutil.copy(self.media_dir / '2s.mp3', self.media_dir / 'new.mp3')
+
+        self.assertTrue(wait_until(lambda: 'new.mp3' in self.track_ids(), 4))
+        self.assertEqual(self.sut.get_playlist('mix').track_ids, ['1s.mp3', 'new.mp3'])
+        self.assertEqual([t.id for t in self.sut.search('mix', 10)],
+                         ['1s.mp3', 'new.mp3'])
+
+    def test_playlist_expanded(self):
+        shutil.copy(self.media_dir / '2s.mp3', self.media_dir / 'new.mp3')
+        wait_until(lambda: 'new.mp3' in self.track_ids(), 4)
+
+        expanded = self.sut.get_playlist_expanded('mix')
+
+        self.assertEqual(expanded.playlist.name, 'Mix')
+        self.assertEqual([t.id for t in expanded.tracks], ['1s.mp3', 'new.mp3'])
+
+    def test_playlist_expanded_wrong_playlist(self):
+        with self.assertRaises(Spotifice.PlaylistError):
+            self.sut.get_playlist_expanded('bad-playlist-id')
+
+    def test_library_version_changes_on_reload(self):
+        version = self.sut.get_library_version()
+
+        self.write_playlist(['2s.mp3'], name='Renamed')
+
+        self.assertTrue(wait_until(lambda: self.sut.get_library_version() > version, 4))
+
+    def test_removed_track_disappears(self):
+        (self.media_dir / '1s.mp3').unlink()
+
+        self.assertTrue(wait_until(lambda: '1s.mp3' not in self.track_ids(), 4))
+        self.assertEqual(self.sut.get_playlist('mix').track_ids, [])
+
+    def test_edited_playlist_reloaded(self):
+        self.write_playlist(['2s.mp3'], name='Renamed')
+
+        self.assertTrue(wait_until(
+            lambda: self.sut.get_playlist('mix').name == 'Renamed', 4))
+        self.assertEqual(self.sut.get_playlist('mix').track_ids, ['2s.mp3'])
+
+    def test_open_stream_survives_removal(self):
+        render_id = Ice.Identity(name='fake-render-id')
+        self.sut.open_stream('4s.mp3', render_id)
+        (self.media_dir / '4s.mp3').unlink()
+        wait_until(lambda: '4s.mp3' not in self.track_ids(), 4)
+
+        received = b''.join(iter(lambda: self.sut.get_audio_chunk(render_id, 4096), b''))
+
+        with open('test/media/4s.mp3', 'rb') as f:
+            self.assertEqual(received, f.read())
+
+
+class IncrementalReloadTests(TestCase):
+    def setUp(self):
+        root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, root)
+        self.media_dir = root / 'media'
+        shutil.copytree('test/media', self.media_dir)
+        (root / 'playlists').mkdir()
+        self.sut = MediaServerI(self.media_dir, root / 'playlists')
+
+    def test_unchanged_tracks_are_reused(self):
+        before = dict(self.sut.tracks)
+        shutil.copy(self.media_dir / '1s.mp3', self.media_dir / 'new.mp3')
+        (self.media_dir / '4s.mp3').unlink()
+        os.utime(self.media_dir / '2s.mp3', ns=(0, 0))
+
+        added, removed, changed = self.sut.load_media()
+
+        self.assertEqual((added, removed, changed), ({'new.mp3'}, {'4s.mp3'}, {'2s.mp3'}))
+        tracks = self.sut.tracks
+        self.assertEqual(list(tracks), ['1s.mp3', '2s.mp3', 'bad-file.mp3', 'new.mp3'])
+        self.assertIs(tracks['1s.mp3'], before['1s.mp3'])
+        self.assertIs(tracks['bad-file.mp3'], before['bad-file.mp3'])
+        self.assertIsNot(tracks['2s.mp3'], before['2s.mp3'])
+        self.assertEqual([t.id for t in self.sut.track_order.items], list(tracks))
+
+    def test_nothing_changed_keeps_snapshots(self):
+        tracks, order = self.sut.tracks, self.sut.track_order
+
+        self.sut.load_media()
+
+        self.assertIs(self.sut.tracks, tracks)
+        self.assertIs(self.sut.track_order, order)
+
+
+class VariantTests(TestServer):
+    def setUp(self):
+        root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, root)
+        media_dir = root / 'media'
+        shutil.copytree('test/media', media_dir)
+        # Cualquier contenido vale: el servidor no decodifica las variantes
+        self.variant = root / 'media.variants' / '64' / '4s.mp3'
+        self.variant.parent.mkdir(parents=True)
+        shutil.copy('test/media/2s.mp3', self.variant)
+
+        self.extra_props = {'MediaServer.Content': str(media_dir)}
+        super().setUp()
+
+    def test_track_lists_its_variants(self):
+        self.assertEqual(self.sut.get_track_info('4s.mp3').variants, [64])
+        self.assertIs(self.sut.get_track_info('1s.mp3').variants, Ice.Unset)
+
+    def test_open_stream_with_variant(self):
+        render_id = Ice.Identity(name='fake-render-id')
+
+        info = self.sut.open_stream_with(
+            '4s.mp3', render_id, Spotifice.StreamOptions(variant=64, offset=1000))
+        data = self.sut.get_audio_chunk(render_id, 1024)
+
+        expected = self.variant.read_bytes()
+        self.assertEqual(info.size, len(expected))
+        self.assertEqual(data, expected[1000:2024])
+
+    def test_switch_maps_offset_by_time(self):
+        render_id = Ice.Identity(name='fake-render-id')
+        # Fin de la cabecera ID3v2 del original: inicio del audio en la variante
+        options = Spotifice.StreamOptions(variant=64, offset=44, from_variant=0)
+
+        info = self.sut.open_stream_with('4s.mp3', render_id, options)
+        data = self.sut.get_audio_chunk_at(render_id, info.offset, 1024)
+
+        self.assertEqual(info.offset, 44)
+        self.assertEqual(data, self.variant.read_bytes()[44:1068])
+
+    def test_switch_from_missing_variant(self):
+        render_id = Ice.Identity(name='fake-render-id')
+
+        with self.assertRaises(Spotifice.StreamError):
+            self.sut.open_stream_with('4s.mp3', render_id, Spotifice.StreamOptions(
+                variant=64, offset=44, from_variant=128))
+
+    def test_missing_variant(self):
+        render_id = Ice.Identity(name='fake-render-id')
+
+        with self.assertRaises(Spotifice.StreamError):
+            self.sut.open_stream_with(
+                '1s.mp3', render_id, Spotifice.StreamOptions(variant=64))
+
+
+def wait_until(predicate, timeout=2):
+    for _ in range(int(timeout / 0.05)):
+        if predicate():
+            return True
+        threading.Event().wait(0.05)
+    return predicate()
+
+
+class RecordingSink(Spotifice.AudioSink):
+    def __init__(self):
+        self.chunks = []
+        self.size = None
+
+    def push_chunk(self, offset, data, current=None):
+        self.chunks.append((offset, data))
+
+    def end_of_stream(self, size, current=None):
+        self.size = size
+
+
+class PushStreamTests(TestServer):
+    def create_sink(self):
+        adapter = self.client_ic.createObjectAdapterWithEndpoints(
+            'SinkAdapter', 'tcp -h 127.0.0.1')
+        adapter.activate()
+        self.addCleanup(adapter.destroy)
+
+        servant = RecordingSink()
+        proxy = Spotifice.AudioSinkPrx.uncheckedCast(adapter.addWithUUID(servant))
+        return servant, proxy
+
+    def test_pull_when_no_sink(self):
+        render_id = Ice.Identity(name='fake-render-id')
+
+        info = self.sut.open_stream_with(
+            '1s.mp3', render_id, Spotifice.StreamOptions())
+
+        self.assertFalse(info.push)
+        self.assertGreater(len(self.sut.get_audio_chunk(render_id, 1024)), 0)
+
+    def test_push_limited_by_credits(self):
+        render_id = Ice.Identity(name='fake-render-id')
+        servant, sink = self.create_sink()
+
+        info = self.sut.open_stream_with(
+            '1s.mp3', render_id,
+            Spotifice.StreamOptions(sink=sink, credits=2, chunk_size=1024))
+        wait_until(lambda: len(servant.chunks) >= 2)
+        wait_until(lambda: len(servant.chunks) > 2, timeout=0.3)
+
+        self.assertTrue(info.push)
+        self.assertEqual([offset for offset, _ in servant.chunks], [0, 1024])
+
+    def test_push_whole_track(self):
+        render_id = Ice.Identity(name='fake-render-id')
+        servant, sink = self.create_sink()
+
+        self.sut.open_stream_with(
+            '1s.mp3', render_id,
+            Spotifice.StreamOptions(sink=sink, credits=1000, chunk_size=1024))
+        wait_until(lambda: servant.size is not None)
+
+        with open('test/media/1s.mp3', 'rb') as f:
+            expected = f.read()
+        self.assertEqual(servant.size, len(expected))
+        self.assertEqual(b''.join(data for _, data in sorted(servant.chunks)), expected)
+
+
+class ShapingTests(PushStreamTests):
+    admin_port = 10010
+    extra_props = {
+        'MediaServer.Shaping.StreamRate': '4096',
+        'MediaServer.Shaping.BurstSecs': '1',
+        'MediaServer.Shaping.MinChunk': '512',
+        'Ice.Admin.Endpoints': f'tcp -h 127.0.0.1 -p {admin_port}',
+        'Ice.Admin.InstanceName': 'MediaServer',
+    }
+
+    def get_metrics(self):
+        return self.create_proxy(
+            f'MediaServer/admin -f Shaping:tcp -h 127.0.0.1 -p {self.admin_port}',
+            Spotifice.StatsPrx).get_metrics()
+
+    def test_over_share_gets_short_read(self):
+        render_id = Ice.Identity(name='fake-render-id')
+        self.sut.open_stream('4s.mp3', render_id)
+
+        self.assertEqual(len(self.sut.get_audio_chunk_at(render_id, 0, 4096)), 4096)
+        self.assertEqual(len(self.sut.get_audio_chunk_at(render_id, 4096, 4096)), 512)
+
+    def test_over_share_reply_is_held(self):
+        render_id = Ice.Identity(name='fake-render-id')
+        self.sut.open_stream('4s.mp3', render_id)
+        self.sut.get_audio_chunk(render_id, 4096)
+
+        start = monotonic()
+        data = self.sut.get_audio_chunk(render_id, 4096)
+
+        # 512 bytes de deuda a 4096 bytes/s
+        self.assertEqual(len(data), 512)
+        self.assertGreaterEqual(monotonic() - start, 0.1)
+
+    def test_paced_read_hints_backoff(self):
+        render_id = Ice.Identity(name='fake-render-id')
+        self.sut.open_stream('4s.mp3', render_id)
+
+        first = self.sut.get_audio_chunk_paced(render_id, 0, 4096)
+        throttled = self.sut.get_audio_chunk_paced(render_id, 4096, 4096)
+        threading.Event().wait(throttled.retry_after_ms / 1000)
+        after_wait = self.sut.get_audio_chunk_paced(render_id, 4096, 4096)
+
+        self.assertEqual((len(first.data), first.retry_after_ms), (4096, 0))
+        self.assertEqual(throttled.data, b'')
+        self.assertGreater(throttled.retry_after_ms, 500)
+        self.assertEqual((len(after_wait.data), after_wait.retry_after_ms), (4096, 0))
+
+    def test_paced_end_of_track(self):
+        render_id = Ice.Identity(name='fake-render-id')
+        self.sut.open_stream('1s.mp3', render_id)
+
+        chunk = self.sut.get_audio_chunk_paced(render_id, 1 << 20, 1024)
+
+        self.assertEqual((chunk.data, chunk.retry_after_ms), (b'', 0))
+
+    def test_metrics_per_render(self):
+        greedy = Ice.Identity(name='greedy')
+        polite = Ice.Identity(name='polite')
+        self.sut.open_stream('4s.mp3', greedy)
+        self.sut.open_stream('4s.mp3', polite)
+        for offset in range(0, 16384, 4096):
+            self.sut.get_audio_chunk_at(greedy, offset, 4096)
+        self.sut.get_audio_chunk_at(polite, 0, 4096)
+
+        metrics = self.get_metrics()
+
+        self.assertEqual(metrics['renders'], 2)
+        self.assertEqual(metrics['greedy.served_bytes'], 4096 + 3 * 512)
+        self.assertEqual(metrics['greedy.throttled'], 3)
+        self.assertGreater(metrics['greedy.throttled_secs'], 0)
+        self.assertEqual(metrics['polite.served_bytes'], 4096)
+        self.assertEqual(metrics['polite.throttled'], 0)
+
+    def test_push_paced_to_stream_rate(self):
+        render_id = Ice.Identity(name='fake-render-id')
+        servant, sink = self.create_sink()
+
+        self.sut.open_stream_with(
+            '2s.mp3', render_id,
+            Spotifice.StreamOptions(sink=sink, credits=1000, chunk_size=1024))
+        wait_until(lambda: servant.chunks, timeout=1)
+        threading.Event().wait(1)
+
+        # Ráfaga de 4096 más ~4096 bytes/s
+        received = sum(len(data) for _, data in servant.chunks)
+        self.assertGreater(received, 4096)
+        self.assertLess(received, 4096 * 3)
+
+
+class AsyncShapingTests(ShapingTests):
+    extra_props = {**ShapingTests.extra_props, 'MediaServer.Mode': 'asyncio'}
@@ -0,0 +1,121 @@
+import multiprocessing
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import Ice
+
+from media_server import Spotifice, main
+from media_workers import WorkerPool
+
+from .icetest import IceTestCase
+
+
+class WorkerPoolTests(IceTestCase):
+    server_port = 10020
+
+    def setUp(self):
+        self.media_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.media_dir)
+        for name in ('1s.mp3', '2s.mp3'):
+            shutil.copy(Path('test/media') / name, self.media_dir)
+
+        server_props = {
+            'MediaServerAdapter.Endpoints': f'tcp -p {self.server_port}',
+            'MediaServer.Content': str(self.media_dir),
+            'MediaServer.Workers': '2',
+            'MediaServer.Workers.Endpoints': 'tcp -h 127.0.0.1',
+            'MediaServer.Watch.Interval': '1',
+        }
+        self.create_server(main, server_props)
+        self.locator = Ice.LocatorPrx.uncheckedCast(self.client_ic.stringToProxy(
+            f'MediaServer/Locator:tcp -p {self.server_port}'))
+        self.wait_object_ready(self.locator)
+
+    def server_via_locator(self):
+        # Un communicator por cliente: cada uno cachea el worker que le toca
+        ic = Ice.initialize()
+        self.addCleanup(ic.destroy)
+        proxy = ic.stringToProxy('mediaServer1').ice_locator(
+            Ice.LocatorPrx.uncheckedCast(ic.stringToProxy(str(self.locator))))
+        return Spotifice.MediaServerPrx.uncheckedCast(proxy)
+
+    def wait_workers_alive(self, count, timeout=10):
+        deadline = time.monotonic() + timeout
+        while len(multiprocessing.active_children()) < count:
+            if time.monotonic() > deadline:
+                self.fail(f'Less than {count} workers alive')
+            time.sleep(0.2)
+
+    def test_clients_spread_over_workers(self):
+        first = self.locator.findObjectById(Ice.stringToIdentity('mediaServer1'))
+        second = self.locator.findObjectById(Ice.stringToIdentity('mediaServer1'))
+
+        self.assertNotEqual(first.ice_getEndpoints(), second.ice_getEndpoints())
+
+    def test_unknown_identity(self):
+        with self.assertRaises(Ice.ObjectNotFoundException):
+            self.locator.findObjectById(Ice.stringToIdentity('other'))
+
+    def test_workers_serve_shared_catalogue(self):
+        servers = [self.server_via_locator() for _ in range(2)]
+
+        for server in servers:
+            self.assertEqual([t.id for t in server.get_all_tracks()],
+                             ['1s.mp3', '2s.mp3'])
+        # Misma versión de biblioteca en todos los workers
+        self.assertEqual(len({server.get_library_version() for server in servers}), 1)
+
+    def test_stream_from_worker(self):
+        server = self.server_via_locator()
+        render_id = Ice.Identity(name='fake-render-id')
+
+        server.open_stream('1s.mp3', render_id)
+
+        with open(self.media_dir / '1s.mp3', 'rb') as f:
+            self.assertEqual(server.get_audio_chunk(render_id, 1024), f.read(1024))
+
+    def test_library_change_reaches_workers(self):
+        server = self.server_via_locator()
+        shutil.copy('test/media/4s.mp3', self.media_dir)
+
+        deadline = time.monotonic() + 6
+        while time.monotonic() < deadline:
+            if len(server.get_all_tracks()) == 3:
+                break
+            time.sleep(0.2)
+        self.assertEqual(len(server.get_all_tracks()), 3)
+
+    def test_default_locator_resolves_indirect_proxy(self):
+        # Como el render con Ice.Default.Locator en render.config
+        ic = self.ice_initialize_with_props({'Ice.Default.Locator': str(self.locator)})
+        self.addCleanup(ic.destroy)
+        server = Spotifice.MediaServerPrx.uncheckedCast(ic.stringToProxy('mediaServer1'))
+
+        self.assertEqual(len(server.get_all_tracks()), 2)
+
+    def test_dead_worker_respawned(self):
+        server = self.server_via_locator()
+        server.get_all_tracks()
+        victim = multiprocessing.active_children()[0]
+
+        victim.kill()
+        victim.join()
+        self.wait_workers_alive(2)
+
+        self.assertNotIn(victim.pid, [p.pid for p in multiprocessing.active_children()])
+        for server in [server] + [self.server_via_locator() for _ in range(2)]:
+            self.assertEqual(len(server.get_all_tracks()), 2)
+
+
+class WorkerStartupTests(IceTestCase):
+    def test_worker_dying_at_startup(self):
+        # Sin catálogo compartido el worker muere antes de enviar su proxy
+        pool = WorkerPool(
+            self.client_ic, 1, {}, 'missing-catalogue', Ice.stringToIdentity('x'))
+        start = time.monotonic()
+
+        with self.assertRaises(RuntimeError):
+            pool.start()
+        self.assertLess(time.monotonic() - start, WorkerPool.STARTUP_SECS)
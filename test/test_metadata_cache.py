@@ -0,0 +1,62 @@
+from unittest import TestCase
+
+from metadata_cache import MetadataCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class MetadataCacheTests(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.sut = MetadataCache(ttl=10, max_entries=3, clock=self.clock)
+        self.sut.set_version('server-a', 1)
+
+    def test_fresh_until_ttl(self):
+        self.sut.put('server-a', 'track', '1s.mp3', 'info')
+
+        self.assertEqual(self.sut.get('server-a', 'track', '1s.mp3'), ('info', True))
+        self.clock.now = 11
+        self.assertEqual(self.sut.get('server-a', 'track', '1s.mp3'), ('info', False))
+
+    def test_same_version_renews_entries(self):
+        self.sut.put('server-a', 'track', '1s.mp3', 'info')
+        self.clock.now = 11
+
+        self.assertTrue(self.sut.revalidate('server-a', 1))
+        self.assertEqual(self.sut.get('server-a', 'track', '1s.mp3'), ('info', True))
+
+    def test_new_version_drops_server_entries(self):
+        self.sut.put('server-a', 'track', '1s.mp3', 'a')
+        self.sut.put('server-b', 'track', '1s.mp3', 'b')
+        self.clock.now = 11
+
+        self.assertFalse(self.sut.revalidate('server-a', 2))
+        self.assertEqual(self.sut.get('server-a', 'track', '1s.mp3'), (None, False))
+        self.assertEqual(self.sut.get('server-b', 'track', '1s.mp3')[0], 'b')
+
+    def test_entries_keyed_by_server(self):
+        self.sut.put('server-a', 'track', '1s.mp3', 'a')
+
+        self.assertEqual(self.sut.get('server-b', 'track', '1s.mp3'), (None, False))
+
+    def test_least_recently_used_evicted(self):
+        for key in ('1', '2', '3'):
+            self.sut.put('server-a', 'track', key, key)
+        self.sut.get('server-a', 'track', '1')
+        self.sut.put('server-a', 'track', '4', '4')
+
+        self.assertIsNone(self.sut.get('server-a', 'track', '2')[0])
+        self.assertEqual(self.sut.stats()['evictions'], 1)
+
+    def test_version_change_on_rebind_flushes(self):
+        self.sut.put('server-a', 'playlist', 'mix', 'playlist')
+
+        self.sut.set_version('server-a', 2)
+
+        self.assertEqual(len(self.sut), 0)
@@ -0,0 +1,402 @@
+import io
+import threading
+from concurrent.futures import Future
+from time import sleep
+from types import SimpleNamespace
+from unittest import TestCase
+
+from prefetch import (
+    AdaptiveChunkSizer,
+    ChunkPrefetcher,
+    PushBuffer,
+    TrackSequence,
+    VariantSelector,
+)
+
+
+def resolved(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+class PrefetchTests(TestCase):
+    def create_prefetcher(self, data, **kwargs):
+        source = io.BytesIO(data)
+        sut = ChunkPrefetcher(lambda offset, size: resolved(source.read(size)), **kwargs)
+        sut.start()
+        self.addCleanup(sut.close)
+        return sut
+
+    def test_read_returns_whole_stream_in_order(self):
+        data = bytes(range(256)) * 64
+        sut = self.create_prefetcher(data, chunk_size=1000)
+
+        received = b''.join(iter(lambda: sut.read(1000), b''))
+
+        self.assertEqual(received, data)
+
+    def test_capacity_bounded_by_seconds(self):
+        sut = ChunkPrefetcher(None, chunk_size=1024, max_bytes=1 << 20,
+                              max_seconds=2, byte_rate=4096)
+        self.assertEqual(sut.capacity, 8192)
+
+    def test_buffer_never_exceeds_capacity(self):
+        sut = self.create_prefetcher(b'x' * 100_000, chunk_size=1024, max_bytes=4096)
+        sut.join(0.2)
+
+        stats = sut.stats()
+        self.assertTrue(sut.is_alive())
+        self.assertLessEqual(stats['fill_bytes'], 4096)
+        self.assertEqual(stats['fill_bytes'], stats['fetched_bytes'])
+
+    def test_fetch_error_ends_stream(self):
+        def failing_fetch(offset, size):
+            future = Future()
+            future.set_exception(RuntimeError("link down"))
+            return future
+
+        sut = ChunkPrefetcher(failing_fetch)
+        sut.start()
+
+        self.assertEqual(sut.read(4096), b'')
+
+    def test_close_unblocks_reader(self):
+        sut = ChunkPrefetcher(lambda offset, size: Future())
+        sut.start()
+        sut.close()
+
+        self.assertEqual(sut.read(4096), b'')
+
+
+class PipelinedPrefetchTests(TestCase):
+    data = bytes(range(256)) * 40
+
+    def read_all(self, sut):
+        sut.start()
+        self.addCleanup(sut.close)
+        return b''.join(iter(lambda: sut.read(1024), b''))
+
+    def test_out_of_order_replies_are_reassembled(self):
+        requests = []
+        lock = threading.Lock()
+
+        def fetch_async(offset, size):
+            future = Future()
+            with lock:
+                requests.append((offset, size, future))
+                # se resuelven en orden inverso al de llegada
+                if len(requests) == 4:
+                    for o, s, f in reversed(requests):
+                        f.set_result(self.data[o:o + s])
+                    requests.clear()
+            return future
+
+        def flush():
+            while not sut.exhausted:
+                with lock:
+                    for o, s, f in reversed(requests):
+                        f.set_result(self.data[o:o + s])
+                    requests.clear()
+                threading.Event().wait(0.01)
+
+        sut = ChunkPrefetcher(fetch_async, chunk_size=1000, depth=4)
+        threading.Thread(target=flush, daemon=True).start()
+
+        self.assertEqual(self.read_all(sut), self.data)
+
+    def test_keeps_depth_requests_in_flight(self):
+        in_flight = []
+
+        def fetch_async(offset, size):
+            in_flight.append(offset)
+            return Future()
+
+        sut = ChunkPrefetcher(fetch_async, chunk_size=1000, depth=3)
+        sut.start()
+        self.addCleanup(sut.close)
+        sut.join(0.1)
+
+        self.assertEqual(in_flight, [0, 1000, 2000])
+
+    def test_short_reads_are_refetched(self):
+        def fetch_async(offset, size):
+            return resolved(self.data[offset:offset + min(size, 300)])
+
+        sut = ChunkPrefetcher(fetch_async, chunk_size=1000, depth=4)
+
+        self.assertEqual(self.read_all(sut), self.data)
+
+    def test_resume_after_failure_continues_from_received_offset(self):
+        failed = []
+
+        def fetch_async(offset, size):
+            if offset >= 3000 and not failed:
+                failed.append(offset)
+                future = Future()
+                future.set_exception(ConnectionError("replica down"))
+                return future
+            return resolved(self.data[offset:offset + size])
+
+        resumed_at = []
+        sut = ChunkPrefetcher(fetch_async, chunk_size=1000, depth=2,
+                              resume=lambda offset: resumed_at.append(offset) or True)
+        sut.RESUME_DELAY_SECS = 0
+
+        self.assertEqual(self.read_all(sut), self.data)
+        self.assertEqual(resumed_at, [3000])
+
+    def test_resume_limit_is_per_failure_streak(self):
+        failed = set()
+
+        def fetch_async(offset, size):
+            # Falla una vez en cada chunk a partir del 1000: más que MAX_RESUMES
+            if offset >= 1000 and offset not in failed:
+                failed.add(offset)
+                future = Future()
+                future.set_exception(ConnectionError("replica down"))
+                return future
+            return resolved(self.data[offset:offset + size])
+
+        sut = ChunkPrefetcher(fetch_async, chunk_size=1000,
+                              resume=lambda offset: True)
+        sut.RESUME_DELAY_SECS = 0
+
+        self.assertEqual(self.read_all(sut), self.data)
+        self.assertGreater(sut.stats()['resumes'], sut.MAX_RESUMES)
+
+    def test_paced_chunks_wait_and_refetch(self):
+        requests = []
+
+        def fetch_async(offset, size):
+            # La primera petición de cada offset se limita: nada y 10 ms de espera
+            throttled = offset not in requests
+            requests.append(offset)
+            data = b'' if throttled else self.data[offset:offset + size]
+            return resolved(SimpleNamespace(data=data, retry_after_ms=10 * throttled))
+
+        sut = ChunkPrefetcher(fetch_async, chunk_size=1000, depth=1)
+
+        self.assertEqual(self.read_all(sut), self.data)
+        self.assertEqual(sut.stats()['throttled'], len(requests) // 2)
+        self.assertGreater(sut.stats()['throttled_secs'], 0)
+
+    def test_variant_switch_continues_at_mapped_offset(self):
+        variants = {128: self.data, 64: bytes(len(self.data) // 2)}
+        current = [128]
+
+        class SwitchOnce:
+            def on_fetch(self, size, elapsed, in_flight):
+                pass
+
+            def choose(self):
+                return 64 if current == [128] else None
+
+            def switched(self, kbps):
+                pass
+
+            def stats(self):
+                return {}
+
+        def switch(offset, kbps):
+            current[0] = kbps
+            return offset * len(variants[kbps]) // len(variants[128])
+
+        def fetch_async(offset, size):
+            return resolved(variants[current[0]][offset:offset + size])
+
+        sut = ChunkPrefetcher(fetch_async, chunk_size=1000, depth=3,
+                              selector=SwitchOnce(), switch=switch)
+
+        received = self.read_all(sut)
+        self.assertEqual(received, self.data[:1000] + variants[64][500:])
+        self.assertEqual(sut.stats()['variant_switches'], 1)
+
+
+class VariantSelectorTests(TestCase):
+    def test_slow_link_picks_lowest(self):
+        sut = VariantSelector([64, 128, 192], current=192)
+        sut.on_fetch(1000, 1.0)
+
+        self.assertEqual(sut.choose(now=0), 64)
+
+    def test_hold_after_switch(self):
+        sut = VariantSelector([64, 128, 192], current=192)
+        sut.switched(64, now=0)
+        sut.on_fetch(100_000, 0.1, in_flight=2)
+
+        self.assertIsNone(sut.choose(now=1))
+        self.assertEqual(sut.choose(now=sut.HOLD_SECS + 1), 192)
+
+    def test_hysteresis_between_up_and_down(self):
+        # 25000 bytes/s: 128 kbps no basta para subir, pero sí para quedarse
+        sut = VariantSelector([64, 128], current=128, throughput=25_000)
+        self.assertIsNone(sut.choose(now=0))
+
+        sut = VariantSelector([64, 128], current=64, throughput=25_000)
+        self.assertIsNone(sut.choose(now=0))
+
+
+class PushBufferTests(TestCase):
+    def create_buffer(self, **kwargs):
+        self.granted = []
+        return PushBuffer(self.granted.append, **kwargs)
+
+    def test_chunks_reordered_by_offset(self):
+        sut = self.create_buffer(chunk_size=4)
+        sut.push(4, b'5678')
+        sut.push(0, b'1234')
+        sut.end(8)
+
+        self.assertEqual(b''.join(iter(lambda: sut.read(4), b'')), b'12345678')
+
+    def test_credits_returned_by_half_window(self):
+        sut = self.create_buffer(chunk_size=1000, max_bytes=4000)
+        for offset in range(0, 4000, 1000):
+            sut.push(offset, b'x' * 1000)
+
+        sut.read(1000)
+        self.assertEqual(self.granted, [])
+        sut.read(1000)
+        self.assertEqual(self.granted, [2])
+
+    def test_close_unblocks_reader(self):
+        sut = self.create_buffer()
+        sut.close()
+
+        self.assertEqual(sut.read(4096), b'')
+
+
+class AdaptiveChunkSizerTests(TestCase):
+    def test_grows_with_latency(self):
+        changes = []
+        sut = AdaptiveChunkSizer(chunk_size=4096, byte_rate=16000,
+                                 on_change=changes.append)
+        for _ in range(20):
+            sut.on_fetch(0.5)
+
+        # 2 * 16000 B/s * 0.5 s = 16000 -> 16384
+        self.assertEqual(sut.chunk_size, 16384)
+        self.assertEqual(sut.queue_bytes(), 32768)
+        self.assertTrue(changes)
+
+    def test_shrinks_on_fast_link_with_depth(self):
+        sut = AdaptiveChunkSizer(chunk_size=65536, byte_rate=16000)
+        for _ in range(20):
+            sut.on_fetch(0.01, depth=4)
+
+        self.assertEqual(sut.chunk_size, AdaptiveChunkSizer.MIN_CHUNK)
+        self.assertGreater(sut.stats()['shrinks'], 0)
+
+    def test_clamped_to_max(self):
+        sut = AdaptiveChunkSizer(max_chunk=32768, byte_rate=16000)
+        for _ in range(20):
+            sut.on_fetch(10)
+
+        self.assertEqual(sut.chunk_size, 32768)
+
+    def test_consumed_bitrate_sets_buffer_target(self):
+        sut = AdaptiveChunkSizer(target_seconds=2, byte_rate=16000)
+        for second in range(30):
+            sut.on_consume(32000, now=float(second))
+
+        self.assertAlmostEqual(sut.buffer_bytes(), 64000, delta=100)
+
+    def test_prefetcher_follows_sizer(self):
+        sizer = AdaptiveChunkSizer(chunk_size=2048, byte_rate=16000)
+        sut = ChunkPrefetcher(None, max_bytes=1 << 20, sizer=sizer)
+
+        self.assertEqual(sut.chunk_size, 2048)
+        self.assertEqual(sut.capacity, sizer.buffer_bytes())
+
+
+class GaplessTests(TestCase):
+    def create_prefetcher(self, data, on_exhausted=None):
+        source = io.BytesIO(data)
+        prefetcher = ChunkPrefetcher(lambda offset, size: resolved(source.read(size)),
+                                     chunk_size=1000, on_exhausted=on_exhausted)
+        self.addCleanup(prefetcher.close)
+        return prefetcher
+
+    def test_preloaded_track_follows_without_gap(self):
+        first, second = b'a' * 5500, b'b' * 3200
+        changes = []
+        sequence = None
+
+        def preload():
+            nxt = self.create_prefetcher(second, on_exhausted=lambda: sequence.finish())
+            nxt.start()
+            sequence.enqueue(nxt, 'second')
+
+        current = self.create_prefetcher(first, on_exhausted=preload)
+        sequence = TrackSequence(current, changes.append)
+        current.start()
+        current.join(1)  # la siguiente ya está precargada al acabar la actual
+
+        received = b''.join(iter(lambda: sequence.read(1000), b''))
+
+        self.assertEqual(received, first + second)
+        self.assertEqual(changes, ['second'])
+        stats = sequence.stats()
+        self.assertEqual(stats['gapless_transitions'], 1)
+        self.assertLess(stats['gapless_max_gap_ms'], 50)
+
+    def test_stream_ends_when_no_next_track(self):
+        current = self.create_prefetcher(b'a' * 1500)
+        sequence = TrackSequence(current)
+        current.on_exhausted = sequence.finish
+        current.start()
+
+        self.assertEqual(b''.join(iter(lambda: sequence.read(1000), b'')), b'a' * 1500)
+
+    def test_short_tracks_with_repeat_preload_one_ahead(self):
+        # Como MediaRenderI.preload_next: cada pista precargada encadena la
+        # siguiente al descargarse, y con repeat no hay última pista
+        tracks = [b'a' * 1500, b'b' * 1200, b'c' * 900]
+        opened = []
+        sequence = None
+
+        def preload(position):
+            if not sequence.wait_slot():
+                return
+            position = (position + 1) % len(tracks)
+            nxt = self.create_prefetcher(
+                tracks[position], on_exhausted=lambda: preload(position))
+            opened.append(position)
+            sequence.enqueue(nxt, position)
+            nxt.start()
+
+        current = self.create_prefetcher(tracks[0], on_exhausted=lambda: preload(0))
+        sequence = TrackSequence(current)
+        self.addCleanup(sequence.close)
+        current.start()
+        current.join(1)
+        sleep(0.2)  # tiempo de sobra para descargar más pistas si se encadenaran
+
+        self.assertEqual(opened, [1])
+        expected = b''.join(tracks) * 2
+        received = b''
+        while len(received) < len(expected):
+            received += sequence.read(1000)
+        self.assertEqual(received[:len(expected)], expected)
+        # Las cinco pistas que siguen a la primera y, como mucho, una más
+        self.assertLessEqual(len(opened), 6)
+
+    def test_enqueue_refuses_second_pending_track(self):
+        sequence = TrackSequence(self.create_prefetcher(b''))
+        first, second = self.create_prefetcher(b'x'), self.create_prefetcher(b'y')
+
+        sequence.enqueue(first, 'first')
+        sequence.enqueue(second, 'second')
+
+        self.assertFalse(first.closed)
+        self.assertTrue(second.closed)
+
+    def test_enqueue_after_close_releases_source(self):
+        sequence = TrackSequence(self.create_prefetcher(b''))
+        sequence.close()
+        late = self.create_prefetcher(b'x')
+
+        sequence.enqueue(late, 'late')
+
+        self.assertTrue(late.closed)
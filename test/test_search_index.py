@@ -0,0 +1,49 @@
+from unittest import TestCase
+
+from search_index import SearchIndex, fold
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.sut = SearchIndex()
+        self.sut.update_many([
+            ('cancion.mp3', {'title': 'Canción de cuna', 'playlists': 'Nanas'}),
+            ('corazon.mp3', {'title': 'Corazón partío', 'artist': 'Alejandro Sanz'}),
+            ('cuna.mp3', {'title': 'La cuna vacía', 'filename': 'cuna'}),
+        ])
+
+    def test_fold_removes_accents(self):
+        self.assertEqual(fold('Canción PARTÍO ñ'), 'cancion partio n')
+
+    def test_accent_insensitive(self):
+        self.assertEqual(self.sut.search('CANCION'), ['cancion.mp3'])
+        self.assertEqual(self.sut.search('corazón'), ['corazon.mp3'])
+
+    def test_prefix_matching(self):
+        self.assertEqual(self.sut.search('co'), ['corazon.mp3'])
+        self.assertEqual(self.sut.search('canc cu'), ['cancion.mp3'])
+
+    def test_ranking_prefers_exact_and_weighted_fields(self):
+        # 'cuna' en título y nombre de fichero puntúa más que sólo en título
+        self.assertEqual(self.sut.search('cuna'), ['cuna.mp3', 'cancion.mp3'])
+
+    def test_all_terms_required(self):
+        self.assertEqual(self.sut.search('cuna sanz'), [])
+
+    def test_playlist_names_are_searchable(self):
+        self.assertEqual(self.sut.search('nanas'), ['cancion.mp3'])
+
+    def test_incremental_update_and_remove(self):
+        self.sut.update('cuna.mp3', {'title': 'Otra canción'})
+        self.sut.remove('cancion.mp3')
+
+        self.assertEqual(self.sut.search('cuna'), [])
+        self.assertEqual(self.sut.search('cancion'), ['cuna.mp3'])
+        self.assertEqual(self.sut.vocabulary, sorted(self.sut.postings))
+
+    def test_same_track_twice_in_one_batch(self):
+        self.sut.update_many([('nueva.mp3', {'title': 'Zarzuela'}),
+                              ('nueva.mp3', {'title': 'Zarzuela'})])
+
+        self.assertEqual(self.sut.vocabulary, sorted(self.sut.postings))
+        self.assertEqual(self.sut.search('zarz'), ['nueva.mp3'])
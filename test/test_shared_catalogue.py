@@ -0,0 +1,38 @@
+from unittest import TestCase
+
+from shared_catalogue import SharedCatalogue
+
+
+class SharedCatalogueTests(TestCase):
+    def setUp(self):
+        self.sut = SharedCatalogue.create()
+        self.addCleanup(self.sut.close)
+
+    def attach(self):
+        reader = SharedCatalogue.attach(self.sut.name)
+        self.addCleanup(reader.close)
+        return reader
+
+    def test_nothing_published(self):
+        self.assertIsNone(self.attach().read())
+
+    def test_reader_sees_published_snapshot(self):
+        self.sut.publish(7, {'records': {'1s.mp3': {'title': '1s'}}})
+
+        self.assertEqual(self.attach().read(),
+                         (7, {'records': {'1s.mp3': {'title': '1s'}}}))
+
+    def test_same_version_not_read_again(self):
+        reader = self.attach()
+        self.sut.publish(7, 'first')
+
+        self.assertIsNone(reader.read(known_version=7))
+        self.sut.publish(8, 'second')
+        self.assertEqual(reader.read(known_version=7), (8, 'second'))
+
+    def test_keeps_last_segments(self):
+        for version in range(5):
+            self.sut.publish(version, list(range(1000)))
+
+        self.assertEqual(len(self.sut.segments), SharedCatalogue.KEEP)
+        self.assertEqual(self.attach().read()[0], 4)
@@ -0,0 +1,75 @@
+from unittest import TestCase
+
+from sorted_index import PREFIX, SUBSTRING, SortedIndex, encode_cursor
+
+
+class SortedIndexTests(TestCase):
+    titles = ['Want You Gone', 'Still Alive', 'Reconstructing Science',
+              'Self Esteem Fund', 'Science is Fun', 'Still Alive']
+
+    def setUp(self):
+        items = [(f'id-{i}', title) for i, title in enumerate(self.titles)]
+        self.sut = SortedIndex(items, lambda item: item[1], lambda item: item[0])
+
+    def all_pages(self, limit, text='', mode=PREFIX):
+        cursor, retval = '', []
+        while True:
+            items, cursor, total = self.sut.page(cursor, limit, text, mode)
+            retval.append([title for _, title in items])
+            if not cursor:
+                return retval, total
+
+    def test_pages_cover_all_items_in_order(self):
+        pages, total = self.all_pages(limit=4)
+
+        self.assertEqual(total, 6)
+        self.assertEqual(pages, [
+            ['Reconstructing Science', 'Science is Fun', 'Self Esteem Fund',
+             'Still Alive'],
+            ['Still Alive', 'Want You Gone']])
+
+    def test_prefix_filter_is_case_insensitive(self):
+        pages, total = self.all_pages(limit=1, text='s')
+
+        self.assertEqual(total, 4)
+        self.assertEqual(pages, [['Science is Fun'], ['Self Esteem Fund'],
+                                 ['Still Alive'], ['Still Alive']])
+
+    def test_substring_filter(self):
+        pages, total = self.all_pages(limit=2, text='SCIENCE', mode=SUBSTRING)
+
+        self.assertEqual(total, 2)
+        self.assertEqual(pages, [['Reconstructing Science', 'Science is Fun']])
+
+    def test_no_match(self):
+        self.assertEqual(self.sut.page('', 10, 'zzz'), ([], '', 0))
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            self.sut.page('not-a-cursor', 10)
+
+    def test_cursor_with_wrong_shape(self):
+        for key in ([1, 2], ['still alive', 3], ['a', 'b', 'c'], 'ab', {'a': 'b'}):
+            with self.subTest(key=key), self.assertRaises(ValueError):
+                self.sut.page(encode_cursor(key), 10)
+
+    def test_replace_keeps_order_without_touching_snapshot(self):
+        self.sut.REBUILD_RATIO = 1  # que no reordene con tan pocos elementos
+        removed = ('id-1', 'Still Alive')
+
+        updated = self.sut.replace([removed], [('id-9', 'Portal'), ('id-8', 'Zzz')])
+
+        self.assertEqual([title for _, title in updated.items], [
+            'Portal', 'Reconstructing Science', 'Science is Fun', 'Self Esteem Fund',
+            'Still Alive', 'Want You Gone', 'Zzz'])
+        self.assertEqual(updated.items, SortedIndex(
+            [item for item in self.sut.items if item != removed]
+            + [('id-9', 'Portal'), ('id-8', 'Zzz')],
+            lambda item: item[1], lambda item: item[0]).items)
+        self.assertEqual(len(self.sut), 6)
+
+    def test_replace_many_rebuilds(self):
+        updated = self.sut.replace(self.sut.items[:4], [('id-9', 'Portal')])
+
+        self.assertEqual([title for _, title in updated.items],
+                         ['Portal', 'Still Alive', 'Want You Gone'])
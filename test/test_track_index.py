@@ -0,0 +1,97 @@
+import os
+import shutil
+import struct
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from track_index import TrackIndex, audio_range, scan_file
+
+
+def id3v23_frame(frame_id, text):
+    payload = b'\x00' + text.encode('latin-1')
+    return frame_id.encode() + struct.pack('>I', len(payload)) + b'\x00\x00' + payload
+
+
+def id3v23_tag(**frames):
+    body = b''.join(id3v23_frame(frame_id, text) for frame_id, text in frames.items())
+    size = len(body)
+    syncsafe = bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+    return b'ID3\x03\x00\x00' + syncsafe + body
+
+
+class TrackIndexTests(TestCase):
+    def setUp(self):
+        self.media_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.media_dir)
+        for name in ('1s.mp3', '2s.mp3'):
+            shutil.copy(f'test/media/{name}', self.media_dir)
+
+    def create_index(self):
+        sut = TrackIndex(self.media_dir / 'media.index')
+        self.addCleanup(sut.close)
+        return sut
+
+    def files(self):
+        return sorted(self.media_dir.glob('*.mp3'))
+
+    def test_duration_and_bitrate_from_mpeg_header(self):
+        record = scan_file(Path('test/media/2s.mp3'))
+
+        self.assertEqual(record['title'], '2s')
+        self.assertAlmostEqual(record['duration_ms'], 2000, delta=100)
+        self.assertAlmostEqual(record['bitrate'], 64, delta=2)
+
+    def test_id3v2_tags(self):
+        audio = Path('test/media/1s.mp3').read_bytes()
+        path = self.media_dir / 'tagged.mp3'
+        path.write_bytes(id3v23_tag(TIT2='Still Alive', TPE1='GLaDOS', TALB='Portal')
+                         + audio)
+
+        record = scan_file(path)
+
+        self.assertEqual((record['title'], record['artist'], record['album']),
+                         ('Still Alive', 'GLaDOS', 'Portal'))
+        self.assertGreater(record['duration_ms'], 0)
+
+    def test_audio_range_without_tags_or_info_frame(self):
+        path = self.media_dir / '2s.mp3'
+        size = path.stat().st_size
+        with open(path, 'ab') as f:
+            f.write(b'TAG' + bytes(125))
+
+        # 44 bytes de ID3v2 y la trama Info de 182 bytes; al final, ID3v1
+        self.assertEqual(audio_range(path), (226, size))
+
+    def test_only_changed_files_are_rescanned(self):
+        self.create_index().update(self.files())
+
+        (self.media_dir / '2s.mp3').unlink()
+        shutil.copy('test/media/4s.mp3', self.media_dir)
+        os.utime(self.media_dir / '1s.mp3', ns=(0, 0))
+        sut = self.create_index()
+        sut.POOL_THRESHOLD = 0  # analizados en el pool de procesos
+        records = sut.update(self.files())
+
+        self.assertEqual(sorted(records), ['1s.mp3', '4s.mp3'])
+        self.assertEqual(sut.scanned, 2)
+
+    def test_file_removed_after_listing(self):
+        self.create_index().update(self.files())
+        files = self.files()
+        (self.media_dir / '2s.mp3').unlink()
+        os.utime(self.media_dir / '1s.mp3', ns=(0, 0))
+
+        sut = self.create_index()
+        records = sut.update(files + [self.media_dir / 'gone.mp3'])
+
+        self.assertEqual(sorted(records), ['1s.mp3'])
+        self.assertIsNone(scan_file(self.media_dir / 'gone.mp3'))
+
+    def test_unchanged_library_not_rescanned(self):
+        first = self.create_index().update(self.files())
+
+        sut = self.create_index()
+
+        self.assertEqual(sut.update(self.files()), first)
+        self.assertEqual(sut.scanned, 0)
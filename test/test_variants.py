@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+import Ice
+
+from track_index import audio_timing
+from variants import map_offset, plan, scan_variants, variant_path, variants_dir
+
+
+class VariantsTests(TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+        self.directory = self.root / 'media.variants'
+
+    def add_variant(self, filename, kbps):
+        path = variant_path(self.directory, filename, kbps)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'mp3')
+        return path
+
+    def test_default_dir_next_to_content(self):
+        properties = Ice.createProperties()
+        properties.setProperty('MediaServer.Content', '/srv/music/media')
+
+        self.assertEqual(variants_dir(properties), Path('/srv/music/media.variants'))
+
+    def test_scan_ignores_partial_files(self):
+        self.add_variant('a.mp3', 64)
+        self.add_variant('a.mp3', 128)
+        self.add_variant('.b.mp3.part', 64)
+        (self.directory / 'tmp').mkdir()
+
+        variants = scan_variants(self.directory)
+
+        self.assertEqual({name: sorted(rungs) for name, rungs in variants.items()},
+                         {'a.mp3': [64, 128]})
+
+    def test_scan_without_directory(self):
+        self.assertEqual(scan_variants(self.root / 'missing'), {})
+
+    def test_plan_skips_rungs_not_below_original(self):
+        sources = [Path('test/media/4s.mp3'), Path('test/media/bad-file.mp3')]
+
+        jobs = plan(sources, self.directory, ladder=(32, 64, 128))
+
+        # 4s.mp3 es de 64 kbps; de bad-file.mp3 no se conoce el bitrate
+        self.assertEqual([(source.name, kbps) for source, _, kbps in jobs], [
+            ('4s.mp3', 32),
+            ('bad-file.mp3', 32), ('bad-file.mp3', 64), ('bad-file.mp3', 128)])
+
+    def test_plan_skips_up_to_date_variants(self):
+        source = self.root / '4s.mp3'
+        shutil.copy('test/media/4s.mp3', source)
+        fresh = self.add_variant('4s.mp3', 32)
+        stale = self.add_variant('4s.mp3', 48)
+        stat = source.stat()
+        os.utime(stale, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**9))
+        os.utime(fresh, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        jobs = plan([source], self.directory, ladder=(32, 48))
+
+        self.assertEqual(jobs, [(source, stale, 48)])
+
+
+class MapOffsetTests(TestCase):
+    # 4s.mp3 y 2s.mp3 empiezan con 44 bytes de ID3v2 y no son proporcionales
+    source = Path('test/media/4s.mp3')
+    target = Path('test/media/2s.mp3')
+
+    def test_audio_timing_skips_id3_tag(self):
+        self.assertEqual(audio_timing(self.source), (44, 32617 - 44, 4048))
+
+    def test_start_and_end_of_audio(self):
+        self.assertEqual(map_offset(0, self.source, self.target), 44)
+        self.assertEqual(map_offset(44, self.source, self.target), 44)
+        self.assertEqual(map_offset(32617, self.source, self.target), 16526)
+
+    def test_same_instant_by_duration(self):
+        one_second = 44 + (32617 - 44) * 1000 // 4048
+
+        self.assertAlmostEqual(
+            map_offset(one_second, self.source, self.target),
+            44 + (16526 - 44) * 1000 // 2037, delta=1)
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+
+import logging
+import os
+import sqlite3
+import struct
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("TrackIndex")
+
+ID3_FRAMES = {'TIT2': 'title', 'TPE1': 'artist', 'TALB': 'album'}
+TEXT_ENCODINGS = ('latin-1', 'utf-16', 'utf-16-be', 'utf-8')
+
+# kbps por índice de la cabecera, para MPEG-1 y MPEG-2/2.5 Layer III
+BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+SAMPLE_RATES = {
+    1: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    2.5: (11025, 12000, 8000),
+}
+MPEG_VERSIONS = {0b00: 2.5, 0b10: 2, 0b11: 1}
+
+
+def syncsafe(data):
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def decode_text(payload):
+    if not payload:
+        return ''
+    encoding = TEXT_ENCODINGS[payload[0]] if payload[0] < 4 else 'latin-1'
+    return payload[1:].decode(encoding, errors='replace').split('\x00')[0].strip()
+
+
+def parse_id3v2(f):
+    "Devuelve (tags, tamaño de la cabecera ID3v2) leyendo desde el inicio"
+    header = f.read(10)
+    if len(header) < 10 or header[:3] != b'ID3':
+        return {}, 0
+
+    version = header[3]
+    size = syncsafe(header[6:10]) + 10
+    body = f.read(size - 10)
+    tags = {}
+    pos = 0
+    while pos + 10 <= len(body) and body[pos] != 0:
+        frame_id = body[pos:pos + 4].decode('latin-1')
+        raw_size = body[pos + 4:pos + 8]
+        # ID3v2.4 codifica el tamaño de trama como syncsafe; v2.3, como entero
+        frame_size = syncsafe(raw_size) if version >= 4 \
+            else int.from_bytes(raw_size, 'big')
+        payload = body[pos + 10:pos + 10 + frame_size]
+        if (key := ID3_FRAMES.get(frame_id)) and (text := decode_text(payload)):
+            tags[key] = text
+        pos += 10 + frame_size
+
+    return tags, size
+
+
+def parse_id3v1(f, file_size):
+    if file_size < 128:
+        return {}
+    f.seek(file_size - 128)
+    block = f.read(128)
+    if block[:3] != b'TAG':
+        return {}
+
+    fields = {'title': block[3:33], 'artist': block[33:63], 'album': block[63:93]}
+    return {key: text for key, value in fields.items()
+            if (text := value.split(b'\x00')[0].decode('latin-1').strip())}
+
+
+def find_frame(data):
+    "(posición, cabecera, versión MPEG) de la primera trama Layer III, o None"
+    for pos in range(len(data) - 4):
+        if data[pos] != 0xFF or data[pos + 1] & 0xE0 != 0xE0:
+            continue
+
+        header = struct.unpack('>I', data[pos:pos + 4])[0]
+        version = MPEG_VERSIONS.get((header >> 19) & 0b11)
+        layer = (header >> 17) & 0b11
+        bitrate_index = (header >> 12) & 0xF
+        rate_index = (header >> 10) & 0b11
+        if version is None or layer != 0b01 or bitrate_index in (0, 15) \
+                or rate_index == 3:
+            continue
+        return pos, header, version
+    return None
+
+
+def xing_offset(data, pos, header, version):
+    "Donde iría la etiqueta Xing/Info de la trama en `pos`, tras su side info"
+    mono = (header >> 6) & 0b11 == 0b11
+    side_info = (17 if mono else 32) if version == 1 else (9 if mono else 17)
+    return pos + 4 + side_info
+
+
+def parse_mpeg(f, offset, file_size):
+    "Bitrate (kbps) y duración (ms) a partir de la primera trama y su cabecera Xing/Info"
+    f.seek(offset)
+    data = f.read(4096)
+    if (frame := find_frame(data)) is None:
+        return 0, 0
+
+    pos, header, version = frame
+    bitrate = BITRATES[1 if version == 1 else 2][(header >> 12) & 0xF]
+    sample_rate = SAMPLE_RATES[version][(header >> 10) & 0b11]
+    samples_per_frame = 1152 if version == 1 else 576
+    audio_bytes = file_size - offset - pos
+
+    # Xing/Info (VBR y LAME) guarda el número de tramas: duración exacta
+    xing = xing_offset(data, pos, header, version)
+    if data[xing:xing + 4] in (b'Xing', b'Info'):
+        flags = struct.unpack('>I', data[xing + 4:xing + 8])[0]
+        if flags & 0x1:
+            frames = struct.unpack('>I', data[xing + 8:xing + 12])[0]
+            duration_ms = frames * samples_per_frame * 1000 // sample_rate
+            if duration_ms:
+                bitrate = audio_bytes * 8 // duration_ms
+            return bitrate, duration_ms
+
+    return bitrate, audio_bytes * 8 // bitrate
+
+
+def audio_range(path):
+    """(inicio, fin) de las tramas de audio de un .mp3: sin las etiquetas ID3
+    ni la trama Xing/Info, que no llevan audio. Es lo que se puede concatenar
+    tras otra pista en el mismo decodificador."""
+    size = os.stat(path).st_size
+    with open(path, 'rb') as f:
+        _, start = parse_id3v2(f)
+        data = f.read(4096)
+        if (frame := find_frame(data)) is not None:
+            pos, header, version = frame
+            start += pos
+            xing = xing_offset(data, pos, header, version)
+            if data[xing:xing + 4] in (b'Xing', b'Info'):
+                bitrate = BITRATES[1 if version == 1 else 2][(header >> 12) & 0xF]
+                sample_rate = SAMPLE_RATES[version][(header >> 10) & 0b11]
+                padding = (header >> 9) & 0b1
+                start += (144 if version == 1 else 72) * bitrate * 1000 // sample_rate \
+                    + padding
+        f.seek(max(size - 128, 0))
+        end = size - 128 if size >= 128 and f.read(3) == b'TAG' else size
+    return min(start, end), end
+
+
+def audio_timing(path):
+    "(inicio del audio, bytes de audio, duración en ms): sin las etiquetas ID3"
+    size = os.stat(path).st_size
+    with open(path, 'rb') as f:
+        _, audio_offset = parse_id3v2(f)
+        _, duration_ms = parse_mpeg(f, audio_offset, size)
+        f.seek(max(size - 128, 0))
+        end = size - 128 if size >= 128 and f.read(3) == b'TAG' else size
+    return audio_offset, max(end - audio_offset, 0), duration_ms
+
+
+def scan_file(path):
+    "Metadatos de un .mp3, o None si ya no existe; se ejecuta en los procesos del pool"
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    record = {
+        'filename': Path(path).name,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'title': Path(path).stem,
+        'artist': '',
+        'album': '',
+        'duration_ms': 0,
+        'bitrate': 0,
+    }
+
+    try:
+        with open(path, 'rb') as f:
+            tags, audio_offset = parse_id3v2(f)
+            tags = {**parse_id3v1(f, stat.st_size), **tags}
+            record.update(tags)
+            record['bitrate'], record['duration_ms'] = \
+                parse_mpeg(f, audio_offset, stat.st_size)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Error parsing '{path}': {e}")
+
+    return record
+
+
+class TrackIndex:
+    """Índice persistente (SQLite) de los metadatos de la biblioteca.
+
+    `update()` sólo vuelve a analizar los ficheros cuyo tamaño o mtime han
+    cambiado desde el último arranque, en un pool de procesos.
+    """
+
+    COLUMNS = ('filename', 'size', 'mtime_ns', 'title', 'artist', 'album',
+               'duration_ms', 'bitrate')
+    POOL_THRESHOLD = 16  # por debajo, lanzar procesos cuesta más que analizar
+
+    def __init__(self, path=':memory:', workers=None):
+        self.path = path
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(path), check_same_thread=False)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS tracks (
+                filename TEXT PRIMARY KEY,
+                size INTEGER, mtime_ns INTEGER,
+                title TEXT, artist TEXT, album TEXT,
+                duration_ms INTEGER, bitrate INTEGER)""")
+        self.db.commit()
+        self.scanned = 0
+
+    def records(self):
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM tracks ORDER BY filename")
+            return {row[0]: dict(zip(self.COLUMNS, row)) for row in rows}
+
+    def scan(self, paths):
+        if len(paths) < self.POOL_THRESHOLD:
+            return [scan_file(path) for path in paths]
+        # spawn: el servidor de Ice es multihilo y un fork heredaría sus cerrojos
+        with ProcessPoolExecutor(self.workers, mp_context=get_context('spawn')) as pool:
+            return list(pool.map(scan_file, paths, chunksize=64))
+
+    def update(self, files):
+        "Sincroniza el índice con `files` (rutas) y devuelve todos los registros"
+        known = {name: (record['size'], record['mtime_ns'])
+                 for name, record in self.records().items()}
+
+        current = {}
+        changed = []
+        for path in files:
+            # Borrado entre el listado y el stat: cuenta como eliminado
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            current[path.name] = path
+            if known.get(path.name) != (stat.st_size, stat.st_mtime_ns):
+                changed.append(path)
+
+        scanned = []
+        for path, record in zip(changed, self.scan(changed)):
+            if record is None:
+                del current[path.name]
+            else:
+                scanned.append(record)
+        removed = known.keys() - current.keys()
+
+        with self.lock:
+            self.db.executemany(
+                "DELETE FROM tracks WHERE filename = ?", [(name,) for name in removed])
+            placeholders = ', '.join('?' * len(self.COLUMNS))
+            self.db.executemany(
+                f"INSERT OR REPLACE INTO tracks VALUES ({placeholders})",
+                [tuple(record[column] for column in self.COLUMNS) for record in scanned])
+            self.db.commit()
+
+        self.scanned += len(scanned)
+        logger.info(f"Track index: {len(scanned)} scanned, {len(removed)} removed, "
+                    f"{len(current) - len(scanned)} unchanged")
+        return self.records()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def __repr__(self):
+        return f"<TrackIndex '{self.path}'>"
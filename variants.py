@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from track_index import audio_timing, scan_file
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("Variants")
+
+LADDER = (64, 128, 192)  # kbps
+
+PIPELINE = ('filesrc location="{source}" ! decodebin ! audioconvert ! audioresample '
+            '! lamemp3enc target=bitrate bitrate={kbps} cbr=true '
+            '! filesink location="{target}"')
+
+
+def variants_dir(properties):
+    "MediaServer.Variants o, por defecto, <Content>.variants junto a la biblioteca"
+    content = Path(properties.getPropertyWithDefault('MediaServer.Content', 'media'))
+    return Path(properties.getPropertyWithDefault(
+        'MediaServer.Variants', str(content.with_name(content.name + '.variants'))))
+
+
+def variant_path(directory, filename, kbps):
+    return Path(directory) / str(kbps) / filename
+
+
+def scan_variants(directory):
+    "filename -> {kbps: ruta} de las variantes ya transcodificadas"
+    variants = {}
+    if directory is None or not Path(directory).is_dir():
+        return variants
+
+    for rung in sorted(Path(directory).iterdir()):
+        if not rung.is_dir() or not rung.name.isdigit():
+            continue
+        for path in rung.iterdir():
+            if path.is_file() and path.suffix.lower() == '.mp3':
+                variants.setdefault(path.name, {})[int(rung.name)] = path
+    return variants
+
+
+def map_offset(offset, source, target):
+    """Byte de `target` en el mismo instante de la pista que `offset` en `source`.
+
+    Se traduce por tiempo, contando sólo los bytes de audio (sin las
+    etiquetas ID3) y con la duración de cada fichero. En un original VBR
+    el instante es aproximado; el decodificador se resincroniza con la
+    siguiente trama MP3 de la variante, que es CBR.
+    """
+    start, length, duration_ms = audio_timing(source)
+    target_start, target_length, target_duration_ms = audio_timing(target)
+    if not length:
+        return target_start
+    if not duration_ms or not target_duration_ms:
+        # Sin duración conocida, en proporción a los bytes de audio
+        duration_ms = target_duration_ms = 1
+    position_ms = min(max(offset - start, 0), length) * duration_ms / length
+    return target_start + min(
+        int(position_ms * target_length / target_duration_ms), target_length)
+
+
+def plan(sources, directory, ladder=LADDER):
+    """Trabajos (origen, destino, kbps) pendientes: variantes que faltan o son
+    más antiguas que su original. No se generan variantes de igual o mayor
+    bitrate que el original, que ya es el escalón más alto."""
+    jobs = []
+    for source in sources:
+        if (record := scan_file(source)) is None:
+            continue  # borrado mientras tanto
+        bitrate = record['bitrate']
+        for kbps in ladder:
+            if bitrate and kbps >= bitrate:
+                continue
+            target = variant_path(directory, source.name, kbps)
+            if not target.exists() or \
+                    target.stat().st_mtime_ns < source.stat().st_mtime_ns:
+                jobs.append((source, target, kbps))
+    return jobs
+
+
+def transcode(job):
+    "Un trabajo con GStreamer; se ejecuta en los procesos del pool"
+    import gi
+    gi.require_version('Gst', '1.0')
+    from gi.repository import Gst  # type: ignore
+
+    source, target, kbps = job
+    Gst.init(None)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    # Nombre oculto y sin .mp3 hasta terminar: el servidor nunca ve uno a medias
+    partial = target.with_name(f'.{target.name}.part')
+    pipeline = Gst.parse_launch(PIPELINE.format(source=source, target=partial, kbps=kbps))
+    pipeline.set_state(Gst.State.PLAYING)
+    message = pipeline.get_bus().timed_pop_filtered(
+        Gst.CLOCK_TIME_NONE, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+    pipeline.set_state(Gst.State.NULL)
+
+    if message.type == Gst.MessageType.ERROR:
+        partial.unlink(missing_ok=True)
+        return target, str(message.parse_error()[0])
+    os.replace(partial, target)
+    return target, None
+
+
+def build(sources, directory, ladder=LADDER, workers=None):
+    "Genera las variantes pendientes en paralelo; devuelve cuántas fallaron"
+    jobs = plan(sources, directory, ladder)
+    logger.info(f"Transcoding {len(jobs)} variants into '{directory}'")
+
+    failed = 0
+    with ProcessPoolExecutor(workers) as pool:
+        for target, error in pool.map(transcode, jobs):
+            if error:
+                failed += 1
+                logger.error(f"Error transcoding '{target}': {error}")
+            else:
+                logger.info(f"Variant ready: '{target}'")
+    return failed
+
+
+def main(properties):
+    content = Path(properties.getPropertyWithDefault('MediaServer.Content', 'media'))
+    ladder = [int(kbps) for kbps in properties.getPropertyAsList(
+        'MediaServer.Variants.Bitrates')] or LADDER
+    sources = [path for path in sorted(content.iterdir())
+               if path.is_file() and path.suffix.lower() == '.mp3']
+    return build(sources, variants_dir(properties), ladder,
+                 properties.getPropertyAsInt('MediaServer.Variants.Workers') or None)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("Usage: variants.py <config-file>")
+
+    import Ice
+    properties = Ice.createProperties()
+    properties.load(sys.argv[1])
+    sys.exit(1 if main(properties) else 0)